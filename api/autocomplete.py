@@ -0,0 +1,281 @@
+"""
+autocomplete.py
+
+This module defines the sorted-prefix index behind typeahead suggestions. Every distinct
+casefolded author, title and category of the books that are not soft-deleted is a
+suggestion, weighted by the total number of ratings of its books. Suggestions are kept
+sorted, so the suggestions that start with a prefix are a contiguous range found with
+two binary searches.
+
+A short range is ranked by scanning it. A prefix with more than SCAN_LIMIT suggestions
+keeps its best MAX_SUGGESTIONS in a cache, which is built from the caches of the
+prefixes one character longer and then updated in place as suggestions gain ratings or
+are added. A suggestion that loses weight or disappears only drops the cached prefixes
+it was ranked in, which are rebuilt on their next use. Answering a query therefore never
+visits more than SCAN_LIMIT suggestions once its prefix is cached, however large the
+catalog is.
+
+Attributes:
+    SUGGESTION_FIELDS (tuple): The book fields that are suggested.
+    MAX_SUGGESTIONS (int): The maximum number of suggestions a query can ask for.
+    SCAN_LIMIT (int): The number of suggestions above which the best suggestions of a
+    prefix are cached instead of scanned.
+
+Classes:
+    SuggestionIndex: A sorted-prefix index over the authors, titles and categories of
+    books.
+
+Example:
+    ```python
+    index = SuggestionIndex()
+    index.add(book)
+    suggestions = index.suggest("har", 5)
+    ```
+"""
+
+import heapq
+from bisect import bisect_left
+from itertools import chain
+from typing import Dict, Iterator, List, Tuple
+
+from api.book import Book
+
+SUGGESTION_FIELDS = ("author", "title", "category")
+MAX_SUGGESTIONS = 20
+SCAN_LIMIT = 512
+
+# New suggestions are merged into the sorted suggestions once there are this many, or
+# one eighth of the sorted suggestions, so bulk loads merge a logarithmic number of
+# times.
+_MIN_MERGE = 1024
+# Sorts after every character that can follow a prefix.
+_END = "\U0010ffff"
+
+# A casefolded value and the field it is a value of.
+_Entry = Tuple[str, str]
+
+
+def _get_entries(book: Book) -> Iterator[Tuple[_Entry, str]]:
+    for field in SUGGESTION_FIELDS:
+        value = getattr(book, field)
+        yield (value.casefold(), field), value
+
+
+class SuggestionIndex:
+    """
+    A sorted-prefix index over the authors, titles and categories of books.
+    """
+
+    def __init__(self):
+        self._weights: Dict[_Entry, int] = {}
+        self._counts: Dict[_Entry, int] = {}
+        self._labels: Dict[_Entry, str] = {}
+        self._entries: List[_Entry] = []
+        # Suggestions added since the last merge, sorted lazily.
+        self._recent: List[_Entry] = []
+        self._recent_sorted = True
+        self._top: Dict[str, List[_Entry]] = {}
+
+    def add(self, book: Book) -> None:
+        """
+        Adds the author, title and category of a book, weighted by its ratings.
+
+        Args:
+            book: The book to add.
+        """
+        num_ratings = book.num_ratings or 0
+
+        for entry, label in _get_entries(book):
+            count = self._counts.get(entry, 0)
+            self._counts[entry] = count + 1
+
+            if count == 0:
+                self._labels[entry] = label
+                self._weights[entry] = num_ratings
+                self._insert(entry)
+                self._promote(entry)
+            elif num_ratings:
+                self._weights[entry] += num_ratings
+                self._promote(entry)
+
+    def remove(self, book: Book) -> None:
+        """
+        Removes the author, title and category of a book and its ratings.
+
+        Args:
+            book: The book to remove. It must have been added with the same fields and
+            number of ratings.
+        """
+        num_ratings = book.num_ratings or 0
+
+        for entry, _ in _get_entries(book):
+            count = self._counts[entry] - 1
+
+            if count == 0:
+                del self._counts[entry]
+                del self._weights[entry]
+                del self._labels[entry]
+                self._delete(entry)
+                self._demote(entry)
+            else:
+                self._counts[entry] = count
+
+                if num_ratings:
+                    self._weights[entry] -= num_ratings
+                    self._demote(entry)
+
+    def add_ratings(self, book: Book, num_ratings: int) -> None:
+        """
+        Adds ratings to the weight of the author, title and category of a book.
+
+        Args:
+            book: The book that was rated.
+            num_ratings: The number of ratings added. It is negative if ratings were
+            taken away.
+        """
+        if not num_ratings:
+            return
+
+        for entry, _ in _get_entries(book):
+            self._weights[entry] += num_ratings
+
+            if num_ratings > 0:
+                self._promote(entry)
+            else:
+                self._demote(entry)
+
+    def suggest(self, prefix: str, k: int) -> List[dict]:
+        """
+        Args:
+            prefix: The start of an author, title or category. Matching is
+            case-insensitive.
+            k: The number of suggestions to return, at most MAX_SUGGESTIONS.
+
+        Returns:
+            Up to k suggestions that start with the prefix, ordered by their number of
+            ratings, most rated first, and then alphabetically. Each suggestion has the
+            field it comes from, its value as first added, and its number of ratings.
+        """
+        prefix = prefix.casefold()
+
+        if self._count_prefixed(prefix) <= SCAN_LIMIT:
+            entries = heapq.nsmallest(k, self._iter_prefixed(prefix), key=self._rank)
+        else:
+            entries = self._get_top(prefix)[:k]
+
+        return [
+            dict(
+                field=entry[1],
+                value=self._labels[entry],
+                num_ratings=self._weights[entry],
+            )
+            for entry in entries
+        ]
+
+    def _rank(self, entry: _Entry) -> Tuple:
+        return -self._weights[entry], entry
+
+    def _sorted_recent(self) -> List[_Entry]:
+        if not self._recent_sorted:
+            self._recent.sort()
+            self._recent_sorted = True
+
+        return self._recent
+
+    def _insert(self, entry: _Entry) -> None:
+        self._recent.append(entry)
+        self._recent_sorted = False
+
+        if len(self._recent) >= max(_MIN_MERGE, len(self._entries) // 8):
+            # The entries are one sorted run followed by the recent ones, so Timsort
+            # only sorts the recent entries and merges the two runs in linear time.
+            self._entries += self._recent
+            self._entries.sort()
+            self._recent = []
+            self._recent_sorted = True
+
+    def _delete(self, entry: _Entry) -> None:
+        for entries in (self._entries, self._sorted_recent()):
+            i = bisect_left(entries, entry)
+
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+                return
+
+    def _bounds(self, entries: List[_Entry], prefix: str) -> Tuple[int, int]:
+        start = bisect_left(entries, (prefix,))
+        return start, bisect_left(entries, (prefix + _END,), start)
+
+    def _count_prefixed(self, prefix: str) -> int:
+        total = 0
+
+        for entries in (self._entries, self._sorted_recent()):
+            start, stop = self._bounds(entries, prefix)
+            total += stop - start
+
+        return total
+
+    def _iter_prefixed(self, prefix: str) -> Iterator[_Entry]:
+        ranges = []
+
+        for entries in (self._entries, self._sorted_recent()):
+            start, stop = self._bounds(entries, prefix)
+            ranges.append(entries[start:stop])
+
+        return chain.from_iterable(ranges)
+
+    def _get_top(self, prefix: str) -> List[_Entry]:
+        top = self._top.get(prefix)
+
+        if top is not None:
+            return top
+
+        candidates: List[_Entry] = []
+        children = set()
+
+        for entries in (self._entries, self._sorted_recent()):
+            i, stop = self._bounds(entries, prefix)
+
+            while i < stop:
+                value = entries[i][0]
+
+                if len(value) == len(prefix):
+                    candidates.append(entries[i])
+                    i += 1
+                else:
+                    child = value[: len(prefix) + 1]
+                    children.add(child)
+                    i = bisect_left(entries, (child + _END,), i, stop)
+
+        for child in children:
+            if self._count_prefixed(child) > SCAN_LIMIT:
+                candidates += self._get_top(child)
+            else:
+                candidates.extend(self._iter_prefixed(child))
+
+        top = heapq.nsmallest(MAX_SUGGESTIONS, candidates, key=self._rank)
+        self._top[prefix] = top
+        return top
+
+    def _promote(self, entry: _Entry) -> None:
+        value = entry[0]
+
+        for end in range(len(value) + 1):
+            top = self._top.get(value[:end])
+
+            if top is not None:
+                if entry not in top:
+                    top.append(entry)
+
+                top.sort(key=self._rank)
+                del top[MAX_SUGGESTIONS:]
+
+    def _demote(self, entry: _Entry) -> None:
+        value = entry[0]
+
+        for end in range(len(value) + 1):
+            prefix = value[:end]
+            top = self._top.get(prefix)
+
+            if top is not None and entry in top:
+                del self._top[prefix]
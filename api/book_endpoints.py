@@ -6,31 +6,82 @@ attributes and functions:
 
 Attributes:
     bs (BookService): The service instance used for book operations.
+    JSON_MEDIA_TYPE (str): The media type of JSON responses built from
+    pre-serialized books.
+    NDJSON_MEDIA_TYPE (str): The media type that selects streamed query results and
+    NDJSON imports.
+    CSV_MEDIA_TYPE (str): The media type of CSV imports.
+    PROMETHEUS_MEDIA_TYPE (str): The media type of the metrics.
     app (FastAPI): The FastAPI instance used for defining the endpoints.
 
 Functions:
+    lifespan: Restores the state at startup, snapshots and compacts it while the app
+        runs, and closes the write-ahead log on shutdown.
     query_book: Endpoint to query books based on various parameters.
+    autocomplete: Endpoint to suggest authors, titles and categories for a prefix.
     create_book: Endpoint to create a new book in the system.
+    import_books: Endpoint to create books in bulk from NDJSON or CSV.
     delete_book: Endpoint to delete a book by its ISBN.
     add_rating: Endpoint to add a rating to a book.
+    add_ratings: Endpoint to add many ratings to many books at once.
     create_review: Endpoint to create a review for a book.
     get_reviews: Endpoint to get reviews for a specific book.
+    get_query_cache_stats: Endpoint to get the counters of the query cache.
+    get_stats: Endpoint to get the book and rating aggregates of each author or
+        category.
+    get_metrics: Endpoint to get the latency histograms in the Prometheus format.
 """
 
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from typing import Dict, Literal, Optional
+
 import uvicorn
-from fastapi import Body, Depends, FastAPI, Path, Request
+from fastapi import Body, Depends, FastAPI, HTTPException, Path, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from starlette import status
 
 import api.book_service as bs
+from api.data import COMPACT_INTERVAL, SNAPSHOT_INTERVAL
+from api.metrics import METRICS, MetricsMiddleware
 from api.models import (
     VALID_ISBN_REGEX,
     AddRatingRequest,
+    AddRatingsRequest,
+    AutocompleteQueryParameters,
     BookQueryParameters,
     CreateBookRequest,
     CreateReviewRequest,
+    ReviewQueryParameters,
 )
 
-app = FastAPI(title="My Books API")
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+_ETAG_SEED = secrets.token_hex(4)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Restores the catalog and reviews from the latest snapshot and the write-ahead log
+    before the first request is served, writes snapshots and compacts soft-deleted
+    books in the background while the app runs, and closes the log on shutdown.
+    """
+    bs.restore()
+    snapshots = asyncio.create_task(bs.save_snapshots(SNAPSHOT_INTERVAL))
+    compactions = asyncio.create_task(bs.compact_periodically(COMPACT_INTERVAL))
+    yield
+    compactions.cancel()
+    snapshots.cancel()
+    bs.close_log()
+
+
+app = FastAPI(title="My Books API", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, metrics=METRICS)
 
 
 def _add_links(d: dict, self_link: str) -> dict:
@@ -38,18 +89,125 @@ def _add_links(d: dict, self_link: str) -> dict:
     return d
 
 
+def _get_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in (_ETAG_SEED, *parts)) + '"'
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
+def _not_modified(etag: str, **headers) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(etag=etag, **headers)
+    )
+
+
+def _get_qualities(accept: str) -> Dict[str, float]:
+    qualities = {}
+
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.0
+
+        for param in params:
+            name, _, value = param.partition("=")
+
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if media_type:
+            qualities.setdefault(media_type.lower(), quality)
+
+    return qualities
+
+
+def _accepts_ndjson(request: Request) -> bool:
+    # NDJSON has to be asked for by name, and at least as strongly as JSON is accepted
+    # by the most specific range that matches it.
+    qualities = _get_qualities(request.headers.get("accept", ""))
+    ndjson = qualities.get(NDJSON_MEDIA_TYPE, 0.0)
+    json_ranges = (JSON_MEDIA_TYPE, "application/*", "*/*")
+    json_ = next((qualities[r] for r in json_ranges if r in qualities), 0.0)
+    return ndjson > 0 and ndjson >= json_
+
+
+def _add_next_link(response: Response, next_link: str) -> Response:
+    response.headers["Link"] = f'<{next_link}>; rel="next"'
+    return response
+
+
 @app.get("/books/q", status_code=status.HTTP_200_OK)
-async def query_book(params: BookQueryParameters = Depends()):
+async def query_book(request: Request, params: BookQueryParameters = Depends()):
     """
     API endpoint to query books based on specified parameters.
 
+    When `top` is given and a full page of books is returned, the response has a
+    `Link` header with a `next` link that continues after the last book on the page.
+
+    When the request names `application/x-ndjson` in its `Accept` header, with a
+    quality at least as high as that of JSON, the books are streamed as
+    newline-delimited JSON instead of being returned as one JSON array. Streamed
+    responses have no `next` link. Responses carry `Vary: Accept`, as the two
+    representations have different ETags.
+
+    Responses carry an ETag derived from the catalog version. A request whose
+    `If-None-Match` header holds the current ETag gets a 304 response without the
+    books being queried again.
+
     Args:
+        request: HTTP request object that provides request data and context.
         params (BookQueryParameters): The parameters used to query books.
 
     Returns:
         The result of the book query.
     """
-    return await bs.query_book(params)
+    stream = _accepts_ndjson(request)
+    etag = _get_etag("ndjson" if stream else "json", bs.get_catalog_version())
+
+    if _is_not_modified(request, etag):
+        return _not_modified(etag, vary="Accept")
+
+    if stream:
+        return StreamingResponse(
+            bs.stream_books_ndjson(params),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=dict(etag=etag, vary="Accept"),
+        )
+
+    body, count, cursor = await bs.query_book_json(params)
+    response = Response(
+        body, media_type=JSON_MEDIA_TYPE, headers=dict(etag=etag, vary="Accept")
+    )
+
+    if params.top and count == params.top:
+        _add_next_link(response, str(request.url.include_query_params(cursor=cursor)))
+
+    return response
+
+
+@app.get("/books/autocomplete", status_code=status.HTTP_200_OK)
+async def autocomplete(params: AutocompleteQueryParameters = Depends()):
+    """
+    Suggest authors, titles and categories that start with a prefix, for typeahead.
+
+    Args:
+        params (AutocompleteQueryParameters): The prefix and the number of
+        suggestions to return.
+
+    Returns:
+        Up to `k` suggestions, most rated first.
+    """
+    return await bs.autocomplete(params)
 
 
 @app.post("/books", status_code=status.HTTP_201_CREATED, response_model=dict)
@@ -66,6 +224,36 @@ async def create_book(request: Request, params: CreateBookRequest):
     return book
 
 
+@app.post("/books/import", status_code=status.HTTP_200_OK)
+async def import_books(request: Request):
+    """
+    Create books in bulk from a streamed body.
+
+    The body is either newline-delimited JSON, with one CreateBookRequest object per
+    line, or CSV with a header row and the title, author, category and isbn columns.
+    The `Content-Type` header selects the format. Invalid rows and books that already
+    exist are skipped and reported, while the other rows are imported.
+
+    Args:
+        request: HTTP request object whose body holds the books.
+
+    Returns:
+        The number of books imported and failed, and the line number and reason of
+        the rows that failed.
+    """
+    media_type = request.headers.get("content-type", NDJSON_MEDIA_TYPE)
+    media_type = media_type.split(";")[0].strip().lower()
+    file_format = {NDJSON_MEDIA_TYPE: "ndjson", CSV_MEDIA_TYPE: "csv"}.get(media_type)
+
+    if file_format is None:
+        msg = f"Books can be imported from {NDJSON_MEDIA_TYPE} or {CSV_MEDIA_TYPE}."
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=msg
+        )
+
+    return await bs.import_books(request.stream(), file_format)
+
+
 @app.delete("/books/{isbn}")
 async def delete_book(isbn: str = Path(pattern=VALID_ISBN_REGEX)):
     """
@@ -94,6 +282,22 @@ async def add_rating(
     return await bs.add_rating(isbn, params)
 
 
+@app.post("/books/ratings")
+async def add_ratings(params: AddRatingsRequest):
+    """
+    Add many ratings at once. Ratings for the same book are combined into a single
+    update of its number of ratings, sum of ratings and average rating.
+
+    Args:
+        params: The ISBN and rating of each rating to add.
+
+    Returns:
+        The number of ratings added, the number of books rated, and the ISBNs of the
+        books that do not exist.
+    """
+    return await bs.add_ratings(params)
+
+
 @app.post("/books/{isbn}/reviews")
 async def create_review(
     isbn: str = Path(pattern=VALID_ISBN_REGEX), request: CreateReviewRequest = Body()
@@ -110,18 +314,86 @@ async def create_review(
 
 
 @app.get("/books/{isbn}/reviews", status_code=status.HTTP_200_OK)
-async def get_reviews(isbn: str = Path(pattern=VALID_ISBN_REGEX)):
+async def get_reviews(
+    request: Request,
+    response: Response,
+    isbn: str = Path(pattern=VALID_ISBN_REGEX),
+    params: ReviewQueryParameters = Depends(),
+):
     """
     Retrieve reviews for a book identified by its ISBN.
 
+    When `limit` is given and a full page of reviews is returned, the response has a
+    `Link` header with a `next` link to the following page.
+
+    Responses carry an ETag derived from the book's review version. A request whose
+    `If-None-Match` header holds the current ETag gets a 304 response.
+
     Args:
+        request: HTTP request object that provides request data and context.
+        response: The response whose headers receive the ETag and `next` link.
         isbn (str): The ISBN number of the book. It should match the pattern specified
         by VALID_ISBN_REGEX.
+        params (ReviewQueryParameters): The offset and limit of the page of reviews.
 
     Returns:
         A list of reviews for the specified book.
     """
-    return await bs.get_reviews(isbn)
+    etag = _get_etag("reviews", isbn, bs.get_reviews_version(isbn))
+
+    if _is_not_modified(request, etag):
+        return _not_modified(etag)
+
+    response.headers["etag"] = etag
+    reviews = await bs.get_reviews(isbn, params)
+
+    if params.limit and reviews and len(reviews[0]["reviews"]) == params.limit:
+        offset = params.offset + params.limit
+        _add_next_link(response, str(request.url.include_query_params(offset=offset)))
+
+    return reviews
+
+
+@app.get("/stats/query-cache", status_code=status.HTTP_200_OK)
+async def get_query_cache_stats():
+    """
+    Retrieve the size, limits and hit, miss and eviction counters of the cache that
+    holds recent `/books/q` results.
+
+    Returns:
+        A dictionary with the cache statistics.
+    """
+    return await bs.get_query_cache_stats()
+
+
+@app.get("/stats/{field}", status_code=status.HTTP_200_OK)
+async def get_stats(field: Literal["author", "category"], value: Optional[str] = None):
+    """
+    Retrieve the number of books, deleted books and ratings, and the average rating,
+    of each author or category. The aggregates are maintained as books are written,
+    so they are served without a pass over the catalog.
+
+    Args:
+        field (str): The field to group books by, author or category.
+        value (Optional[str]): Optional author or category to return the aggregates
+        of, matched case-insensitively.
+
+    Returns:
+        A list with the aggregates of each value, ordered by value.
+    """
+    return await bs.get_stats(field, value)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    API endpoint to get the request and stage latency histograms in the Prometheus
+    text format. The histograms stay empty unless BOOKS_METRICS is 1.
+
+    Returns:
+        The histograms and the sample rate.
+    """
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
 
 
 if __name__ == "__main__":
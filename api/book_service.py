@@ -5,28 +5,156 @@ This module provides various services related to book management. It includes fu
 for filtering, adding, deleting, and querying books, as well as handling book ratings
 and reviews.
 
+Writes are serialized per book by WRITE_LOCKS. A write holds the locks of the books it
+changes from the moment it checks that they exist until its record is logged and
+applied, so two writes to the same book never interleave across the await of the log,
+while writes to different books only wait for each other when their ISBNs share a
+stripe. Reads do not take locks: a record is applied to the catalog without awaiting,
+so a read sees a write either entirely or not at all.
+
+When METRICS is enabled, sampled queries time their select, scan, sort and encode
+stages, and sampled writes time their log and apply stages.
+
+When several workers share the write-ahead log, the log is the only path by which
+writes reach any catalog. Each worker applies every record, its own and those of the
+other workers, in the order they were appended, and catches up with the log before it
+reads or checks a book, so all workers converge on the same state and a write that
+races with another worker's write to the same book is resolved the same way by all of
+them.
+
+Attributes:
+    STREAM_BATCH_SIZE (int): The number of books streamed between yields to the event
+    loop.
+    QUERY_CACHE_SIZE (int): The maximum number of query results kept in QUERY_CACHE.
+    QUERY_CACHE_TTL (float): The number of seconds a cached query result stays valid.
+    QUERY_CACHE (QueryCache): The cache of recent query_book results. It is
+    invalidated whenever the catalog version changes.
+    IMPORT_FORMATS (tuple): The formats import_books accepts.
+    IMPORT_BATCH_SIZE (int): The number of rows import_books validates and adds to
+    the catalog at a time.
+    IMPORT_MAX_ERRORS (int): The maximum number of row errors import_books reports.
+    WRITE_LOCK_STRIPES (int): The number of locks WRITE_LOCKS spreads ISBNs over.
+    WRITE_LOCKS (StripedLock): The per-book locks held by writes.
+
 Functions:
-    _filter_books(books: list, query_params: BookQueryParameters) -> list:
-        Filters books based on given query parameters like author, category, and ISBN.
+    _compile_predicate(params: BookQueryParameters, scores: dict, skip: Collection)
+        -> Callable:
+        Compiles the ISBN, author, category, rating and search query parameters into
+        one predicate, with the casefolded values worked out once per query instead
+        of once per book. The parameters in skip are left out, and None is returned
+        if no parameter is left.
+
+    _get_matches(params: BookQueryParameters, scores: dict) -> dict:
+        Returns the catalog index entries and search scores that hold the books
+        matching each query parameter, keyed by the parameter.
+
+    _count_candidates(params: BookQueryParameters, matches: dict) -> int:
+        Returns the number of books that selecting would read: the size of the
+        smallest match or rating range.
+
+    _select_books(params: BookQueryParameters, matches: dict, scores: dict)
+        -> Iterable:
+        Lazily selects the books that are not soft-deleted and match the query
+        parameters. It reads the most selective match or rating range and checks the
+        other parameters with one compiled predicate, or applies vectorized filters
+        when the catalog is columnar.
+
+    _select_deleted_books(params: BookQueryParameters, predicate: Callable,
+        scores: dict) -> Iterator:
+        Lazily selects the soft-deleted books matching the query parameters by
+        reading them, as they are not in the catalog indexes. The search score of
+        each matching book is added to the scores.
+
+    _scan_ordered(params: BookQueryParameters, predicate: Callable, budget: int)
+        -> list:
+        Walks the books that are not soft-deleted in order and stops at the first
+        `top` books that satisfy the predicate. It returns None if it did not find
+        them within the budget.
+
+    _is_filtered(params: BookQueryParameters) -> bool:
+        Returns True if any query parameter narrows down the books to return.
+
+    _books_after(books: Iterable, cursor: str, key: Callable) -> Iterable:
+        Keeps the books that sort after the book the cursor was created from.
 
-    _limit_books(books: list, limit: int) -> list:
-        Limits the number of books returned to a specified top N value.
+    _sort_books(books: Iterable, limit: int, key: Callable) -> list:
+        Sorts books by the author's last name, or by the given key, keeping only the
+        first N if a limit is given. A limit uses a heap-based partial sort instead
+        of sorting every book.
 
-    _exclude_deleted_books(books: list, include_deleted: bool) -> list:
-        Excludes books marked as soft-deleted from the list of books unless
-        include_deleted is set to True.
+    _get_rank_key(scores: dict) -> Callable:
+        Returns the sort key that ranks search results by score, then by average
+        rating, then by the author's last name.
 
-    _get_author_last_name(author_name: str) -> str:
-        Extracts the last name from the full author name for sorting purposes.
+    _get_cache_key(params: BookQueryParameters) -> tuple:
+        Normalizes the query parameters into a key for QUERY_CACHE.
+
+    _rank_books(params: BookQueryParameters) -> tuple:
+        Lazily applies the query parameters and returns the matching books in order,
+        with the key they are ordered by. Queries for the first `top` books in
+        catalog order scan it when their matches are common enough, and every other
+        filtered query selects and sorts its matches in a single pass.
+
+    _iter_books(params: BookQueryParameters) -> Iterator:
+        Lazily applies the query parameters and yields the matching books in order.
+
+    _follow_log() -> int:
+        Applies the records other workers appended to a shared write-ahead log.
+
+    _write(op: str, new_books: list = None, **fields) -> bool:
+        Appends a write record to the write-ahead log, if there is one, and applies it
+        to BOOKS and BOOK_REVIEWS. The caller holds the WRITE_LOCKS of the books the
+        record changes. A record that cannot be applied raises ValueError before it
+        is logged, unless the caller already built the books it creates.
+
+    _log_and_apply(record: dict, timer: Optional[StageTimer], new_books: list = None)
+        -> bool:
+        Does the work of _write, timing the log and apply stages when the write is
+        sampled by METRICS.
 
     query_book(query_params: BookQueryParameters) -> list:
         Returns a list of books based on the provided query parameters. It applies
-        filters, limits the results, and sorts the list based on the author's last name.
+        filters and returns the first N books ordered by the author's last name, or
+        ranked by relevance when the query searches for words.
+
+    query_book_json(query_params: BookQueryParameters) -> tuple:
+        Returns the books query_book would return as a JSON array stitched together
+        from the cached encoding of each book, with their number and the cursor after
+        the last one.
+
+    stream_books(query_params: BookQueryParameters) -> AsyncIterator:
+        Yields the books query_book would return without building the whole list.
+
+    stream_books_ndjson(query_params: BookQueryParameters) -> AsyncIterator:
+        Yields the books query_book would return as chunks of NDJSON lines.
+
+    get_cursor(book: dict) -> str:
+        Returns the cursor that continues a query after the given book.
+
+    autocomplete(params: AutocompleteQueryParameters) -> list:
+        Returns the most rated authors, titles and categories that start with a
+        prefix.
+
+    get_catalog_version() -> int:
+        Returns a number that changes every time the catalog changes.
+
+    get_reviews_version(isbn: str) -> int:
+        Returns a number that changes every time a review is stored for a book.
+
+    get_query_cache_stats() -> dict:
+        Returns the size and hit, miss and eviction counters of the query cache.
+
+    get_stats(field: str, value: str) -> list:
+        Returns the running aggregates of the books of each author or category.
 
     create_book(book_data: CreateBookRequest) -> dict:
-        Adds a new book to the list using the provided book details and returns
+        Adds a new book to the catalog using the provided book details and returns
         the created book.
 
+    import_books(chunks: AsyncIterator, file_format: str) -> dict:
+        Adds the books of a streamed NDJSON or CSV body to the catalog in batches and
+        reports the rows that could not be imported.
+
     delete_book(book_id: int) -> None:
         Marks a book as soft-deleted based on the provided book ID.
 
@@ -34,11 +162,41 @@ Functions:
         Adds a rating to the specified book and updates its average rating and
         total number of ratings.
 
+    add_ratings(ratings_data: AddRatingsRequest) -> dict:
+        Adds many ratings at once, with a single update per rated book.
+
     create_review(book_id: int, review_data: CreateReviewRequest) -> None:
         Adds a review to the specified book based on the provided review content.
 
-    get_reviews(book_id: int) -> list:
-        Retrieves all reviews for the specified book.
+    get_reviews(book_id: int, params: ReviewQueryParameters) -> list:
+        Retrieves a page of reviews for the specified book.
+
+    replay_log(start: int) -> int:
+        Applies the records in the write-ahead log to BOOKS and BOOK_REVIEWS.
+
+    restore() -> int:
+        Loads the latest snapshot and replays the log records appended after it.
+
+    save_snapshot() -> int:
+        Writes a new snapshot in a background thread, if the log grew since the last
+        one.
+
+    _replace_snapshot(path: str) -> None:
+        Moves a new snapshot over the one at SNAPSHOT_PATH and reads the reviews that
+        were not loaded yet from it.
+
+    save_snapshots(interval: float) -> None:
+        Writes a new snapshot every interval seconds.
+
+    compact_deleted_books() -> int:
+        Moves the books soft-deleted more than COMPACT_AFTER seconds ago to cold
+        storage.
+
+    compact_periodically(interval: float) -> None:
+        Compacts soft-deleted books every interval seconds.
+
+    close_log() -> None:
+        Flushes and closes the write-ahead log.
 
 Example usage:
     Querying books with specific parameters:
@@ -92,100 +250,901 @@ Example usage:
     ```
 """
 
-from typing import Dict, List, Optional
+import asyncio
+import csv
+import gc
+import heapq
+import json
+import math
+import os
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter, ValidationError
+from starlette import status
 
-from api.data import BOOK_REVIEWS, BOOKS
+from api.book import Book, get_author_last_name
+from api.cache import QueryCache
+from api.catalog import INDEXED_FIELDS
+from api.columnar import ColumnarBookCatalog
+from api.cursor import decode_cursor, encode_cursor
+from api.data import BOOK_REVIEWS, BOOKS, COMPACT_AFTER, SNAPSHOT_PATH, WAL
+from api.locks import StripedLock
+from api.metrics import METRICS, StageTimer
 from api.models import (
     AddRatingRequest,
+    AddRatingsRequest,
+    AutocompleteQueryParameters,
     BookQueryParameters,
     CreateBookRequest,
     CreateReviewRequest,
+    ReviewQueryParameters,
 )
+from api.reviews import ReviewStore
+from api.search import match_score
+from api.snapshot import Snapshot, checkpoint, write_snapshot
+from api.wal import apply_record, prepare_record
+
+STREAM_BATCH_SIZE = 1000
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 60
+
+QUERY_CACHE = QueryCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+IMPORT_FORMATS = ("ndjson", "csv")
+IMPORT_BATCH_SIZE = 10_000
+IMPORT_MAX_ERRORS = 1000
+WRITE_LOCK_STRIPES = 64
+WRITE_LOCKS = StripedLock(WRITE_LOCK_STRIPES)
+
+_SORT_KEY = attrgetter("sort_key")
+# An ordered scan may visit up to one in this many of the books selecting would read.
+_SCAN_SHARE = 4
+
+# The offset up to which the records of a shared log have been applied, and the results
+# of this worker's records that were appended but not yet applied.
+_LOG_OFFSET = 0
+_PENDING_WRITES: Dict[int, Optional[bool]] = {}
+# The snapshot the reviews in BOOK_REVIEWS that were not loaded yet are read from.
+_SNAPSHOT: Optional[Snapshot] = None
+_CREATE_BOOK_REQUESTS = TypeAdapter(List[CreateBookRequest])
+
+
+def _compile_predicate(
+    params: BookQueryParameters,
+    scores: Optional[Mapping[str, int]] = None,
+    skip: Collection[str] = (),
+) -> Optional[Callable[[Book], bool]]:
+    isbn = params.isbn if "isbn" not in skip else None
+    author = (
+        params.author.casefold() if params.author and "author" not in skip else None
+    )
+    category = (
+        params.category.casefold()
+        if params.category and "category" not in skip
+        else None
+    )
+    by_rating = "rating" not in skip and (
+        params.min_rating is not None or params.max_rating is not None
+    )
+    min_rating = -math.inf if params.min_rating is None else params.min_rating
+    max_rating = math.inf if params.max_rating is None else params.max_rating
+    scores = scores if "q" not in skip else None
+
+    if not (isbn or author or category or by_rating or scores is not None):
+        return None
+
+    def predicate(book: Book) -> bool:
+        if isbn and book.isbn != isbn:
+            return False
+
+        if author and book.author.casefold() != author:
+            return False
+
+        if category and book.category.casefold() != category:
+            return False
+
+        if by_rating and (
+            book.avg_rating is None or not min_rating <= book.avg_rating <= max_rating
+        ):
+            return False
+
+        return scores is None or book.isbn in scores
+
+    return predicate
+
+
+def _get_matches(
+    params: BookQueryParameters, scores: Optional[Mapping[str, int]]
+) -> Dict[str, Mapping[str, object]]:
+    # Each match maps the ISBNs of the books that satisfy one parameter to a value
+    # that is not used, so the search scores are a match like the indexes.
+    matches: Dict[str, Mapping[str, object]] = {}
+
+    if params.isbn:
+        book = BOOKS.get(params.isbn)
+        matches["isbn"] = {params.isbn: book} if book and not book.soft_deleted else {}
+
+    for field in INDEXED_FIELDS:
+        value = getattr(params, field)
+
+        if value:
+            matches[field] = BOOKS.lookup(field, value)
+
+    if scores is not None:
+        matches["q"] = scores
+
+    return matches
+
+
+def _count_candidates(
+    params: BookQueryParameters, matches: Dict[str, Mapping[str, object]]
+) -> int:
+    counts = [len(match) for match in matches.values()]
+
+    if params.min_rating is not None or params.max_rating is not None:
+        counts.append(BOOKS.count_rating_range(params.min_rating, params.max_rating))
+
+    return min(counts, default=len(BOOKS) - BOOKS.count_deleted())
+
+
+def _select_books(
+    params: BookQueryParameters,
+    matches: Dict[str, Mapping[str, object]],
+    scores: Optional[Mapping[str, int]],
+) -> Iterable[Book]:
+    if isinstance(BOOKS, ColumnarBookCatalog):
+        return BOOKS.select(params, scores)
+
+    smallest = min(matches, key=lambda name: len(matches[name]), default=None)
+
+    if (params.min_rating is not None or params.max_rating is not None) and (
+        smallest is None
+        or BOOKS.count_rating_range(params.min_rating, params.max_rating)
+        < len(matches[smallest])
+    ):
+        smallest = "rating"
+        books = BOOKS.rating_range(params.min_rating, params.max_rating)
+    elif smallest is None:
+        books = BOOKS.iter_ordered()
+    else:
+        books = map(BOOKS.get, matches[smallest])
+
+    # The books read already satisfy the parameter they were read for.
+    predicate = _compile_predicate(params, scores, skip=(smallest,))
+    return books if predicate is None else filter(predicate, books)
+
+
+def _select_deleted_books(
+    params: BookQueryParameters,
+    predicate: Optional[Callable[[Book], bool]],
+    scores: Optional[Dict[str, int]],
+) -> Iterator[Book]:
+    if params.isbn:
+        book = BOOKS.get(params.isbn)
+        books = [book] if book and book.soft_deleted else []
+    else:
+        books = BOOKS.iter_deleted()
+
+    for book in books:
+        if params.q is not None:
+            score = match_score(book, params.q)
+
+            if not score:
+                continue
+
+            # The predicate and the rank key read the score of the book.
+            scores[book.isbn] = score
+
+        if predicate is None or predicate(book):
+            yield book
+
+
+def _scan_ordered(
+    params: BookQueryParameters,
+    predicate: Optional[Callable[[Book], bool]],
+    budget: int,
+) -> Optional[List[Book]]:
+    after = decode_cursor(params.cursor) if params.cursor else None
+    ordered = BOOKS.iter_ordered(after)
+    books = islice(ordered, budget)
+
+    if predicate is not None:
+        books = filter(predicate, books)
+
+    books = list(islice(books, params.top))
+
+    if len(books) == params.top or next(ordered, None) is None:
+        return books
+
+    return None
+
+
+def _is_filtered(params: BookQueryParameters) -> bool:
+    return any(
+        value is not None
+        for value in (
+            params.isbn,
+            params.author,
+            params.category,
+            params.min_rating,
+            params.max_rating,
+            params.q,
+        )
+    )
+
+
+def _books_after(
+    books: Iterable[Book], cursor: str, key: Callable[[Book], Tuple] = _SORT_KEY
+) -> Iterable[Book]:
+    after = decode_cursor(cursor)
+    return (book for book in books if key(book) > after)
+
 
+def _sort_books(
+    books: Iterable[Book],
+    limit: Optional[int],
+    key: Callable[[Book], Tuple] = _SORT_KEY,
+) -> List[Book]:
+    if limit:
+        return heapq.nsmallest(limit, books, key=key)
+    return sorted(books, key=key)
 
-def _filter_books(
-    books: List[Dict[str, Optional[str]]], key: str, value: Optional[str]
-) -> List[dict]:
-    if value:
-        return [
-            book for book in books if book.get(key, "").casefold() == value.casefold()
-        ]
-    return books
 
+def _get_rank_key(scores: Mapping[str, int]) -> Callable[[Book], Tuple]:
+    def rank_key(book: Book) -> Tuple:
+        return (-scores[book.isbn], -(book.avg_rating or 0), *book.sort_key)
 
-def _limit_books(
-    books: List[Dict[str, Optional[str]]], limit: Optional[int]
-) -> List[Dict[str, Optional[str]]]:
-    return books[:limit] if limit else books
+    return rank_key
 
 
-def _exclude_deleted_books(books: List[Dict[str, Optional[str]]]):
-    return [book for book in books if not book.get("soft_deleted", False)]
+def _get_cache_key(params: BookQueryParameters) -> Tuple:
+    key = params.model_dump()
 
+    for field in (*INDEXED_FIELDS, "q"):
+        if key[field]:
+            key[field] = key[field].casefold()
 
-def _get_author_last_name(name: str) -> str:
-    return name.split()[-1]
+    return tuple(key.items())
+
+
+def _rank_books(
+    params: BookQueryParameters, timer: Optional[StageTimer] = None
+) -> Tuple[Iterator[Book], Callable[[Book], Tuple]]:
+    if timer:
+        timer.stage("select")
+
+    if not _is_filtered(params):
+        after = decode_cursor(params.cursor) if params.cursor else None
+        books = BOOKS.iter_ordered(after, deleted=params.return_deleted_books)
+        return islice(books, params.top), _SORT_KEY
+
+    scores = None
+    key = _SORT_KEY
+
+    if params.q is not None:
+        scores = BOOKS.search(params.q)
+        key = _get_rank_key(scores)
+
+    predicate = _compile_predicate(params, scores)
+    matches = _get_matches(params, scores)
+    candidates = _count_candidates(params, matches)
+    walked = len(BOOKS) - BOOKS.count_deleted()
+    budget = candidates // _SCAN_SHARE
+
+    # Walking the catalog in order finds `top` matches after about top * walked /
+    # candidates books if the matches are spread evenly, while selecting reads every
+    # candidate. Matches often cluster in that order, for example when authors keep
+    # to a few categories, so the walk only runs when it is expected to take a small
+    # share of its budget, and it gives up after a share of what selecting reads.
+    # Walking the deleted books as well would sort all of them before the first step.
+    if (
+        key is _SORT_KEY
+        and params.top
+        and not params.return_deleted_books
+        and params.top * walked * _SCAN_SHARE < budget * candidates
+    ):
+        if timer:
+            timer.stage("scan")
+
+        books = _scan_ordered(params, predicate, budget)
+
+        if books is not None:
+            return iter(books), key
+
+    if timer:
+        timer.stage("sort")
+
+    # Filtering, the deleted books and the cursor are lazy, so they run in one pass
+    # in the sort.
+    books = _select_books(params, matches, scores)
+
+    if params.return_deleted_books:
+        books = chain(books, _select_deleted_books(params, predicate, scores))
+
+    if params.cursor:
+        books = _books_after(books, params.cursor, key)
+
+    return iter(_sort_books(books, params.top, key)), key
+
+
+def _iter_books(
+    params: BookQueryParameters, timer: Optional[StageTimer] = None
+) -> Iterator[Book]:
+    return _rank_books(params, timer)[0]
 
 
 async def query_book(params: BookQueryParameters) -> List[dict]:
     """
     Args:
         params: BookQueryParameters object containing the criteria for querying books.
-        Includes author, category, isbn, minimum rating, maximum rating, and a flag for
-        returning deleted books or not.
+        Includes author, category, isbn, minimum rating, maximum rating, a flag for
+        returning deleted books or not, and an optional cursor to continue from.
 
     Returns:
         A list of dictionaries, where each dictionary represents a book that matches the
-        given query parameters.
+        given query parameters. The books are ordered by the author's last name and
+        then by ISBN, or ranked by search score and then by average rating when the
+        query has words to search for, and only the first `top` books are returned if
+        it is given.
+        Results are cached in QUERY_CACHE until the catalog changes.
+    """
+    _follow_log()
+    key = _get_cache_key(params)
+    books = QUERY_CACHE.get(key, BOOKS.version)
+
+    if books is None:
+        timer = METRICS.timer("query_book")
+        books_iter = _iter_books(params, timer)
+
+        if timer:
+            timer.stage("encode")
+
+        books = tuple(book.to_dict() for book in books_iter)
+        QUERY_CACHE.put(key, BOOKS.version, books)
+
+        if timer:
+            timer.stop()
+
+    # Callers get copies, so changing a result does not change later cache hits.
+    return [dict(book) for book in books]
+
+
+async def query_book_json(
+    params: BookQueryParameters,
+) -> Tuple[bytes, int, Optional[str]]:
+    """
+    Returns the books query_book would return, already encoded as a JSON array.
+
+    The array is joined from the cached JSON encoding of each book, so only books that
+    changed since they were last served are encoded again. Results are cached in
+    QUERY_CACHE until the catalog changes, like those of query_book.
+
+    Args:
+        params: BookQueryParameters object containing the criteria for querying books.
+
+    Returns:
+        The JSON array, the number of books in it, and the cursor that continues after
+        the last book, or None if there are no books.
+    """
+    _follow_log()
+    key = ("json", *_get_cache_key(params))
+    result = QUERY_CACHE.get(key, BOOKS.version)
+
+    if result is None:
+        timer = METRICS.timer("query_book")
+        books_iter, sort_key = _rank_books(params, timer)
+
+        if timer:
+            timer.stage("encode")
+
+        books = list(books_iter)
+        body = b"[" + b",".join([book.to_json() for book in books]) + b"]"
+        cursor = encode_cursor(sort_key(books[-1])) if books else None
+        result = (body, len(books), cursor)
+        QUERY_CACHE.put(key, BOOKS.version, result)
+
+        if timer:
+            timer.stop()
+
+    return result
+
+
+async def stream_books(params: BookQueryParameters) -> AsyncIterator[dict]:
+    """
+    Yields the books query_book would return, one at a time.
+
+    Unfiltered queries walk the catalog in order without building a list, so memory
+    use does not grow with the number of books streamed. Filtered queries hold only a
+    list of references to the matching books while they are sorted. The event loop is
+    given a chance to run other requests every STREAM_BATCH_SIZE books.
+
+    Args:
+        params: BookQueryParameters object containing the criteria for querying books.
+
+    Yields:
+        Each book that matches the given query parameters, in query_book order.
+    """
+    _follow_log()
+
+    for i, book in enumerate(_iter_books(params), start=1):
+        yield book.to_dict()
+
+        if i % STREAM_BATCH_SIZE == 0:
+            await asyncio.sleep(0)
+
+
+async def stream_books_ndjson(params: BookQueryParameters) -> AsyncIterator[bytes]:
+    """
+    Yields the books query_book would return as NDJSON, STREAM_BATCH_SIZE lines at a
+    time. Each line is the cached JSON encoding of a book.
+
+    Args:
+        params: BookQueryParameters object containing the criteria for querying books.
+
+    Yields:
+        Chunks of newline-terminated JSON objects, in query_book order.
+    """
+    _follow_log()
+    lines: List[bytes] = []
+
+    for book in _iter_books(params):
+        lines.append(book.to_json())
+
+        if len(lines) == STREAM_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines.clear()
+            await asyncio.sleep(0)
+
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def get_cursor(book: dict) -> str:
+    """
+    Args:
+        book: A book returned by query_book for a query without words to search for.
+
+    Returns:
+        An opaque cursor that makes query_book continue after the given book.
+    """
+    return encode_cursor((get_author_last_name(book["author"]), book["isbn"]))
+
+
+async def autocomplete(params: AutocompleteQueryParameters) -> List[dict]:
+    """
+    Args:
+        params: The prefix to complete and the number of suggestions to return.
+
+    Returns:
+        Up to `k` suggestions, each with the field it comes from (author, title or
+        category), its value and the total number of ratings of the books that are
+        not soft-deleted and have that value. The most rated suggestions come first.
+    """
+    _follow_log()
+    return BOOKS.suggest(params.prefix, params.k)
+
+
+def get_catalog_version() -> int:
+    """
+    Returns:
+        A number that changes every time a book is added, deleted or rated.
+    """
+    _follow_log()
+    return BOOKS.version
+
+
+def get_reviews_version(isbn: str) -> int:
+    """
+    Args:
+        isbn: The ISBN of the book.
+
+    Returns:
+        A number that changes every time a review is stored for the book.
+    """
+    _follow_log()
+    return BOOK_REVIEWS.version(isbn)
+
+
+async def get_query_cache_stats() -> dict:
+    """
+    Returns:
+        The size, limits and hit, miss, eviction, expiration and invalidation counters
+        of QUERY_CACHE.
+    """
+    return QUERY_CACHE.stats()
+
+
+async def get_stats(field: str, value: Optional[str] = None) -> List[dict]:
     """
-    filtered_books = _filter_books(BOOKS, "author", params.author)
-    filtered_books = _filter_books(filtered_books, "category", params.category)
-    filtered_books = _filter_books(filtered_books, "isbn", params.isbn)
+    Returns the running aggregates of the books grouped by a field. They are kept up
+    to date by every write, so reading them does not visit the books.
+
+    Args:
+        field: One of STATS_FIELDS, author or category.
+        value: Optional value of the field to return the aggregates of. The match is
+        case-insensitive.
+
+    Returns:
+        For each value of the field, ordered by value, a dictionary with the number of
+        books that are not soft-deleted, the number of soft-deleted books, and the
+        number, sum and average of the ratings of the books that are not soft-deleted.
+    """
+    _follow_log()
+    groups = sorted(BOOKS.stats(field, value), key=lambda g: g.value.casefold())
+    return [group.to_dict() for group in groups]
+
+
+def _follow_log() -> int:
+    global _LOG_OFFSET
+
+    if WAL is None or not WAL.shared:
+        return 0
+
+    applied = 0
+
+    for record, _LOG_OFFSET in WAL.read(_LOG_OFFSET):
+        result = apply_record(record, BOOKS, BOOK_REVIEWS)
+        applied += 1
+
+        if _LOG_OFFSET in _PENDING_WRITES:
+            _PENDING_WRITES[_LOG_OFFSET] = result
+
+    return applied
+
+
+async def _write(op: str, new_books: Optional[List[Book]] = None, **fields) -> bool:
+    timer = METRICS.timer(op)
+    result = await _log_and_apply(dict(op=op, **fields), timer, new_books)
+
+    if timer:
+        timer.stop()
+
+    return result
+
+
+async def _log_and_apply(
+    record: dict, timer: Optional[StageTimer], new_books: Optional[List[Book]] = None
+) -> bool:
+    # Raises before the record is logged if it could not be applied, so a bad record
+    # never stops the log from being replayed.
+    if new_books is None:
+        new_books = prepare_record(record)
 
-    if params.min_rating is not None:
-        filtered_books = [
-            b
-            for b in filtered_books
-            if b["avg_rating"] is not None and b["avg_rating"] >= params.min_rating
-        ]
+    if WAL is None:
+        if timer:
+            timer.stage("apply")
 
-    if params.max_rating is not None:
-        filtered_books = [
-            b
-            for b in filtered_books
-            if b["avg_rating"] is not None and b["avg_rating"] <= params.max_rating
-        ]
+        return apply_record(record, BOOKS, BOOK_REVIEWS, new_books)
 
-    if not params.return_deleted_books:
-        filtered_books = _exclude_deleted_books(filtered_books)
+    if timer:
+        timer.stage("log")
 
-    filtered_books = _limit_books(filtered_books, params.top)
-    filtered_books.sort(key=lambda b: _get_author_last_name(b["author"]))
-    return filtered_books
+    if not WAL.shared:
+        await WAL.append(record)
+
+        if timer:
+            timer.stage("apply")
+
+        return apply_record(record, BOOKS, BOOK_REVIEWS, new_books)
+
+    # The record is applied when the log is read back, after the records other
+    # workers appended before it, which may happen in another request.
+    end = WAL.write(record)
+    _PENDING_WRITES[end] = None
+
+    try:
+        await WAL.sync()
+
+        if timer:
+            timer.stage("apply")
+
+        _follow_log()
+    finally:
+        result = _PENDING_WRITES.pop(end)
+
+    return bool(result)
 
 
 async def create_book(params: CreateBookRequest) -> dict:
     """
-    Adds a book to the BOOKS list.
+    Adds a book to the BOOKS catalog.
 
     Args:
         params: Contains the attributes of the book to add including title, author,
         category, and ISBN.
-    """
 
-    book = dict(
+    Raises:
+        HTTPException: If a book with the same ISBN already exists.
+    """
+    book = Book(
         title=params.title,
         author=params.author,
         category=params.category,
         isbn=params.isbn,
         avg_rating=None,
-        num_ratings=None,
+        num_ratings=0,
+        sum_ratings=0,
         soft_deleted=False,
+    ).to_dict()
+
+    msg = f"A book with ISBN {params.isbn} already exists."
+
+    async with WRITE_LOCKS.hold(params.isbn):
+        _follow_log()
+
+        if params.isbn in BOOKS:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=msg)
+
+        # Another worker may have added the same ISBN before this record.
+        if not await _write("create_book", book=book):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=msg)
+
+    return dict(book)
+
+
+async def _iter_batches(
+    chunks: AsyncIterator[bytes], size: int
+) -> AsyncIterator[List[bytes]]:
+    batch: List[bytes] = []
+    rest = b""
+
+    async for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        batch.extend(lines)
+
+        while len(batch) >= size:
+            yield batch[:size]
+            del batch[:size]
+
+    if rest:
+        batch.append(rest)
+
+    if batch:
+        yield batch
+
+
+def _get_error(line: int, detail: str) -> dict:
+    return dict(line=line, detail=detail)
+
+
+def _get_validation_error(line: int, error: ValidationError) -> dict:
+    details = (
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors()
     )
+    return _get_error(line, "; ".join(details))
+
+
+def _validate_rows(
+    rows: List[Tuple[int, Any]], errors: List[dict]
+) -> List[Tuple[int, dict]]:
+    try:
+        requests = _CREATE_BOOK_REQUESTS.validate_python([data for _, data in rows])
+        books = _CREATE_BOOK_REQUESTS.dump_python(requests)
+        return [(line, book) for (line, _), book in zip(rows, books)]
+    except ValidationError:
+        pass
+
+    # Validating rows one at a time tells which of them are invalid.
+    valid = []
+
+    for line, data in rows:
+        try:
+            valid.append((line, CreateBookRequest.model_validate(data).model_dump()))
+        except ValidationError as e:
+            errors.append(_get_validation_error(line, e))
+
+    return valid
+
+
+def _parse_ndjson(
+    rows: List[Tuple[int, bytes]], errors: List[dict]
+) -> List[Tuple[int, Any]]:
+    objects = []
+
+    # Each line is parsed on its own, so a malformed line cannot run into the next.
+    for line, data in rows:
+        try:
+            objects.append((line, json.loads(data)))
+        except ValueError as e:
+            errors.append(_get_error(line, f"Invalid JSON: {e}."))
+
+    return objects
+
+
+def _read_csv(
+    lines: List[Tuple[int, str]], final: bool, errors: List[dict]
+) -> Tuple[List[Tuple[int, List[str]]], List[Tuple[int, str]]]:
+    consumed = 0
+
+    def source() -> Iterator[str]:
+        nonlocal consumed
+
+        while consumed < len(lines):
+            consumed += 1
+            yield lines[consumed - 1][1] + "\n"
+
+    # A quoted value may hold line breaks, so records are read from the lines rather
+    # than one per line.
+    reader = csv.reader(source(), strict=True)
+    records = []
+
+    while True:
+        start = consumed
+
+        try:
+            values = next(reader)
+        except StopIteration:
+            return records, []
+        except csv.Error as e:
+            # The lines ran out inside a quoted value, which may end in the next batch.
+            if consumed == len(lines) and not final:
+                return records, lines[start:]
+
+            # A stray quote would otherwise swallow the lines after it, so reading
+            # starts again at the line after the one the bad record starts on.
+            errors.append(_get_error(lines[start][0], f"Invalid CSV: {e}."))
+            consumed = start + 1
+            reader = csv.reader(source(), strict=True)
+            continue
+
+        records.append((lines[start][0], values))
+
+
+def _get_csv_rows(
+    records: List[Tuple[int, List[str]]],
+    header: Optional[List[str]],
+    errors: List[dict],
+) -> Tuple[Optional[List[str]], List[Tuple[int, dict]]]:
+    rows = []
+
+    for line, values in records:
+        if not values or len(values) == 1 and not values[0].strip():
+            continue
+
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) == len(header):
+            rows.append((line, dict(zip(header, values))))
+        else:
+            msg = f"Expected {len(header)} values but found {len(values)}."
+            errors.append(_get_error(line, msg))
+
+    return header, rows
+
+
+async def _iter_rows(
+    chunks: AsyncIterator[bytes], file_format: str
+) -> AsyncIterator[Tuple[List[Tuple[int, Any]], List[dict]]]:
+    header: Optional[List[str]] = None
+    carry: List[Tuple[int, str]] = []
+    line = 0
+
+    async for batch in _iter_batches(chunks, IMPORT_BATCH_SIZE):
+        errors: List[dict] = []
+
+        if file_format != "csv":
+            rows = []
+
+            for data in batch:
+                line += 1
+
+                if data.strip():
+                    rows.append((line, data))
+
+            yield _parse_ndjson(rows, errors), errors
+            continue
+
+        lines = carry
+
+        for data in batch:
+            line += 1
+
+            try:
+                # Excel and PowerShell start UTF-8 files with a byte order mark.
+                encoding = "utf-8-sig" if line == 1 else "utf-8"
+                lines.append((line, data.rstrip(b"\r").decode(encoding)))
+            except UnicodeDecodeError as e:
+                errors.append(_get_error(line, f"Invalid UTF-8: {e}."))
+
+        records, carry = _read_csv(lines, False, errors)
+        header, rows = _get_csv_rows(records, header, errors)
+        yield rows, errors
+
+    if carry:
+        errors = []
+        records, _ = _read_csv(carry, True, errors)
+        header, rows = _get_csv_rows(records, header, errors)
+        yield rows, errors
+
+    if file_format == "csv" and header is None:
+        msg = "The CSV body must start with a header row."
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
+
+
+async def import_books(chunks: AsyncIterator[bytes], file_format: str) -> dict:
+    """
+    Adds the books of a streamed NDJSON or CSV body to the BOOKS catalog.
+
+    Rows are read IMPORT_BATCH_SIZE at a time. Each batch is validated with a single
+    call, and row by row only when the batch holds an invalid row, so the rows that
+    are wrong can be reported. The valid books of a batch are then added to the
+    catalog and its indexes at once, and written to the write-ahead log as a single
+    record. Books whose ISBN is already in the catalog or earlier in the body are
+    not imported.
+
+    Args:
+        chunks: The body, in chunks of any size. NDJSON bodies have one book object
+        per line. CSV bodies start with a header row naming the title, author,
+        category and isbn columns, and have one book per record. Quoted values may
+        span lines.
+        file_format: One of IMPORT_FORMATS.
 
-    BOOKS.append(book)
+    Returns:
+        A dictionary with the number of books imported, the number of rows that were
+        not, and the line number and reason of the first IMPORT_MAX_ERRORS of those.
+        The line number of a CSV record is that of its first line.
+
+    Raises:
+        HTTPException: If a CSV body has no header row.
+    """
+    imported = failed = 0
+    errors: List[dict] = []
+
+    async for rows, batch_errors in _iter_rows(chunks, file_format):
+        valid = _validate_rows(rows, batch_errors) if rows else []
+        books = []
+        new_books = []
+        isbns = set()
+
+        async with WRITE_LOCKS.hold(*(book["isbn"] for _, book in valid)):
+            _follow_log()
+
+            for line_number, book in valid:
+                isbn = book["isbn"]
+
+                if isbn in BOOKS or isbn in isbns:
+                    msg = f"A book with ISBN {isbn} already exists."
+                    batch_errors.append(_get_error(line_number, msg))
+                    continue
+
+                # Only rows that build a book are logged, so the batch record can
+                # always be replayed.
+                try:
+                    new_book = prepare_record(dict(op="create_book", book=book))[0]
+                except ValueError as e:
+                    batch_errors.append(_get_error(line_number, str(e)))
+                    continue
+
+                isbns.add(isbn)
+                books.append(book)
+                new_books.append(new_book)
+
+            if books:
+                await _write("create_books", new_books, books=books)
+
+        imported += len(books)
+        failed += len(batch_errors)
+        batch_errors.sort(key=itemgetter("line"))
+        errors.extend(batch_errors[: IMPORT_MAX_ERRORS - len(errors)])
 
-    return book
+    return dict(imported=imported, failed=failed, errors=errors)
 
 
 async def delete_book(isbn: str) -> None:
@@ -196,22 +1155,57 @@ async def delete_book(isbn: str) -> None:
     Marks the book identified by the provided ISBN as 'soft deleted' in the BOOKS
     collection.
     """
-    books = [b for b in BOOKS if b["isbn"] == isbn]
+    async with WRITE_LOCKS.hold(isbn):
+        _follow_log()
 
-    if books:
-        books[0]["soft_deleted"] = True
+        if isbn in BOOKS:
+            await _write("delete_book", isbn=isbn)
 
 
 async def add_rating(isbn: str, params: AddRatingRequest):
-    books = [b for b in BOOKS if b["isbn"] == isbn]
+    async with WRITE_LOCKS.hold(isbn):
+        _follow_log()
+
+        if isbn in BOOKS:
+            await _write("add_rating", isbn=isbn, rating=params.rating)
+
+
+async def add_ratings(params: AddRatingsRequest) -> dict:
+    """
+    Adds many ratings at once. The ratings are grouped by ISBN, and each book gets a
+    single update that adds the number and the sum of its ratings, so its average
+    rating and its place in the rating index change only once.
+
+    Args:
+        params: The ratings to add.
+
+    Returns:
+        A dictionary with the number of ratings added, the number of books rated, and
+        the ISBNs of the books that do not exist, whose ratings were ignored.
+    """
+    groups: Dict[str, List[float]] = {}
+    missing: Dict[str, None] = {}
+
+    async with WRITE_LOCKS.hold(*(r.isbn for r in params.ratings)):
+        _follow_log()
+
+        for r in params.ratings:
+            if r.isbn not in BOOKS:
+                missing[r.isbn] = None
+                continue
 
-    if len(books) == 0:
-        return
+            group = groups.setdefault(r.isbn, [0, 0])
+            group[0] += 1
+            group[1] += r.rating
 
-    book = books[0]
-    book["num_ratings"] += 1
-    book["sum_ratings"] += params.rating
-    book["avg_rating"] = book["sum_ratings"] / book["num_ratings"]
+        if groups:
+            await _write("add_ratings", ratings=groups)
+
+    return dict(
+        added=sum(count for count, _ in groups.values()),
+        books=len(groups),
+        missing=list(missing),
+    )
 
 
 async def create_review(isbn: str, request: CreateReviewRequest):
@@ -220,26 +1214,181 @@ async def create_review(isbn: str, request: CreateReviewRequest):
         isbn: The International Standard Book Number of the book.
         request: An instance of CreateReviewRequest containing the review to be added.
     """
-    if not any(book for book in BOOKS if book["isbn"] == isbn):
-        return
+    async with WRITE_LOCKS.hold(isbn):
+        _follow_log()
+
+        if isbn in BOOKS:
+            await _write("create_review", isbn=isbn, review=request.review)
+
+
+async def get_reviews(isbn: str, params: Optional[ReviewQueryParameters] = None):
+    """
+    Fetch reviews for a given ISBN from the BOOK_REVIEWS store.
+
+    Args:
+        isbn: A string representing the ISBN for which reviews are to be fetched.
+        params: Optional offset and limit of the page of reviews to fetch.
+
+    Returns:
+        A list with one dictionary holding the ISBN and the requested page of its
+        reviews, or an empty list if the book has no reviews.
+    """
+    _follow_log()
 
-    reviews = [r for r in BOOK_REVIEWS if r["isbn"] == isbn]
+    if isbn not in BOOK_REVIEWS:
+        return []
 
-    if not reviews:
-        reviews.append(dict(isbn=isbn, reviews=[request.review]))
-        return
+    if params is None:
+        params = ReviewQueryParameters()
 
-    reviews[0]["reviews"].append(request.review)
+    reviews = BOOK_REVIEWS.get(isbn, params.offset, params.limit)
+    return [dict(isbn=isbn, reviews=reviews)]
 
 
-async def get_reviews(isbn: str):
+def replay_log(start: int = 0) -> int:
     """
-    Fetch reviews for a given ISBN from the BOOK_REVIEWS list.
+    Applies the records in the write-ahead log to BOOKS and BOOK_REVIEWS.
 
     Args:
-        isbn: A string representing the ISBN for which reviews are to be fetched.
+        start: The offset of the first record to apply.
+
+    Returns:
+        The number of records replayed, or 0 if there is no write-ahead log.
+    """
+    global _LOG_OFFSET
+
+    if WAL is None:
+        return 0
+
+    replayed = 0
+    _LOG_OFFSET = start
+
+    for record, _LOG_OFFSET in WAL.replay(start):
+        apply_record(record, BOOKS, BOOK_REVIEWS)
+        replayed += 1
+
+    return replayed
+
+
+def restore() -> int:
+    """
+    Rebuilds BOOKS and BOOK_REVIEWS at startup, before any request is served.
+
+    If there is a snapshot at SNAPSHOT_PATH, the catalog is loaded from it, its
+    reviews are left in the memory-mapped file until they are read, and only the log
+    records appended after it are replayed. Otherwise the whole log is replayed on top
+    of the seed data, and the result becomes the first snapshot when both the log and
+    snapshots are enabled.
+
+    Returns:
+        The number of log records replayed.
+    """
+    global BOOKS, BOOK_REVIEWS, _SNAPSHOT
+
+    if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+        snapshot = _SNAPSHOT = Snapshot(SNAPSHOT_PATH)
+
+        # The books are long-lived, so the collector would scan millions of objects
+        # while they load and after every later full collection for nothing.
+        gc.disable()
+
+        try:
+            BOOKS = type(BOOKS)(snapshot.books())
+        finally:
+            gc.enable()
+
+        gc.freeze()
+        BOOK_REVIEWS = ReviewStore(unloaded=snapshot.reviews())
+        return replay_log(snapshot.wal_offset)
+
+    replayed = replay_log()
+
+    if SNAPSHOT_PATH and WAL is not None:
+        write_snapshot(SNAPSHOT_PATH, BOOKS, BOOK_REVIEWS, _LOG_OFFSET)
+
+    return replayed
+
+
+async def save_snapshot() -> Optional[int]:
+    """
+    Writes a new snapshot from the previous one and the log records appended after
+    it, unless no record was. The snapshot is written in a background thread, so
+    requests keep being served while it is written.
+
+    Returns:
+        The log offset the snapshot was taken at, or None if the log or snapshots are
+        not enabled.
+    """
+    if WAL is None or not SNAPSHOT_PATH:
+        return None
+
+    path, offset = await asyncio.to_thread(checkpoint, SNAPSHOT_PATH, WAL.path)
+
+    if path is not None:
+        _replace_snapshot(path)
+
+    return offset
+
+
+def _replace_snapshot(path: str) -> None:
+    global _SNAPSHOT
+
+    # Windows cannot replace a mapped file, so the snapshot the unloaded reviews are
+    # read from is closed first and the new one is mapped in its place. Nothing is
+    # awaited in between, so no request reads the reviews while they are unmapped.
+    if _SNAPSHOT is not None:
+        _SNAPSHOT.close()
+
+    try:
+        os.replace(path, SNAPSHOT_PATH)
+    except OSError:
+        os.remove(path)
+        raise
+    finally:
+        if _SNAPSHOT is not None:
+            _SNAPSHOT = Snapshot(SNAPSHOT_PATH)
+            BOOK_REVIEWS.set_unloaded(_SNAPSHOT.reviews())
+
+
+async def save_snapshots(interval: float) -> None:
+    """
+    Calls save_snapshot every interval seconds until it is cancelled.
+
+    Args:
+        interval: The number of seconds between snapshots.
+    """
+    while WAL is not None and SNAPSHOT_PATH:
+        await asyncio.sleep(interval)
+        await save_snapshot()
+
+
+def compact_deleted_books() -> int:
+    """
+    Moves the books that were soft-deleted more than COMPACT_AFTER seconds ago out of
+    the live catalog into cold storage. Compaction does not change query results, so
+    cached results stay valid.
 
     Returns:
-        A list of dictionaries containing reviews that match the given ISBN.
+        The number of books compacted.
+    """
+    return BOOKS.compact(COMPACT_AFTER)
+
+
+async def compact_periodically(interval: float) -> None:
+    """
+    Calls compact_deleted_books every interval seconds until it is cancelled.
+
+    Args:
+        interval: The number of seconds between compactions.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        compact_deleted_books()
+
+
+def close_log() -> None:
+    """
+    Flushes and closes the write-ahead log, if there is one.
     """
-    return [r for r in BOOK_REVIEWS if r["isbn"] == isbn]
+    if WAL is not None:
+        WAL.close()
@@ -0,0 +1,134 @@
+"""
+cache.py
+
+This module defines the cache that holds recent book query results. Entries are kept in
+least-recently-used order, expire after a fixed time to live, and are all dropped as
+soon as the catalog version changes, so a cached result is never older than the last
+write to the catalog.
+
+Classes:
+    QueryCache: An LRU cache with a time to live and version-based invalidation.
+
+Example:
+    ```python
+    cache = QueryCache(maxsize=1024, ttl=60)
+    books = cache.get(key, BOOKS.version)
+
+    if books is None:
+        books = run_query()
+        cache.put(key, BOOKS.version, books)
+
+    print(cache.stats())
+    ```
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class QueryCache:
+    """
+    An LRU cache with a time to live and version-based invalidation.
+
+    Attributes:
+        maxsize (int): The maximum number of entries. The least recently used entry is
+        evicted when a new entry would exceed it.
+        ttl (float): The number of seconds an entry stays valid.
+        hits (int): The number of lookups that returned a cached value.
+        misses (int): The number of lookups that did not.
+        evictions (int): The number of entries evicted to stay within maxsize.
+        expirations (int): The number of entries dropped because they were too old.
+        invalidations (int): The number of entries dropped because the version changed.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            maxsize: The maximum number of entries.
+            ttl: The number of seconds an entry stays valid.
+            clock: Returns the current time in seconds. Tests can replace it.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        """
+        Args:
+            key: The cache key.
+            version: The current version of the data the cached values derive from.
+
+        Returns:
+            The cached value, or None if there is no valid entry for the key.
+        """
+        self._check_version(version)
+        entry = self._entries.get(key)
+
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: int, value: Any) -> None:
+        """
+        Args:
+            key: The cache key.
+            version: The version of the data the value was computed from.
+            value: The value to cache.
+        """
+        self._check_version(version)
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            The size, limits and counters of the cache.
+        """
+        return dict(
+            size=len(self._entries),
+            maxsize=self.maxsize,
+            ttl=self.ttl,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            invalidations=self.invalidations,
+        )
+
+    def _check_version(self, version: int) -> None:
+        if version != self._version:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._version = version
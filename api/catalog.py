@@ -0,0 +1,535 @@
+"""
+catalog.py
+
+This module defines the in-memory store that holds the book catalog. Books are kept in
+the order they were added and are indexed by ISBN, so point lookups and writes do not
+have to scan the whole catalog. Secondary indexes keyed by the casefolded author and
+category let filtered queries start from the matching books only, and a sorted
+rating index answers rating range queries with a binary search. Books are also kept
+sorted by the author's last name, so the first books in that order can be read without
+sorting the catalog. An inverted index over the words of titles and authors answers
+full-text searches, and a sorted-prefix index over authors, titles and categories
+answers typeahead queries. Running aggregates of the books of each author and
+category are kept up to date with every change.
+
+Soft-deleted books are tombstones: they stay reachable by ISBN, but they are taken out
+of every secondary index and the sort order, so queries for books that are not deleted
+never visit them. compact() moves the books that were deleted long enough ago to cold
+storage, where each one is kept as its JSON encoding only. Queries that include
+deleted books read them with iter_deleted().
+
+Attributes:
+    INDEXED_FIELDS (tuple): The book fields that have a secondary index.
+
+Classes:
+    BookCatalog: An ISBN-indexed collection of books.
+
+Example:
+    ```python
+    catalog = BookCatalog()
+    catalog.add(
+        Book(
+            title="1984",
+            author="George Orwell",
+            category="Dystopian",
+            isbn="9780451524935",
+        )
+    )
+    book = catalog.get("9780451524935")
+    orwell_books = catalog.lookup("author", "george orwell")
+    catalog.set_ratings("9780451524935", num_ratings=2, sum_ratings=9)
+    well_rated_books = catalog.rating_range(min_rating=4.0)
+    scores = catalog.search("nineteen eighty")
+    suggestions = catalog.suggest("geo", 5)
+    orwell_stats = catalog.stats("author", "george orwell")
+    first_book = next(catalog.iter_ordered())
+    catalog.mark_deleted("9780451524935")
+    catalog.compact(older_than=3600)
+    deleted_books = list(catalog.iter_deleted())
+    ```
+"""
+
+import heapq
+import json
+import time
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain, count
+from operator import attrgetter, itemgetter
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from api.autocomplete import SuggestionIndex
+from api.book import Book
+from api.search import TextIndex
+from api.stats import CatalogStats, GroupStats
+
+INDEXED_FIELDS = ("author", "category")
+
+_VERSIONS = count()
+_SORT_KEY = attrgetter("sort_key")
+
+
+def _decode(data: bytes) -> Book:
+    return Book.from_dict(json.loads(data))
+
+
+def _merge_sorted(items: list, new: list) -> list:
+    new.sort()
+
+    if not items or not new:
+        return items or new
+
+    merged = []
+    start = 0
+
+    for item in new:
+        stop = bisect_right(items, item, start)
+        merged += items[start:stop]
+        merged.append(item)
+        start = stop
+
+    merged += items[start:]
+    return merged
+
+
+class BookCatalog:
+    """
+    An in-memory collection of books indexed by ISBN.
+
+    Iterating over the catalog yields the books in the order they were added, with
+    the books moved to cold storage last, while iter_ordered() yields them by their
+    sort_key. The catalog holds references to the books it is given, so changes made
+    to a book are visible to every reader of the catalog. Books in cold storage are
+    decoded each time they are read, and moved back in memory when they are changed.
+
+    Attributes:
+        version (int): Changes every time a book is added, removed, rated or marked
+        as deleted. Versions are unique across catalogs, so a version identifies one
+        state of one catalog.
+    """
+
+    def __init__(self, books: Optional[Iterable[Book]] = None):
+        """
+        Args:
+            books: Optional books to load into the catalog.
+        """
+        self._books: Dict[str, Book] = {}
+        # The soft-deleted books in _books, in the order they were deleted, with the
+        # time.monotonic() at which they were, and the books moved to cold storage.
+        self._deleted: Dict[str, float] = {}
+        self._cold: Dict[str, bytes] = {}
+        self._indexes: Dict[str, Dict[str, Dict[str, Book]]] = {
+            field: {} for field in INDEXED_FIELDS
+        }
+        self._text = TextIndex()
+        self._suggestions = SuggestionIndex()
+        self._stats = CatalogStats()
+        self._ratings: List[Tuple[float, str]] = []
+        self._order: List[Tuple[str, str]] = []
+        self._order_changes = 0
+        self.version = next(_VERSIONS)
+
+        if books is not None:
+            self.add_many(books)
+
+    def __len__(self) -> int:
+        return len(self._books) + len(self._cold)
+
+    def __iter__(self) -> Iterator[Book]:
+        return chain(self._books.values(), map(_decode, self._cold.values()))
+
+    def __contains__(self, isbn: object) -> bool:
+        return isbn in self._books or isbn in self._cold
+
+    def get(self, isbn: str) -> Optional[Book]:
+        """
+        Args:
+            isbn: The ISBN of the book to look up.
+
+        Returns:
+            The book with the given ISBN, or None if the catalog does not contain it.
+        """
+        book = self._books.get(isbn)
+
+        if book is None and isbn in self._cold:
+            return _decode(self._cold[isbn])
+
+        return book
+
+    def add(self, book: Book) -> None:
+        """
+        Adds a book to the catalog.
+
+        Args:
+            book: The book to add.
+
+        Raises:
+            ValueError: If the catalog already contains a book with the same ISBN.
+        """
+        self._insert(book)
+
+        if not book.soft_deleted:
+            if book.avg_rating is not None:
+                insort(self._ratings, (book.avg_rating, book.isbn))
+
+            insort(self._order, book.sort_key)
+            self._order_changes += 1
+
+        self.version = next(_VERSIONS)
+
+    def add_many(self, books: Iterable[Book]) -> None:
+        """
+        Adds books to the catalog in bulk. The new books are sorted once and merged
+        into the rating and sort order indexes, instead of being inserted one at a
+        time, so adding k books to a catalog of n books takes O(k log n) comparisons
+        and a single O(n) copy of each index.
+
+        Args:
+            books: The books to add.
+
+        Raises:
+            ValueError: If the catalog already contains a book with the same ISBN.
+            The books before it are added.
+        """
+        ratings: List[Tuple[float, str]] = []
+        order: List[Tuple[str, str]] = []
+
+        try:
+            for book in books:
+                self._insert(book)
+
+                if book.soft_deleted:
+                    continue
+
+                if book.avg_rating is not None:
+                    ratings.append((book.avg_rating, book.isbn))
+
+                order.append(book.sort_key)
+        finally:
+            self._ratings = _merge_sorted(self._ratings, ratings)
+            self._order = _merge_sorted(self._order, order)
+            self._order_changes += 1
+            self.version = next(_VERSIONS)
+
+    def remove(self, isbn: str) -> Optional[Book]:
+        """
+        Removes a book from the catalog and its secondary indexes.
+
+        Args:
+            isbn: The ISBN of the book to remove.
+
+        Returns:
+            The removed book, or None if the catalog does not contain it.
+        """
+        if isbn in self._cold:
+            book = _decode(self._cold.pop(isbn))
+        else:
+            book = self._books.pop(isbn, None)
+
+            if book is None:
+                return None
+
+            if book.soft_deleted:
+                del self._deleted[isbn]
+            else:
+                self._unindex(book)
+
+        self._stats.remove(book)
+        self.version = next(_VERSIONS)
+
+        return book
+
+    def lookup(self, field: str, value: str) -> Mapping[str, Book]:
+        """
+        Args:
+            field: One of INDEXED_FIELDS.
+            value: The value to match. The match is case-insensitive.
+
+        Returns:
+            A read-only mapping from ISBN to book for every book that is not
+            soft-deleted and whose field matches the value, in the order the books
+            were added.
+        """
+        return self._indexes[field].get(value.casefold(), {})
+
+    def search(self, query: str) -> Dict[str, int]:
+        """
+        Args:
+            query: The words to search for in the titles and authors of the books.
+            Matching is case-insensitive, and each word also matches the words it is
+            a prefix of.
+
+        Returns:
+            A mapping from ISBN to score for every book that is not soft-deleted and
+            matches all the words of the query. The score counts the words of the
+            title and author that match. The time taken grows with the number of
+            matches, not with the size of the catalog.
+        """
+        return self._text.search(query)
+
+    def suggest(self, prefix: str, k: int) -> List[dict]:
+        """
+        Args:
+            prefix: The start of an author, title or category. Matching is
+            case-insensitive.
+            k: The number of suggestions to return, at most MAX_SUGGESTIONS.
+
+        Returns:
+            Up to k authors, titles and categories of books that are not
+            soft-deleted and start with the prefix, ordered by the total number of
+            ratings of their books, most rated first.
+        """
+        return self._suggestions.suggest(prefix, k)
+
+    def stats(self, field: str, value: Optional[str] = None) -> List[GroupStats]:
+        """
+        Args:
+            field: One of STATS_FIELDS.
+            value: Optional value of the field. The match is case-insensitive.
+
+        Returns:
+            The aggregates of the books of every value of the field, or of the given
+            value only. Each takes constant time to read.
+        """
+        if value is None:
+            return list(self._stats.groups(field))
+
+        group = self._stats.get(field, value)
+        return [group] if group else []
+
+    def iter_deleted(self) -> Iterator[Book]:
+        """
+        Yields:
+            The soft-deleted books, those in memory first and then those in cold
+            storage, in no particular order.
+        """
+        for isbn in list(self._deleted):
+            book = self._books.get(isbn)
+
+            if book is not None:
+                yield book
+
+        for data in list(self._cold.values()):
+            yield _decode(data)
+
+    def count_deleted(self) -> int:
+        """
+        Returns:
+            The number of soft-deleted books, in memory and in cold storage.
+        """
+        return len(self._deleted) + len(self._cold)
+
+    def iter_ordered(
+        self, after: Optional[Tuple[str, str]] = None, deleted: bool = False
+    ) -> Iterator[Book]:
+        """
+        Args:
+            after: Optional sort key. Only books that sort after it are yielded.
+            deleted: True to also yield the soft-deleted books.
+
+        Yields:
+            The books in the catalog ordered by their sort_key. Books added or
+            removed while the iterator is suspended are seen or skipped according to
+            where they sort, and no book is yielded twice. Without `deleted`, only
+            the books that are not soft-deleted are visited. With it, the deleted
+            books are sorted when the iteration starts and merged with the others.
+        """
+        books = self._iter_live(after)
+
+        if not deleted:
+            return books
+
+        deleted_books = sorted(
+            (
+                book
+                for book in self.iter_deleted()
+                if not after or book.sort_key > after
+            ),
+            key=_SORT_KEY,
+        )
+        return heapq.merge(books, deleted_books, key=_SORT_KEY)
+
+    def compact(self, older_than: float) -> int:
+        """
+        Moves the books that were soft-deleted at least `older_than` seconds ago to
+        cold storage. Only their JSON encoding is kept there, so they stop holding a
+        Book object. It does not change any query result, so the version is kept.
+
+        Args:
+            older_than: The number of seconds a book must have been deleted for.
+
+        Returns:
+            The number of books moved to cold storage.
+        """
+        cutoff = time.monotonic() - older_than
+        moved = 0
+
+        # Books are in the order they were deleted, so the oldest come first.
+        for isbn, deleted_at in list(self._deleted.items()):
+            if deleted_at > cutoff:
+                break
+
+            self._cold[isbn] = self._books.pop(isbn).to_json()
+            del self._deleted[isbn]
+            moved += 1
+
+        return moved
+
+    def _iter_live(self, after: Optional[Tuple[str, str]]) -> Iterator[Book]:
+        i = bisect_right(self._order, after) if after else 0
+        changes = self._order_changes
+
+        while i < len(self._order):
+            sort_key = self._order[i]
+            yield self._books[sort_key[1]]
+
+            if changes != self._order_changes:
+                i = bisect_right(self._order, sort_key)
+                changes = self._order_changes
+            else:
+                i += 1
+
+    def set_ratings(self, isbn: str, num_ratings: int, sum_ratings: float) -> None:
+        """
+        Sets the rating totals of a book, recomputes its average rating, and moves it
+        within the rating index.
+
+        Args:
+            isbn: The ISBN of the book to update.
+            num_ratings: The new number of ratings of the book.
+            sum_ratings: The new sum of the ratings of the book.
+        """
+        book = self._thaw(isbn)
+        self._stats.set_ratings(book, num_ratings, sum_ratings)
+        live = not book.soft_deleted
+
+        if live:
+            self._unindex_rating(book)
+            self._suggestions.add_ratings(book, num_ratings - (book.num_ratings or 0))
+
+        book.num_ratings = num_ratings
+        book.sum_ratings = sum_ratings
+        book.avg_rating = sum_ratings / num_ratings if num_ratings else None
+        book.clear_json()
+
+        if live and book.avg_rating is not None:
+            insort(self._ratings, (book.avg_rating, isbn))
+
+        self.version = next(_VERSIONS)
+
+    def mark_deleted(self, isbn: str) -> None:
+        """
+        Marks a book as soft-deleted. The book stays in the catalog, but it is taken
+        out of the secondary indexes and the sort order.
+
+        Args:
+            isbn: The ISBN of the book to mark.
+        """
+        book = self._thaw(isbn)
+        self._stats.mark_deleted(book)
+
+        if not book.soft_deleted:
+            self._unindex(book)
+            self._deleted[isbn] = time.monotonic()
+
+        book.soft_deleted = True
+        book.clear_json()
+        self.version = next(_VERSIONS)
+
+    def count_rating_range(
+        self, min_rating: Optional[float] = None, max_rating: Optional[float] = None
+    ) -> int:
+        """
+        Args:
+            min_rating: The inclusive lower bound, or None for no lower bound.
+            max_rating: The inclusive upper bound, or None for no upper bound.
+
+        Returns:
+            The number of rated books that are not soft-deleted and whose average
+            rating is within the bounds.
+        """
+        start, stop = self._rating_bounds(min_rating, max_rating)
+        return max(0, stop - start)
+
+    def rating_range(
+        self, min_rating: Optional[float] = None, max_rating: Optional[float] = None
+    ) -> List[Book]:
+        """
+        Args:
+            min_rating: The inclusive lower bound, or None for no lower bound.
+            max_rating: The inclusive upper bound, or None for no upper bound.
+
+        Returns:
+            The rated books that are not soft-deleted and whose average rating is
+            within the bounds, ordered by average rating. Books without ratings are
+            never returned.
+        """
+        start, stop = self._rating_bounds(min_rating, max_rating)
+        return [self._books[isbn] for _, isbn in self._ratings[start:stop]]
+
+    def _insert(self, book: Book) -> None:
+        isbn = book.isbn
+
+        if isbn in self:
+            msg = f"A book with ISBN {isbn} already exists."
+            raise ValueError(msg)
+
+        self._books[isbn] = book
+        self._stats.add(book)
+
+        if book.soft_deleted:
+            self._deleted[isbn] = time.monotonic()
+            return
+
+        for field, index in self._indexes.items():
+            index.setdefault(getattr(book, field).casefold(), {})[isbn] = book
+
+        self._text.add(book)
+        self._suggestions.add(book)
+
+    def _unindex(self, book: Book) -> None:
+        # Takes a book that is not soft-deleted out of the indexes and the sort order.
+        isbn = book.isbn
+
+        for field, index in self._indexes.items():
+            key = getattr(book, field).casefold()
+            matches = index[key]
+            del matches[isbn]
+
+            if not matches:
+                del index[key]
+
+        self._text.remove(book)
+        self._suggestions.remove(book)
+        self._unindex_rating(book)
+        del self._order[bisect_left(self._order, book.sort_key)]
+        self._order_changes += 1
+
+    def _thaw(self, isbn: str) -> Book:
+        book = self._books.get(isbn)
+
+        if book is None:
+            book = self._books[isbn] = _decode(self._cold.pop(isbn))
+            self._deleted[isbn] = time.monotonic()
+
+        return book
+
+    def _rating_bounds(
+        self, min_rating: Optional[float], max_rating: Optional[float]
+    ) -> Tuple[int, int]:
+        start = 0
+        stop = len(self._ratings)
+
+        if min_rating is not None:
+            start = bisect_left(self._ratings, min_rating, key=itemgetter(0))
+
+        if max_rating is not None:
+            stop = bisect_right(self._ratings, max_rating, key=itemgetter(0))
+
+        return start, stop
+
+    def _unindex_rating(self, book: Book) -> None:
+        if book.avg_rating is None:
+            return
+
+        entry = (book.avg_rating, book.isbn)
+        del self._ratings[bisect_left(self._ratings, entry)]
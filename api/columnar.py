@@ -0,0 +1,208 @@
+"""
+columnar.py
+
+This module defines an optional, NumPy-backed catalog for analytical queries. Next to
+the row store and indexes of BookCatalog, it keeps the rating totals, average rating
+and dictionary-encoded author and category of every book that is not soft-deleted in
+NumPy arrays. Query filters then run as vectorized boolean masks over those arrays
+instead of Python loops over the books. Per-author and per-category aggregates come
+from the running aggregates of BookCatalog, which are already kept up to date.
+
+NumPy is not a required dependency. The module can be imported without it, but
+creating a ColumnarBookCatalog raises ImportError when NumPy is not installed.
+
+Classes:
+    ColumnarBookCatalog: A BookCatalog that also keeps its books in NumPy columns.
+
+Example:
+    ```python
+    catalog = ColumnarBookCatalog(books)
+    params = BookQueryParameters(category="Classic", min_rating=4.5)
+    classics = catalog.select(params)
+    ```
+"""
+
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from api.book import Book
+from api.catalog import INDEXED_FIELDS, BookCatalog
+from api.models import BookQueryParameters
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without NumPy
+    np = None
+
+_INITIAL_CAPACITY = 1024
+
+
+class _Dictionary:
+    """
+    Encodes the casefolded values of a book field as small integer codes.
+    """
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        key = value.casefold()
+        code = self.codes.get(key)
+
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+
+        return code
+
+
+class ColumnarBookCatalog(BookCatalog):
+    """
+    A BookCatalog that also keeps its books in NumPy columns.
+
+    Each book that is not soft-deleted is assigned a row when it is added. Rows of
+    removed and soft-deleted books are never reused; they are cleared in the `live`
+    column so no query matches them again, and soft-deleted books are read through
+    the tombstones of BookCatalog instead.
+    """
+
+    def __init__(self, books: Optional[Iterable[Book]] = None):
+        """
+        Args:
+            books: Optional books to load into the catalog.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if np is None:
+            msg = "The columnar catalog requires NumPy. Install it with pip."
+            raise ImportError(msg)
+
+        self._rows: Dict[str, int] = {}
+        self._row_books: List[Optional[Book]] = []
+        self._dictionaries = {field: _Dictionary() for field in INDEXED_FIELDS}
+        self._columns = dict(
+            live=np.zeros(_INITIAL_CAPACITY, dtype=bool),
+            avg_rating=np.full(_INITIAL_CAPACITY, np.nan),
+            num_ratings=np.zeros(_INITIAL_CAPACITY, dtype=np.int64),
+            sum_ratings=np.zeros(_INITIAL_CAPACITY),
+            author=np.zeros(_INITIAL_CAPACITY, dtype=np.int32),
+            category=np.zeros(_INITIAL_CAPACITY, dtype=np.int32),
+        )
+
+        super().__init__(books)
+
+    def remove(self, isbn: str) -> Optional[Book]:
+        book = super().remove(isbn)
+
+        if book is not None:
+            self._clear_row(isbn)
+
+        return book
+
+    def set_ratings(self, isbn: str, num_ratings: int, sum_ratings: float) -> None:
+        super().set_ratings(isbn, num_ratings, sum_ratings)
+        row = self._rows.get(isbn)
+
+        if row is not None:
+            self._store_state(row, self.get(isbn))
+
+    def mark_deleted(self, isbn: str) -> None:
+        super().mark_deleted(isbn)
+        self._clear_row(isbn)
+
+    def select(
+        self,
+        params: BookQueryParameters,
+        scores: Optional[Mapping[str, int]] = None,
+    ) -> List[Book]:
+        """
+        Selects the books matching the query filters with vectorized masks.
+
+        Args:
+            params: The query parameters. The ISBN, author, category, search and
+            rating parameters are applied. Soft-deleted books, ordering, cursors and
+            `top` are left to the caller.
+            scores: The result of searching for `params.q`, if the caller already
+            has it.
+
+        Returns:
+            The matching books that are not soft-deleted, in the order they were added
+            to the catalog.
+        """
+        size = len(self._row_books)
+        columns = {name: column[:size] for name, column in self._columns.items()}
+        mask = columns["live"].copy()
+
+        if params.isbn:
+            row = self._rows.get(params.isbn)
+            mask[:] = False
+
+            if row is not None:
+                mask[row] = True
+
+        for field, dictionary in self._dictionaries.items():
+            value = getattr(params, field)
+
+            if value:
+                code = dictionary.codes.get(value.casefold())
+
+                if code is None:
+                    return []
+
+                mask &= columns[field] == code
+
+        if params.q is not None:
+            if scores is None:
+                scores = self.search(params.q)
+
+            found = np.zeros(size, dtype=bool)
+            found[[self._rows[isbn] for isbn in scores]] = True
+            mask &= found
+
+        if params.min_rating is not None:
+            mask &= columns["avg_rating"] >= params.min_rating
+
+        if params.max_rating is not None:
+            mask &= columns["avg_rating"] <= params.max_rating
+
+        return [self._row_books[row] for row in np.flatnonzero(mask)]
+
+    def _insert(self, book: Book) -> None:
+        super()._insert(book)
+
+        if book.soft_deleted:
+            return
+
+        row = len(self._row_books)
+
+        if row == len(self._columns["live"]):
+            self._grow()
+
+        self._rows[book.isbn] = row
+        self._row_books.append(book)
+        self._columns["live"][row] = True
+
+        for field, dictionary in self._dictionaries.items():
+            self._columns[field][row] = dictionary.encode(getattr(book, field))
+
+        self._store_state(row, book)
+
+    def _clear_row(self, isbn: str) -> None:
+        row = self._rows.pop(isbn, None)
+
+        if row is not None:
+            self._row_books[row] = None
+            self._columns["live"][row] = False
+
+    def _store_state(self, row: int, book: Book) -> None:
+        avg_rating = book.avg_rating
+        self._columns["avg_rating"][row] = np.nan if avg_rating is None else avg_rating
+        self._columns["num_ratings"][row] = book.num_ratings or 0
+        self._columns["sum_ratings"][row] = book.sum_ratings or 0
+
+    def _grow(self) -> None:
+        for name, column in self._columns.items():
+            grown = np.resize(column, len(column) * 2)
+            grown[len(column) :] = np.nan if name == "avg_rating" else 0
+            self._columns[name] = grown
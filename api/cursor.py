@@ -0,0 +1,68 @@
+"""
+cursor.py
+
+This module encodes and decodes the opaque cursors used to page through book query
+results. A cursor holds the sort key of the last book on a page, which is the author's
+last name followed by the ISBN, so the next page starts right after that book. Search
+results are ranked before they are sorted, so their cursors hold the negated search
+score and average rating of the book before its sort key.
+
+Functions:
+    encode_cursor(sort_key: tuple) -> str:
+        Encodes a sort key as an opaque, URL-safe cursor.
+
+    decode_cursor(cursor: str) -> tuple:
+        Decodes a cursor back into a sort key.
+"""
+
+import base64
+import json
+from typing import Tuple
+
+_CURSOR_SIZES = (2, 4)
+
+
+def encode_cursor(sort_key: Tuple) -> str:
+    """
+    Args:
+        sort_key: The sort key of the last book on a page.
+
+    Returns:
+        A URL-safe string that can be passed back as the `cursor` query parameter.
+    """
+    data = json.dumps(list(sort_key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """
+    Args:
+        cursor: A cursor created by encode_cursor.
+
+    Returns:
+        The sort key the cursor was created from.
+
+    Raises:
+        ValueError: If the cursor was not created by encode_cursor.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_key = json.loads(data)
+    except ValueError as e:
+        msg = "cursor is not valid."
+        raise ValueError(msg) from e
+
+    if (
+        not isinstance(sort_key, list)
+        or len(sort_key) not in _CURSOR_SIZES
+        or not all(isinstance(value, str) for value in sort_key[-2:])
+        or not all(_is_number(value) for value in sort_key[:-2])
+    ):
+        msg = "cursor is not valid."
+        raise ValueError(msg)
+
+    return tuple(sort_key)
+
+
+def _is_number(value: object) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -2,14 +2,15 @@
 data.py
 
 This module defines a catalog of books and manages a dictionary for storing book
-reviews. Each book is represented as a dictionary with various attributes such as title,
-author, category, ISBN, and ratings information. The module also provides a structure
-to hold book reviews.
+reviews. Each book is represented as a Book record with various attributes such as
+title, author, category, ISBN, and ratings information. The module also provides a
+structure to hold book reviews.
 
 Attributes:
-    BOOKS (list):
-        A list of dictionaries, where each dictionary represents a book with the
-        following keys:
+    BOOKS (BookCatalog):
+        A catalog of Book records indexed by ISBN. Setting the BOOKS_BACKEND
+        environment variable to "columnar" makes it a ColumnarBookCatalog, which needs
+        NumPy. Each book has the following attributes:
             - title (str): The title of the book.
             - author (str): The author of the book.
             - category (str): The category or genre of the book.
@@ -19,16 +20,41 @@ Attributes:
             - sum_ratings (float): The sum of all ratings the book has received.
             - soft_deleted (bool): True if the book is soft-deleted, otherwise False.
 
-    BOOK_REVIEWS (dict):
-        A dictionary where the keys are ISBN numbers (str) of books and the values are
-        lists of reviews (Optional[List[str]]) for the corresponding books. If a book
-        has no reviews, the value is None.
+    BOOK_REVIEWS (ReviewStore):
+        A store where the keys are ISBN numbers (str) of books and the values are
+        lists of reviews (List[str]) for the corresponding books, in the order they
+        were added.
+
+    WAL (Optional[WriteAheadLog]):
+        The write-ahead log that makes writes to BOOKS and BOOK_REVIEWS durable, or
+        None if writes are kept in memory only. Setting the BOOKS_WAL_PATH environment
+        variable enables it, and BOOKS_WAL_FSYNC selects its fsync policy: "always",
+        "batch" (the default) or "never". Setting BOOKS_WAL_SHARED to 1 lets several
+        worker processes share the log and keep their catalogs in step through it.
+
+    SNAPSHOT_PATH (Optional[str]):
+        The path of the snapshot loaded at startup, from the BOOKS_SNAPSHOT_PATH
+        environment variable. When the write-ahead log is enabled, a new snapshot is
+        written there every SNAPSHOT_INTERVAL seconds.
+
+    SNAPSHOT_INTERVAL (float):
+        The number of seconds between snapshots, from the BOOKS_SNAPSHOT_INTERVAL
+        environment variable. The default is 300.
+
+    COMPACT_AFTER (float):
+        The number of seconds a book stays soft-deleted before it is compacted out of
+        the live catalog into cold storage, from the BOOKS_COMPACT_AFTER environment
+        variable. The default is 3600.
+
+    COMPACT_INTERVAL (float):
+        The number of seconds between compactions, from the BOOKS_COMPACT_INTERVAL
+        environment variable. The default is 60.
 
 Example:
-    Adding a book to the BOOKS list:
+    Adding a book to the BOOKS catalog:
     ```python
-    BOOKS.append(
-        dict(
+    BOOKS.add(
+        Book(
             title="New Book",
             author="New Author",
             category="New Category",
@@ -43,89 +69,108 @@ Example:
 
     Adding a review for a book:
     ```python
-    isbn = "9780553380163"
-    if isbn in BOOK_REVIEWS:
-        if BOOK_REVIEWS[isbn] is None:
-            BOOK_REVIEWS[isbn] = []
-        BOOK_REVIEWS[isbn].append("This is a review.")
-    else:
-        BOOK_REVIEWS[isbn] = ["This is a review."]
+    BOOK_REVIEWS.add("9780553380163", "This is a review.")
     ```
 """
 
-from typing import Dict, List
-
-BOOKS = [
-    dict(
-        title="A Brief History of Time",
-        author="Stephen Hawking",
-        category="Science",
-        isbn="9780553380163",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-    dict(
-        title="The Great Gatsby",
-        author="F. Scott Fitzgerald",
-        category="Classic",
-        isbn="9780743273565",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-    dict(
-        title="1984",
-        author="George Orwell",
-        category="Dystopian",
-        isbn="9780451524935",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-    dict(
-        title="Animal Farm",
-        author="George Orwell",
-        category="Satire",
-        isbn="9780451526342",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-    dict(
-        title="To Kill a Mockingbird",
-        author="Harper Lee",
-        category="Classic",
-        isbn="9780061120084",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-    dict(
-        title="The Catcher in the Rye",
-        author="J.D. Salinger",
-        category="Fiction",
-        isbn="9780316769488",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-    dict(
-        title="Go Set a Watchman",
-        author="Harper Lee",
-        category="Classic",
-        isbn="9780062409850",
-        avg_rating=None,
-        num_ratings=0,
-        sum_ratings=0,
-        soft_deleted=False,
-    ),
-]
-
-BOOK_REVIEWS: List[Dict[str, List[str]]] = []
+import os
+
+from api.book import Book
+from api.catalog import BookCatalog
+from api.columnar import ColumnarBookCatalog
+from api.reviews import ReviewStore
+from api.wal import WriteAheadLog
+
+_CATALOG_CLASSES = dict(rows=BookCatalog, columnar=ColumnarBookCatalog)
+
+BOOKS = _CATALOG_CLASSES[os.environ.get("BOOKS_BACKEND", "rows")](
+    [
+        Book(
+            title="A Brief History of Time",
+            author="Stephen Hawking",
+            category="Science",
+            isbn="9780553380163",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+        Book(
+            title="The Great Gatsby",
+            author="F. Scott Fitzgerald",
+            category="Classic",
+            isbn="9780743273565",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+        Book(
+            title="1984",
+            author="George Orwell",
+            category="Dystopian",
+            isbn="9780451524935",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+        Book(
+            title="Animal Farm",
+            author="George Orwell",
+            category="Satire",
+            isbn="9780451526342",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+        Book(
+            title="To Kill a Mockingbird",
+            author="Harper Lee",
+            category="Classic",
+            isbn="9780061120084",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+        Book(
+            title="The Catcher in the Rye",
+            author="J.D. Salinger",
+            category="Fiction",
+            isbn="9780316769488",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+        Book(
+            title="Go Set a Watchman",
+            author="Harper Lee",
+            category="Classic",
+            isbn="9780062409850",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        ),
+    ]
+)
+
+BOOK_REVIEWS = ReviewStore()
+
+WAL = (
+    WriteAheadLog(
+        os.environ["BOOKS_WAL_PATH"],
+        fsync=os.environ.get("BOOKS_WAL_FSYNC", "batch"),
+        shared=os.environ.get("BOOKS_WAL_SHARED") == "1",
+    )
+    if os.environ.get("BOOKS_WAL_PATH")
+    else None
+)
+
+SNAPSHOT_PATH = os.environ.get("BOOKS_SNAPSHOT_PATH") or None
+SNAPSHOT_INTERVAL = float(os.environ.get("BOOKS_SNAPSHOT_INTERVAL", 300))
+COMPACT_AFTER = float(os.environ.get("BOOKS_COMPACT_AFTER", 3600))
+COMPACT_INTERVAL = float(os.environ.get("BOOKS_COMPACT_INTERVAL", 60))
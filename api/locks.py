@@ -0,0 +1,92 @@
+"""
+locks.py
+
+This module defines the striped lock that orders writes to the same book. Every key
+maps to one of a fixed number of asyncio locks, so writes to the same book run one at a
+time while writes to different books almost always take different locks and run
+concurrently. A write holds the lock of its book from the moment it reads the book
+until its change is logged and applied, so its read-modify-write can never interleave
+with another write to that book, however many await points it contains.
+
+Classes:
+    StripedLock: A fixed set of asyncio locks shared by many keys.
+
+Example:
+    ```python
+    locks = StripedLock(stripes=64)
+
+    async with locks.hold("9780451524935"):
+        book = BOOKS.get("9780451524935")
+        await WAL.append(record)
+        BOOKS.set_ratings(book.isbn, book.num_ratings + 1, book.sum_ratings + 4)
+    ```
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+
+class StripedLock:
+    """
+    A fixed set of asyncio locks shared by many keys.
+
+    Attributes:
+        stripes (int): The number of locks. Two keys share a lock with a probability
+        of 1 / stripes.
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        Args:
+            stripes: The number of locks.
+        """
+        self.stripes = stripes
+        self._locks: List[asyncio.Lock] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @asynccontextmanager
+    async def hold(self, *keys: str) -> AsyncIterator[None]:
+        """
+        Holds the locks of the given keys until the context exits.
+
+        The locks are acquired in a fixed order, so writes that hold the locks of
+        several keys cannot deadlock with each other.
+
+        Args:
+            keys: The keys to lock, such as ISBNs.
+        """
+        locks = self._get_locks()
+        stripes = sorted({hash(key) % self.stripes for key in keys})
+        acquired: List[asyncio.Lock] = []
+
+        try:
+            for stripe in stripes:
+                await locks[stripe].acquire()
+                acquired.append(locks[stripe])
+
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def locked(self, key: str) -> bool:
+        """
+        Args:
+            key: A key.
+
+        Returns:
+            True if the lock of the key is held, otherwise False.
+        """
+        return bool(self._locks) and self._locks[hash(key) % self.stripes].locked()
+
+    def _get_locks(self) -> List[asyncio.Lock]:
+        # An asyncio lock can only be used from one event loop. The app runs a single
+        # loop, but tests and benchmarks start a new one for each run.
+        loop = asyncio.get_running_loop()
+
+        if loop is not self._loop:
+            self._locks = [asyncio.Lock() for _ in range(self.stripes)]
+            self._loop = loop
+
+        return self._locks
@@ -0,0 +1,311 @@
+"""
+metrics.py
+
+This module records request latencies and the time spent in each stage of queries and
+writes, and renders them in the Prometheus text format. Recording is off unless the
+BOOKS_METRICS environment variable is 1, and while it is off every hook returns after a
+single attribute check. BOOKS_METRICS_SAMPLE_RATE makes only that fraction of requests
+and operations be timed, so the hooks can stay on in production at a fraction of their
+cost. Histogram counts then cover the sampled operations only.
+
+Attributes:
+    LATENCY_BUCKETS (tuple): The upper bounds, in seconds, of the histogram buckets.
+    METRICS (Metrics): The metrics of the app, configured from the environment.
+
+Classes:
+    Histogram: Counts observations in fixed buckets.
+    StageTimer: Times the consecutive stages of one operation.
+    Metrics: The latency histograms of requests and operation stages.
+    MetricsMiddleware: ASGI middleware that records the latency of each request.
+
+Example:
+    ```python
+    timer = METRICS.timer("query_book")
+
+    if timer:
+        timer.stage("select")
+
+    books = select_books(params)
+
+    if timer:
+        timer.stage("sort")
+
+    books = sort_books(books)
+
+    if timer:
+        timer.stop()
+
+    print(METRICS.render())
+    ```
+"""
+
+import os
+import random
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+_REQUEST_METRIC = "books_http_request_duration_seconds"
+_STAGE_METRIC = "books_stage_duration_seconds"
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+        count (int): The number of observations.
+        sum (float): The sum of the observations.
+    """
+
+    __slots__ = ("buckets", "count", "sum", "_counts")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.count = 0
+        self.sum = 0.0
+        # The last count is for observations above every bucket.
+        self._counts = [0] * (len(buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[int]:
+        """
+        Returns:
+            The number of observations less than or equal to each bucket bound,
+            followed by the total number of observations.
+        """
+        counts = []
+        total = 0
+
+        for count in self._counts:
+            total += count
+            counts.append(total)
+
+        return counts
+
+
+class StageTimer:
+    """
+    Times the consecutive stages of one operation. Starting a stage ends the previous
+    one, and stop ends the last one.
+    """
+
+    __slots__ = ("_metrics", "_operation", "_stage", "_start")
+
+    def __init__(self, metrics: "Metrics", operation: str):
+        self._metrics = metrics
+        self._operation = operation
+        self._stage: Optional[str] = None
+        self._start = 0.0
+
+    def stage(self, stage: str) -> None:
+        """
+        Ends the current stage, if any, and starts a new one.
+
+        Args:
+            stage: The name of the new stage.
+        """
+        now = time.perf_counter()
+
+        if self._stage is not None:
+            self._metrics.observe_stage(self._operation, self._stage, now - self._start)
+
+        self._stage = stage
+        self._start = now
+
+    def stop(self) -> None:
+        """
+        Ends the current stage.
+        """
+        if self._stage is not None:
+            elapsed = time.perf_counter() - self._start
+            self._metrics.observe_stage(self._operation, self._stage, elapsed)
+            self._stage = None
+
+
+class Metrics:
+    """
+    The latency histograms of requests and operation stages.
+
+    Attributes:
+        enabled (bool): True if latencies are recorded.
+        sample_rate (float): The fraction of requests and operations that are timed.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0):
+        """
+        Args:
+            enabled: True to record latencies.
+            sample_rate: The fraction of requests and operations to time, between 0
+            and 1.
+
+        Raises:
+            ValueError: If the sample rate is not between 0 and 1.
+        """
+        if not 0 <= sample_rate <= 1:
+            msg = "The metrics sample rate must be between 0 and 1."
+            raise ValueError(msg)
+
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+
+    def sampled(self) -> bool:
+        """
+        Returns:
+            True if the current request or operation should be timed.
+        """
+        return self.enabled and (
+            self.sample_rate >= 1 or random.random() < self.sample_rate
+        )
+
+    def timer(self, operation: str) -> Optional[StageTimer]:
+        """
+        Args:
+            operation: The name of the operation, such as query_book or add_rating.
+
+        Returns:
+            A timer for the stages of the operation, or None if it is not sampled.
+        """
+        return StageTimer(self, operation) if self.sampled() else None
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float
+    ) -> None:
+        labels = (("method", method), ("route", route), ("status", str(status)))
+        self._observe(_REQUEST_METRIC, labels, seconds)
+
+    def observe_stage(self, operation: str, stage: str, seconds: float) -> None:
+        labels = (("operation", operation), ("stage", stage))
+        self._observe(_STAGE_METRIC, labels, seconds)
+
+    def reset(self) -> None:
+        """
+        Drops every observation.
+        """
+        self._histograms.clear()
+
+    def render(self) -> str:
+        """
+        Returns:
+            The histograms in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP books_metrics_sample_rate Fraction of requests that are timed.",
+            "# TYPE books_metrics_sample_rate gauge",
+            f"books_metrics_sample_rate {self.sample_rate if self.enabled else 0}",
+        ]
+        families = (
+            (_REQUEST_METRIC, "HTTP request latency by route."),
+            (_STAGE_METRIC, "Latency of each stage of queries and writes."),
+        )
+
+        for name, description in families:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+
+            for (metric, labels), histogram in sorted(self._histograms.items()):
+                if metric == name:
+                    lines.extend(self._render_histogram(name, labels, histogram))
+
+        return "\n".join(lines) + "\n"
+
+    def _observe(self, name: str, labels: Tuple, seconds: float) -> None:
+        histogram = self._histograms.get((name, labels))
+
+        if histogram is None:
+            histogram = self._histograms[name, labels] = Histogram()
+
+        histogram.observe(seconds)
+
+    @staticmethod
+    def _render_histogram(name: str, labels: Tuple, histogram: Histogram) -> List[str]:
+        prefix = _format_labels(labels)
+        bounds = [repr(bound) for bound in histogram.buckets] + ["+Inf"]
+        lines = [
+            f'{name}_bucket{{{prefix},le="{bound}"}} {count}'
+            for bound, count in zip(bounds, histogram.cumulative_counts())
+        ]
+        lines.append(f"{name}_sum{{{prefix}}} {histogram.sum!r}")
+        lines.append(f"{name}_count{{{prefix}}} {histogram.count}")
+        return lines
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records the latency of each sampled HTTP request, labelled
+    with its method, route template and status code. A request is timed until its
+    response has been sent, including streamed bodies.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        """
+        Args:
+            app: The ASGI app to wrap.
+            metrics: The metrics to record the latencies in.
+        """
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self.metrics.sampled():
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope, and its path is the
+            # template, so requests for different books share a histogram.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            elapsed = time.perf_counter() - start
+            self.metrics.observe_request(scope["method"], route, status, elapsed)
+
+
+METRICS = Metrics(
+    enabled=os.environ.get("BOOKS_METRICS") == "1",
+    sample_rate=float(os.environ.get("BOOKS_METRICS_SAMPLE_RATE", 1)),
+)
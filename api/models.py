@@ -13,7 +13,9 @@ Classes:
         - category (str): The category of the book.
         - top (int): The number of top books to return.
         - isbn (str): The ISBN of the book.
+        - q (str): Words to search for in the title and author of the book.
         - return_deleted_books (bool): A flag to include deleted books in the results.
+        - cursor (str): An opaque cursor to continue from a previous page of results.
 
     CreateBookRequest: Parameters for creating a new book.
         - author (str): The author of the book.
@@ -24,23 +26,44 @@ Classes:
     AddRatingRequest: Parameters for adding a rating to a book.
         - rating (int): The rating value.
 
+    BookRating: A rating for the book with the given ISBN.
+        - isbn (str): The ISBN of the book.
+        - rating (float): The rating value.
+
+    AddRatingsRequest: Parameters for adding many ratings at once.
+        - ratings (List[BookRating]): The ratings to add.
+
     CreateReviewRequest: Parameters for creating a review for a book.
         - review (str): The content of the review.
+
+    ReviewQueryParameters: Parameters for paging through the reviews of a book.
+        - offset (int): The number of reviews to skip.
+        - limit (int): The maximum number of reviews to return.
+
+    AutocompleteQueryParameters: Parameters for typeahead suggestions.
+        - prefix (str): The start of an author, title or category.
+        - k (int): The maximum number of suggestions to return.
 """
 
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import HTTPException
 from pydantic import (
     BaseModel,
     Field,
     confloat,
+    field_validator,
     model_validator,
 )
 from starlette import status
 from typing_extensions import Self
 
+from api.autocomplete import MAX_SUGGESTIONS
+from api.cursor import decode_cursor
+
 VALID_ISBN_REGEX = r"^\d{13}$"
+# Matches text with at least one character that is not whitespace.
+_NOT_BLANK_REGEX = r"\S"
 MIN_RATING = 1.0
 MAX_RATING = 5.0
 
@@ -64,8 +87,14 @@ class BookQueryParameters(BaseModel):
         be between 1.0 and 5.0.
         max_rating (Optional[float]): The maximum rating of the book to search for. Must
         be between 1.0 and 5.0.
+        q (Optional[str]): Words to search for in the titles and authors of the
+        books. A book matches if its title or author contains every word, or a word
+        that starts with it. Matching books are ranked by the number of matching
+        words, then by average rating. A blank q is the same as no q.
         return_deleted_books (bool): Whether to include deleted books in the search
         results.
+        cursor (Optional[str]): An opaque cursor taken from the `next` link of a
+        previous page. Only books that come after that page are returned.
     """
 
     author: Optional[str] = None
@@ -74,7 +103,27 @@ class BookQueryParameters(BaseModel):
     isbn: Optional[str] = Field(None, pattern=VALID_ISBN_REGEX)
     min_rating: Optional[float] = Field(None, ge=MIN_RATING, le=MAX_RATING)
     max_rating: Optional[float] = Field(None, ge=MIN_RATING, le=MAX_RATING)
+    q: Optional[str] = None
     return_deleted_books: bool = False
+    cursor: Optional[str] = None
+
+    @field_validator("q")
+    @classmethod
+    def check_q(cls, q: Optional[str]) -> Optional[str]:
+        # A blank search has no words to match, so it does not filter the books.
+        return q if q is not None and q.strip() else None
+
+    @field_validator("cursor")
+    @classmethod
+    def check_cursor(cls, cursor: Optional[str]) -> Optional[str]:
+        if cursor is not None:
+            try:
+                decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+                ) from e
+        return cursor
 
     @model_validator(mode="after")
     def check_ratings(self) -> Self:
@@ -84,20 +133,29 @@ class BookQueryParameters(BaseModel):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
         return self
 
+    @model_validator(mode="after")
+    def check_cursor_matches_query(self) -> Self:
+        # Search results are ranked, so their cursors carry the rank of the book.
+        if self.cursor is not None:
+            if len(decode_cursor(self.cursor)) != (4 if self.q is not None else 2):
+                msg = "cursor does not belong to this query."
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
+        return self
+
 
 class CreateBookRequest(BaseModel):
     """
     Class for creating a book request.
 
     Attributes:
-        author: The author of the book.
+        author: The author of the book, which must not be blank.
         title: The title of the book.
         category: The category or genre of the book.
         isbn: The International Standard Book Number (ISBN) of the book, which must
         match the VALID_ISBN_REGEX pattern.
     """
 
-    author: str
+    author: str = Field(min_length=1, pattern=_NOT_BLANK_REGEX)
     title: str
     category: str
     isbn: str = Field(pattern=VALID_ISBN_REGEX)
@@ -127,6 +185,43 @@ class AddRatingRequest(BaseModel):
     model_config = _create_model_config(dict(rating=3.5))
 
 
+class BookRating(AddRatingRequest):
+    """
+    BookRating represents a rating for one book in an AddRatingsRequest.
+
+    Attributes:
+        isbn (str): The ISBN of the book, which must match the VALID_ISBN_REGEX
+        pattern.
+        rating (float): The rating value, which must be between 1 and 5.
+    """
+
+    isbn: str = Field(pattern=VALID_ISBN_REGEX)
+
+    model_config = _create_model_config(dict(isbn="9780345533011", rating=3.5))
+
+
+class AddRatingsRequest(BaseModel):
+    """
+    AddRatingsRequest represents a request to add many ratings at once.
+
+    Attributes:
+        ratings (List[BookRating]): The ratings to add. A book can be rated more than
+        once.
+    """
+
+    ratings: List[BookRating] = Field(min_length=1)
+
+    model_config = _create_model_config(
+        dict(
+            ratings=[
+                dict(isbn="9780345533011", rating=3.5),
+                dict(isbn="9780345533011", rating=5),
+                dict(isbn="9780451524935", rating=4),
+            ]
+        )
+    )
+
+
 class CreateReviewRequest(BaseModel):
     """
     CreateReviewRequest is a data model representing the request to add a review.
@@ -140,3 +235,33 @@ class CreateReviewRequest(BaseModel):
     model_config = _create_model_config(
         dict(review="I really enjoyed reading this book.")
     )
+
+
+class ReviewQueryParameters(BaseModel):
+    """
+    Represents query parameters for paging through the reviews of a book.
+
+    Attributes:
+        offset (int): The number of reviews to skip. Must be greater than or equal to
+        0.
+        limit (Optional[int]): The maximum number of reviews to return. Must be greater
+        than or equal to 1. All remaining reviews are returned if it is not given.
+    """
+
+    offset: int = Field(0, ge=0)
+    limit: Optional[int] = Field(None, ge=1)
+
+
+class AutocompleteQueryParameters(BaseModel):
+    """
+    Represents query parameters for typeahead suggestions.
+
+    Attributes:
+        prefix (str): The start of an author, title or category, matched
+        case-insensitively. Must not be empty.
+        k (int): The maximum number of suggestions to return. Must be between 1 and
+        MAX_SUGGESTIONS.
+    """
+
+    prefix: str = Field(min_length=1)
+    k: int = Field(10, ge=1, le=MAX_SUGGESTIONS)
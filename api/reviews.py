@@ -0,0 +1,124 @@
+"""
+reviews.py
+
+This module defines the in-memory store that holds book reviews. Reviews are kept in a
+list per ISBN, so adding a review and finding the reviews of a book never scan the
+reviews of other books. Reviews can also be left in a snapshot and decoded the first
+time their book is accessed.
+
+Classes:
+    ReviewStore: An ISBN-keyed collection of book reviews.
+
+Example:
+    ```python
+    store = ReviewStore()
+    store.add("9780451524935", "A chilling classic.")
+    first_page = store.get("9780451524935", offset=0, limit=20)
+    ```
+"""
+
+from itertools import chain, count
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
+
+_VERSIONS = count()
+
+
+class ReviewStore:
+    """
+    An in-memory collection of book reviews keyed by ISBN.
+
+    Every ISBN also has a version that changes each time a review is added for it, so
+    readers can tell whether the reviews of a book changed without comparing them.
+    Versions are unique across stores.
+    """
+
+    def __init__(
+        self,
+        reviews: Optional[Iterable[dict]] = None,
+        unloaded: Optional[Mapping[str, Iterable[str]]] = None,
+    ):
+        """
+        Args:
+            reviews: Optional dictionaries with an "isbn" key and a "reviews" list to
+            load into the store. The lists are used as they are, not copied.
+            unloaded: An optional mapping from ISBN to reviews that are loaded only
+            when the reviews of the book are first accessed, such as the reviews of a
+            snapshot.
+        """
+        self._reviews: Dict[str, List[str]] = {}
+        self._unloaded: Mapping[str, Iterable[str]] = unloaded or {}
+        self._versions: Dict[str, int] = {}
+        self._initial_version = next(_VERSIONS)
+
+        for r in reviews or []:
+            self._reviews[r["isbn"]] = r["reviews"]
+
+    def __contains__(self, isbn: object) -> bool:
+        return isbn in self._reviews or isbn in self._unloaded
+
+    def __iter__(self) -> Iterator[str]:
+        unloaded = (isbn for isbn in self._unloaded if isbn not in self._reviews)
+        return chain(self._reviews, unloaded)
+
+    def add(self, isbn: str, review: str) -> None:
+        """
+        Appends a review to the reviews of a book.
+
+        Args:
+            isbn: The ISBN of the book.
+            review: The review to add.
+        """
+        self._load(isbn).append(review)
+        self._versions[isbn] = next(_VERSIONS)
+
+    def count(self, isbn: str) -> int:
+        """
+        Args:
+            isbn: The ISBN of the book.
+
+        Returns:
+            The number of reviews of the book.
+        """
+        return len(self._load(isbn)) if isbn in self else 0
+
+    def get(self, isbn: str, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        """
+        Args:
+            isbn: The ISBN of the book.
+            offset: The number of reviews to skip.
+            limit: The maximum number of reviews to return, or None for all of them.
+
+        Returns:
+            The reviews of the book in the order they were added, starting at offset.
+        """
+        reviews = self._load(isbn) if isbn in self else []
+        stop = None if limit is None else offset + limit
+        return reviews[offset:stop]
+
+    def set_unloaded(self, unloaded: Mapping[str, Iterable[str]]) -> None:
+        """
+        Replaces the mapping the reviews that are not loaded yet are read from, such
+        as with a newer snapshot that holds the same reviews for those books.
+
+        Args:
+            unloaded: The new mapping from ISBN to reviews.
+        """
+        self._unloaded = unloaded
+
+    def version(self, isbn: str) -> int:
+        """
+        Args:
+            isbn: The ISBN of the book.
+
+        Returns:
+            A number that changes every time a review is added for the book.
+        """
+        return self._versions.get(isbn, self._initial_version)
+
+    def _load(self, isbn: str) -> List[str]:
+        reviews = self._reviews.get(isbn)
+
+        if reviews is None:
+            reviews = self._reviews[isbn] = list(self._unloaded.get(isbn, ()))
+
+        return reviews
@@ -0,0 +1,215 @@
+"""
+search.py
+
+This module defines the inverted index behind full-text book search. The title and
+author of each book are split into casefolded word tokens, and every token maps to the
+books that contain it along with the number of times it occurs in them. The tokens are
+also kept sorted, so a query token matches every indexed token it is a prefix of with
+two binary searches, and a search only visits the postings of the tokens it matches.
+
+Functions:
+    tokenize(text: str) -> list:
+        Splits text into casefolded word tokens.
+
+    match_score(book: Book, query: str) -> int:
+        Scores one book against a query without an index.
+
+Classes:
+    TextIndex: An inverted index over the titles and authors of books.
+
+Example:
+    ```python
+    index = TextIndex()
+    index.add(book)
+    scores = index.search("brief hist")
+    ```
+"""
+
+import re
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+from api.book import Book
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Args:
+        text: The text to split.
+
+    Returns:
+        The casefolded words of the text, in the order they appear.
+    """
+    return _TOKEN.findall(text.casefold())
+
+
+def match_score(book: Book, query: str) -> int:
+    """
+    Scores a book against a query the way TextIndex.search does, by reading its title
+    and author, for books that are not in an index.
+
+    Args:
+        book: The book to score.
+        query: The words to search for.
+
+    Returns:
+        The score TextIndex.search would give the book, or 0 if it does not match.
+    """
+    counts = _get_term_counts(book)
+    score = 0
+
+    for prefix in set(tokenize(query)):
+        matched = sum(
+            count for term, count in counts.items() if term.startswith(prefix)
+        )
+
+        if not matched:
+            return 0
+
+        score += matched
+
+    return score
+
+
+def _merge_postings(postings: List[Dict[str, int]]) -> Dict[str, int]:
+    scores: Dict[str, int] = {}
+
+    for posting in postings:
+        for isbn, count in posting.items():
+            scores[isbn] = scores.get(isbn, 0) + count
+
+    return scores
+
+
+def _get_term_counts(book: Book) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+
+    for token in tokenize(f"{book.title} {book.author}"):
+        counts[token] = counts.get(token, 0) + 1
+
+    return counts
+
+
+class TextIndex:
+    """
+    An inverted index over the titles and authors of books.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._terms: List[str] = []
+        # Terms added since the last search. They are merged into the sorted terms
+        # by the next search, so bulk loads do not insert terms one at a time.
+        self._new_terms: List[str] = []
+
+    def add(self, book: Book) -> None:
+        """
+        Indexes the title and author of a book.
+
+        Args:
+            book: The book to index.
+        """
+        for term, count in _get_term_counts(book).items():
+            postings = self._postings.get(term)
+
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._new_terms.append(term)
+
+            postings[book.isbn] = count
+
+    def remove(self, book: Book) -> None:
+        """
+        Removes a book from the index.
+
+        Args:
+            book: The book to remove. It must have been added with the same title and
+            author.
+        """
+        for term in _get_term_counts(book):
+            postings = self._postings[term]
+            del postings[book.isbn]
+
+            if not postings:
+                del self._postings[term]
+                terms = self._sorted_terms()
+                del terms[bisect_left(terms, term)]
+
+    def search(self, query: str) -> Dict[str, int]:
+        """
+        Finds the books whose title or author contains every word of a query. A query
+        word matches every word it is a prefix of, so partial words can be searched.
+
+        The books matching the least common query word are collected first, and each
+        other word only narrows them down, by probing its postings for every remaining
+        book when that is cheaper than collecting the books it matches. A common word
+        next to a rare one therefore costs little more than the rare word alone.
+
+        Args:
+            query: The words to search for.
+
+        Returns:
+            A mapping from ISBN to score for every matching book. The score is the
+            number of words in the title and author of the book that match a query
+            word. A query without words matches no books.
+        """
+        words: List[Tuple[int, List[Dict[str, int]]]] = []
+
+        for prefix in set(tokenize(query)):
+            postings = [self._postings[term] for term in self._iter_prefixed(prefix)]
+
+            if not postings:
+                return {}
+
+            words.append((sum(map(len, postings)), postings))
+
+        if not words:
+            return {}
+
+        words.sort(key=itemgetter(0))
+        results = _merge_postings(words[0][1])
+
+        for size, postings in words[1:]:
+            if size <= len(results) * len(postings):
+                scores = _merge_postings(postings)
+                results = {
+                    isbn: score + scores[isbn]
+                    for isbn, score in results.items()
+                    if isbn in scores
+                }
+            else:
+                narrowed = {}
+
+                for isbn, score in results.items():
+                    count = sum(posting.get(isbn, 0) for posting in postings)
+
+                    if count:
+                        narrowed[isbn] = score + count
+
+                results = narrowed
+
+            if not results:
+                break
+
+        return results
+
+    def _iter_prefixed(self, prefix: str):
+        terms = self._sorted_terms()
+        i = bisect_left(terms, prefix)
+
+        while i < len(terms) and terms[i].startswith(prefix):
+            yield terms[i]
+            i += 1
+
+    def _sorted_terms(self) -> List[str]:
+        if self._new_terms:
+            # The terms are one sorted run followed by the new terms, so Timsort only
+            # sorts the new terms and merges the two runs in linear time.
+            self._terms += self._new_terms
+            self._terms.sort()
+            self._new_terms.clear()
+
+        return self._terms
@@ -0,0 +1,396 @@
+"""
+snapshot.py
+
+This module defines compact binary snapshots of the catalog and the review store.
+A snapshot records the state after a given offset of the write-ahead log, so startup
+loads the snapshot and replays only the records appended after it, instead of the
+whole log.
+
+A snapshot is memory-mapped when it is opened. The books are stored column by column in
+sort_key order: each string field as one UTF-8 block with an array of lengths, and each
+number field as a packed array. This lets them be decoded in a single pass and loaded
+into a catalog without re-sorting. Reviews stay in the mapped file and are decoded per
+book, the first time the reviews of that book are accessed.
+
+New snapshots are built from the previous snapshot and the log, not from the live
+catalog, so they can be written in a background thread while the catalog keeps
+changing. The log records are merged into the books of the previous snapshot by ISBN,
+without building the query indexes of a catalog, and no snapshot is written while the
+log has not grown.
+
+All numbers are stored in the byte order of the machine that wrote the snapshot.
+
+Attributes:
+    MAGIC (bytes): The bytes every snapshot starts with.
+    FORMAT_VERSION (int): The version of the snapshot format.
+
+Classes:
+    Snapshot: A memory-mapped snapshot opened for reading.
+
+Functions:
+    write_snapshot(path: str, books: BookCatalog, reviews: ReviewStore,
+                   wal_offset: int) -> None:
+        Writes the catalog and the review store to a snapshot file.
+
+    checkpoint(path: str, wal_path: str) -> tuple:
+        Writes a snapshot that also holds the records appended to the log after an
+        existing one, to be moved over it.
+
+Example:
+    ```python
+    write_snapshot("books.snapshot", BOOKS, BOOK_REVIEWS, wal_offset=0)
+
+    snapshot = Snapshot("books.snapshot")
+    books = BookCatalog(snapshot.books())
+    reviews = ReviewStore(unloaded=snapshot.reviews())
+    ```
+"""
+
+import math
+import mmap
+import os
+import struct
+from array import array
+from itertools import accumulate, chain, pairwise
+from operator import attrgetter
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from api.book import Book
+from api.catalog import BookCatalog
+from api.reviews import ReviewStore
+from api.wal import apply_record, read_log
+
+MAGIC = b"BOOKSNAP"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("=8sQQQQ")
+_LENGTH = struct.Struct("=Q")
+_ALIGNMENT = 8
+_STRING_FIELDS = ("title", "author", "category", "isbn")
+_SORT_KEY = attrgetter("sort_key")
+
+
+def _write_section(f: BinaryIO, data: bytes) -> None:
+    f.write(_LENGTH.pack(len(data)))
+    f.write(data)
+    f.write(bytes(-len(data) % _ALIGNMENT))
+
+
+def _write_strings(f: BinaryIO, strings: Iterable[str]) -> None:
+    strings = list(strings)
+    _write_section(f, array("I", map(len, strings)).tobytes())
+    _write_section(f, "".join(strings).encode())
+
+
+class _BookTable:
+    """
+    The books a checkpoint applies log records to. It has the methods of BookCatalog
+    that apply_record calls, but none of its indexes.
+    """
+
+    def __init__(self, books: Iterable[Book]):
+        self._books: Dict[str, Book] = {book.isbn: book for book in books}
+
+    def __contains__(self, isbn: object) -> bool:
+        return isbn in self._books
+
+    def get(self, isbn: str) -> Optional[Book]:
+        return self._books.get(isbn)
+
+    def add(self, book: Book) -> None:
+        self._books[book.isbn] = book
+
+    def add_many(self, books: Iterable[Book]) -> None:
+        for book in books:
+            self.add(book)
+
+    def set_ratings(self, isbn: str, num_ratings: int, sum_ratings: float) -> None:
+        book = self._books[isbn]
+        book.num_ratings = num_ratings
+        book.sum_ratings = sum_ratings
+        book.avg_rating = sum_ratings / num_ratings if num_ratings else None
+
+    def mark_deleted(self, isbn: str) -> None:
+        self._books[isbn].soft_deleted = True
+
+    def iter_ordered(self, deleted: bool = False) -> Iterator[Book]:
+        books: Iterable[Book] = self._books.values()
+
+        if not deleted:
+            books = (book for book in books if not book.soft_deleted)
+
+        # The books of the snapshot are already in order, so the sort only has to
+        # place the books the log added.
+        return iter(sorted(books, key=_SORT_KEY))
+
+
+def write_snapshot(
+    path: str, books: BookCatalog, reviews: ReviewStore, wal_offset: int
+) -> None:
+    """
+    Writes the catalog and the review store to a snapshot file. The snapshot is
+    written to a temporary file first and then moved over the old one, so a crash
+    never leaves a partial snapshot behind.
+
+    Args:
+        path: The path of the snapshot file.
+        books: The catalog to write.
+        reviews: The review store to write.
+        wal_offset: The offset of the first log record the snapshot does not hold.
+    """
+    os.replace(_write_temp(path, books, reviews, wal_offset), path)
+
+
+def _write_temp(
+    path: str,
+    books: Union[BookCatalog, _BookTable],
+    reviews: ReviewStore,
+    wal_offset: int,
+) -> str:
+    ordered = list(books.iter_ordered(deleted=True))
+    isbns = list(reviews)
+    # Workers sharing a log may write the same snapshot at the same time.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(
+            _HEADER.pack(MAGIC, FORMAT_VERSION, wal_offset, len(ordered), len(isbns))
+        )
+
+        for field in _STRING_FIELDS:
+            _write_strings(f, (getattr(book, field) for book in ordered))
+
+        avg_ratings = array("d", (math.nan,)) * len(ordered)
+        num_ratings = array("q", (-1,)) * len(ordered)
+        sum_ratings = array("d", (math.nan,)) * len(ordered)
+
+        for i, book in enumerate(ordered):
+            if book.avg_rating is not None:
+                avg_ratings[i] = book.avg_rating
+            if book.num_ratings is not None:
+                num_ratings[i] = book.num_ratings
+            if book.sum_ratings is not None:
+                sum_ratings[i] = book.sum_ratings
+
+        _write_section(f, avg_ratings.tobytes())
+        _write_section(f, num_ratings.tobytes())
+        _write_section(f, sum_ratings.tobytes())
+        _write_section(f, bytes(book.soft_deleted for book in ordered))
+
+        _write_strings(f, isbns)
+        starts = array("Q", [0])
+        offsets = array("Q", [0])
+        text = bytearray()
+
+        for isbn in isbns:
+            for review in reviews.get(isbn):
+                text += review.encode()
+                offsets.append(len(text))
+
+            starts.append(len(offsets) - 1)
+
+        _write_section(f, starts.tobytes())
+        _write_section(f, offsets.tobytes())
+        _write_section(f, text)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    return temp_path
+
+
+def checkpoint(path: str, wal_path: str) -> Tuple[Optional[str], int]:
+    """
+    Writes a snapshot that also holds the records appended to the log after the
+    snapshot at path. Only the snapshot and the log are read, so it can run in a
+    background thread while the live catalog keeps changing.
+
+    The new snapshot is written next to the old one, and the caller moves it over
+    the old one with os.replace. Windows cannot replace a file that is still mapped,
+    so the caller has to close the old snapshot first.
+
+    Args:
+        path: The path of an existing snapshot file.
+        wal_path: The path of the write-ahead log.
+
+    Returns:
+        The path of the new snapshot, or None if no record was appended to the log
+        after the old one, and the log offset the new snapshot was taken at.
+    """
+    with Snapshot(path) as base:
+        records = read_log(wal_path, base.wal_offset)
+        first = next(records, None)
+
+        if first is None:
+            return None, base.wal_offset
+
+        books = _BookTable(base.books())
+        reviews = ReviewStore(unloaded=base.reviews())
+
+        for record, offset in chain([first], records):
+            apply_record(record, books, reviews)
+
+        return _write_temp(path, books, reviews, offset), offset
+
+
+class _SnapshotReviews(Mapping[str, List[str]]):
+    """
+    The reviews of a snapshot, decoded one book at a time.
+    """
+
+    def __init__(self, snapshot: "Snapshot", isbns: List[str], starts, offsets, text):
+        self._map = snapshot._map
+        self._rows: Dict[str, int] = {isbn: row for row, isbn in enumerate(isbns)}
+        self._starts = starts
+        self._offsets = offsets
+        self._text = text
+
+    def __getitem__(self, isbn: str) -> List[str]:
+        row = self._rows[isbn]
+        offsets = self._offsets[self._starts[row] : self._starts[row + 1] + 1]
+        base = self._text
+        return [
+            self._map[base + start : base + stop].decode()
+            for start, stop in pairwise(offsets)
+        ]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class Snapshot:
+    """
+    A memory-mapped snapshot opened for reading.
+
+    The snapshot has to stay open while the reviews it returned are in use.
+
+    Attributes:
+        wal_offset (int): The offset of the first log record the snapshot does not
+        hold.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: The path of the snapshot file.
+
+        Raises:
+            ValueError: If the file is not a snapshot of this format version.
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            msg = f"{path} is not a snapshot."
+            raise ValueError(msg)
+
+        magic, version, self.wal_offset, self._num_books, self._num_isbns = (
+            _HEADER.unpack_from(self._map)
+        )
+
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            msg = f"{path} is not a version {FORMAT_VERSION} snapshot."
+            raise ValueError(msg)
+
+        self._sections = []
+        self._views: List[memoryview] = []
+        position = _HEADER.size
+
+        while position < len(self._map):
+            (length,) = _LENGTH.unpack_from(self._map, position)
+            start = position + _LENGTH.size
+            self._sections.append((start, start + length))
+            position = start + length + -length % _ALIGNMENT
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def books(self) -> Iterator[Book]:
+        """
+        Yields:
+            The books of the snapshot, ordered by their sort_key.
+        """
+        titles, authors, categories, isbns = (
+            self._strings(2 * i) for i in range(len(_STRING_FIELDS))
+        )
+        avg_ratings = self._array("d", 8)
+        num_ratings = self._array("q", 9)
+        sum_ratings = self._array("d", 10)
+        start, stop = self._sections[11]
+        soft_deleted = self._map[start:stop]
+
+        columns = zip(
+            titles,
+            authors,
+            categories,
+            isbns,
+            avg_ratings,
+            num_ratings,
+            sum_ratings,
+            soft_deleted,
+        )
+
+        # NaN is the only value that is not equal to itself.
+        for title, author, category, isbn, avg, num, total, deleted in columns:
+            yield Book(
+                title,
+                author,
+                category,
+                isbn,
+                None if avg != avg else avg,
+                None if num < 0 else num,
+                None if total != total else total,
+                deleted == 1,
+            )
+
+    def reviews(self) -> Mapping[str, List[str]]:
+        """
+        Returns:
+            A read-only mapping from ISBN to the reviews of the book. The reviews of
+            a book are decoded each time they are looked up.
+        """
+        starts = self._view("Q", 14)
+        offsets = self._view("Q", 15)
+        text, _ = self._sections[16]
+        return _SnapshotReviews(self, self._strings(12), starts, offsets, text)
+
+    def close(self) -> None:
+        for view in self._views:
+            view.release()
+
+        self._views.clear()
+        self._map.close()
+
+    def _strings(self, section: int) -> List[str]:
+        lengths = self._array("I", section)
+        start, stop = self._sections[section + 1]
+        text = self._map[start:stop].decode()
+        return [text[i:j] for i, j in pairwise(accumulate(lengths, initial=0))]
+
+    def _array(self, typecode: str, section: int) -> array:
+        start, stop = self._sections[section]
+        return array(typecode, self._map[start:stop])
+
+    def _view(self, typecode: str, section: int) -> memoryview:
+        start, stop = self._sections[section]
+        view = memoryview(self._map)[start:stop].cast(typecode)
+        self._views.append(view)
+        return view
@@ -0,0 +1,179 @@
+"""
+stats.py
+
+This module keeps running aggregates of the books of each author and each category,
+so reports such as the average rating per category are read without a pass over the
+catalog. Every change to a book updates the aggregates of its author and category in
+constant time. Rating sums are kept exactly, as integer multiples of the smallest
+float, so they always equal the correctly rounded sum of the rating sums of the books,
+whatever order the ratings arrived in.
+
+Attributes:
+    STATS_FIELDS (tuple): The book fields that books are grouped by.
+
+Classes:
+    GroupStats: The aggregates of the books that share a value of a field.
+    CatalogStats: The aggregates of every author and category of a catalog.
+
+Example:
+    ```python
+    stats = CatalogStats()
+    stats.add(book)
+    science = stats.get("category", "science")
+    print(science.books, science.avg_rating)
+    ```
+"""
+
+from typing import Dict, Iterator, Optional
+
+from api.book import Book
+
+STATS_FIELDS = ("author", "category")
+
+# Every finite float is a whole multiple of 2**-1074, so floats scaled by 2**1074 are
+# integers, and Python adds integers exactly.
+_SCALE = 1074
+_ONE = 1 << _SCALE
+
+
+def _to_fixed(value: float) -> int:
+    numerator, denominator = value.as_integer_ratio()
+    return numerator << (_SCALE + 1 - denominator.bit_length())
+
+
+class GroupStats:
+    """
+    The aggregates of the books that share a value of a field. Soft-deleted books are
+    only counted in deleted_books, and their ratings are left out.
+
+    Attributes:
+        value (str): The value of the field, as it was first added.
+        books (int): The number of books that are not soft-deleted.
+        deleted_books (int): The number of soft-deleted books.
+        num_ratings (int): The number of ratings of the books that are not
+        soft-deleted.
+    """
+
+    __slots__ = ("value", "books", "deleted_books", "num_ratings", "_sum_ratings")
+
+    def __init__(self, value: str):
+        self.value = value
+        self.books = 0
+        self.deleted_books = 0
+        self.num_ratings = 0
+        self._sum_ratings = 0
+
+    @property
+    def sum_ratings(self) -> float:
+        """
+        The sum of the ratings of the books that are not soft-deleted.
+        """
+        # Integer division is correctly rounded.
+        return self._sum_ratings / _ONE
+
+    @property
+    def avg_rating(self) -> Optional[float]:
+        """
+        The average of the ratings of the books that are not soft-deleted, or None if
+        they have no ratings.
+        """
+        if not self.num_ratings:
+            return None
+
+        return self.sum_ratings / self.num_ratings
+
+    def to_dict(self) -> dict:
+        return dict(
+            value=self.value,
+            books=self.books,
+            deleted_books=self.deleted_books,
+            num_ratings=self.num_ratings,
+            sum_ratings=self.sum_ratings,
+            avg_rating=self.avg_rating,
+        )
+
+
+class CatalogStats:
+    """
+    The aggregates of every author and category of a catalog. The catalog reports each
+    change to a book before it makes it.
+    """
+
+    def __init__(self):
+        self._groups: Dict[str, Dict[str, GroupStats]] = {
+            field: {} for field in STATS_FIELDS
+        }
+
+    def get(self, field: str, value: str) -> Optional[GroupStats]:
+        """
+        Args:
+            field: One of STATS_FIELDS.
+            value: The value of the field. The match is case-insensitive.
+
+        Returns:
+            The aggregates of the books with that value, or None if there are none.
+        """
+        return self._groups[field].get(value.casefold())
+
+    def groups(self, field: str) -> Iterator[GroupStats]:
+        """
+        Args:
+            field: One of STATS_FIELDS.
+
+        Yields:
+            The aggregates of each value of the field, in no particular order.
+        """
+        return iter(self._groups[field].values())
+
+    def add(self, book: Book) -> None:
+        for field, groups in self._groups.items():
+            value = getattr(book, field)
+            group = groups.get(value.casefold())
+
+            if group is None:
+                group = groups[value.casefold()] = GroupStats(value)
+
+            if book.soft_deleted:
+                group.deleted_books += 1
+            else:
+                group.books += 1
+                group.num_ratings += book.num_ratings or 0
+                group._sum_ratings += _to_fixed(book.sum_ratings or 0)
+
+    def remove(self, book: Book) -> None:
+        for field, groups in self._groups.items():
+            key = getattr(book, field).casefold()
+            group = groups[key]
+
+            if book.soft_deleted:
+                group.deleted_books -= 1
+            else:
+                group.books -= 1
+                group.num_ratings -= book.num_ratings or 0
+                group._sum_ratings -= _to_fixed(book.sum_ratings or 0)
+
+            if not group.books and not group.deleted_books:
+                del groups[key]
+
+    def set_ratings(self, book: Book, num_ratings: int, sum_ratings: float) -> None:
+        if book.soft_deleted:
+            return
+
+        added = num_ratings - (book.num_ratings or 0)
+        added_sum = _to_fixed(sum_ratings) - _to_fixed(book.sum_ratings or 0)
+
+        for field, groups in self._groups.items():
+            group = groups[getattr(book, field).casefold()]
+            group.num_ratings += added
+            group._sum_ratings += added_sum
+
+    def mark_deleted(self, book: Book) -> None:
+        if book.soft_deleted:
+            return
+
+        for field, groups in self._groups.items():
+            group = groups[getattr(book, field).casefold()]
+            group.books -= 1
+            group.deleted_books += 1
+            group.num_ratings -= book.num_ratings or 0
+            group._sum_ratings -= _to_fixed(book.sum_ratings or 0)
@@ -0,0 +1,399 @@
+"""
+wal.py
+
+This module defines an append-only write-ahead log for the catalog, ratings and
+reviews. Every write is appended to the log as one JSON line before it is applied in
+memory, and the log is replayed at startup to rebuild the in-memory state. Reads keep
+running from memory at full speed.
+
+How hard the log pushes each record to disk is set by its fsync policy:
+
+- "always": every append is flushed and fsynced before it returns.
+- "batch": appends are flushed right away, and the appends made while an fsync is
+  running share the next fsync (group commit). Each append returns once the fsync
+  that covers it has finished, so an acknowledged write is always durable.
+- "never": appends are flushed to the operating system but never fsynced. A process
+  crash loses nothing, but a power failure can lose recent writes.
+
+A shared log can be appended to by several processes, such as the workers started by
+uvicorn --workers. Each append holds an exclusive lock on the file while it writes its
+record, so records never interleave, and every process applies the records of the
+others by reading the log from the offset it has applied up to. Shared logs need
+fcntl, so they are only supported on POSIX systems.
+
+Attributes:
+    FSYNC_POLICIES (tuple): The supported fsync policies.
+
+Classes:
+    WriteAheadLog: An append-only log of JSON records.
+
+Functions:
+    read_log(path: str, start: int = 0) -> Iterator:
+        Yields the complete records of a log file with the offset that follows each.
+
+    prepare_record(record: dict) -> list:
+        Checks that a record can be applied and builds the books it creates. Writes
+        call it before they log a record, so a record that cannot be applied never
+        reaches the log.
+
+    apply_record(record: dict, books: BookCatalog, reviews: ReviewStore,
+        new_books: list = None) -> bool:
+        Applies a record to a catalog and review store. Live writes, log replay and
+        snapshots all go through it, so they always agree on what a record does.
+
+Example:
+    ```python
+    wal = WriteAheadLog("books.wal", fsync="batch")
+    await wal.append(dict(op="delete_book", isbn="9780451524935"))
+
+    record = dict(op="delete_book", isbn="9780451524935")
+    new_books = prepare_record(record)
+    await wal.append(record)
+    apply_record(record, BOOKS, BOOK_REVIEWS, new_books)
+
+    for record, offset in wal.replay():
+        apply_record(record, BOOKS, BOOK_REVIEWS)
+    ```
+"""
+
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from api.book import Book
+from api.catalog import BookCatalog
+from api.reviews import ReviewStore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - exercised only on Windows
+    fcntl = None
+
+FSYNC_POLICIES = ("always", "batch", "never")
+
+_OPERATIONS = (
+    "create_book",
+    "create_books",
+    "add_rating",
+    "add_ratings",
+    "delete_book",
+    "create_review",
+)
+
+
+def read_log(path: str, start: int = 0) -> Iterator[Tuple[dict, int]]:
+    """
+    Reads the records of a log file in the order they were appended. Reading stops at
+    the first torn record, which can only be the last one.
+
+    Args:
+        path: The path of the log file.
+        start: The offset of the first record to read.
+
+    Yields:
+        Each complete record, with the offset of the end of the record.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+
+        for line in f:
+            try:
+                record = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                record = None
+
+            if record is None:
+                return
+
+            offset += len(line)
+            yield record, offset
+
+
+def _add_ratings(books: BookCatalog, book: Book, count: int, total: float) -> None:
+    # Books created before new books started with zero ratings have None totals.
+    num_ratings = (book.num_ratings or 0) + count
+    sum_ratings = (book.sum_ratings or 0) + total
+    books.set_ratings(book.isbn, num_ratings, sum_ratings)
+
+
+def prepare_record(record: dict) -> List[Book]:
+    """
+    Checks that a record can be applied and builds the books it creates.
+
+    Args:
+        record: A record about to be appended to the log.
+
+    Returns:
+        The books of a create_book or create_books record, in the order they appear
+        in it, or an empty list for the other operations.
+
+    Raises:
+        ValueError: If the record has an unknown operation, or one of its books cannot
+        be built.
+    """
+    op = record["op"]
+
+    if op not in _OPERATIONS:
+        msg = f"Unknown write-ahead log operation: {op}."
+        raise ValueError(msg)
+
+    if op == "create_book":
+        data = [record["book"]]
+    elif op == "create_books":
+        data = record["books"]
+    else:
+        return []
+
+    try:
+        return [Book.from_dict(book) for book in data]
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+        msg = f"Invalid book in {op} record: {e}"
+        raise ValueError(msg) from e
+
+
+def apply_record(
+    record: dict,
+    books: BookCatalog,
+    reviews: ReviewStore,
+    new_books: Optional[List[Book]] = None,
+) -> bool:
+    """
+    Args:
+        record: A record appended to the log.
+        books: The catalog to apply the record to.
+        reviews: The review store to apply the record to.
+        new_books: The books prepare_record built from the record, if it was called,
+        so they are not built again.
+
+    Returns:
+        True if the record changed the catalog or the review store, or False if it
+        was rejected because its book already exists or does not exist. Books in a
+        create_books record that already exist are skipped.
+
+    Raises:
+        ValueError: If the record has an unknown operation.
+    """
+    op = record["op"]
+
+    if op == "create_book":
+        if record["book"]["isbn"] in books:
+            return False
+
+        books.add(new_books[0] if new_books else Book.from_dict(record["book"]))
+        return True
+
+    if op == "add_ratings":
+        # Maps each ISBN to the number and the sum of the ratings it receives.
+        for isbn, (count, total) in record["ratings"].items():
+            book = books.get(isbn)
+
+            if book is not None:
+                _add_ratings(books, book, count, total)
+
+        return True
+
+    if op == "create_books":
+        # Checked while the books are added, so a repeated ISBN keeps its first book.
+        if new_books is None:
+            new_books = map(Book.from_dict, record["books"])
+
+        books.add_many(book for book in new_books if book.isbn not in books)
+        return True
+
+    book = books.get(record["isbn"])
+
+    if book is None:
+        return False
+
+    if op == "delete_book":
+        books.mark_deleted(book.isbn)
+    elif op == "add_rating":
+        _add_ratings(books, book, 1, record["rating"])
+    elif op == "create_review":
+        reviews.add(book.isbn, record["review"])
+    else:
+        msg = f"Unknown write-ahead log operation: {op}."
+        raise ValueError(msg)
+
+    return True
+
+
+class WriteAheadLog:
+    """
+    An append-only log of JSON records stored in a file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync: str = "batch",
+        batch_interval: float = 0,
+        shared: bool = False,
+    ):
+        """
+        Args:
+            path: The path of the log file. It is created if it does not exist.
+            fsync: One of FSYNC_POLICIES.
+            batch_interval: The number of seconds to wait for more appends before
+            each fsync, when the policy is "batch". Appends made while an fsync runs
+            always share the next one, so it only needs to be raised to trade latency
+            for fewer fsyncs.
+            shared: True if other processes append to the same log.
+
+        Raises:
+            ValueError: If the fsync policy is not supported.
+            RuntimeError: If the log is shared and the platform has no fcntl.
+        """
+        if fsync not in FSYNC_POLICIES:
+            msg = f"fsync must be one of {', '.join(FSYNC_POLICIES)}."
+            raise ValueError(msg)
+
+        if shared and fcntl is None:
+            msg = "Shared write-ahead logs are only supported on POSIX systems."
+            raise RuntimeError(msg)
+
+        self.path = path
+        self.fsync = fsync
+        self.batch_interval = batch_interval
+        self.shared = shared
+        self._file = open(path, "ab")
+        self._waiters: List[asyncio.Future] = []
+        self._sync_task: Optional[asyncio.Task] = None
+
+    async def append(self, record: dict) -> int:
+        """
+        Appends a record to the log and waits until it is as durable as the fsync
+        policy makes it.
+
+        Args:
+            record: A JSON-serializable dictionary.
+
+        Returns:
+            The offset of the end of the record.
+        """
+        end = self.write(record)
+        await self.sync()
+        return end
+
+    def write(self, record: dict) -> int:
+        """
+        Appends a record to the log without waiting for it to be durable.
+
+        Args:
+            record: A JSON-serializable dictionary.
+
+        Returns:
+            The offset of the end of the record.
+        """
+        data = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+        with self._locked():
+            self._file.write(data)
+            self._file.flush()
+            return self._file.tell()
+
+    async def sync(self) -> None:
+        """
+        Waits until the records written so far are as durable as the fsync policy
+        makes them.
+        """
+        if self.fsync == "always":
+            os.fsync(self._file.fileno())
+        elif self.fsync == "batch":
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            if self._sync_task is None:
+                self._sync_task = asyncio.create_task(self._sync_batches())
+
+            await waiter
+
+    def replay(self, start: int = 0) -> Iterator[Tuple[dict, int]]:
+        """
+        Reads the records in the log in the order they were appended.
+
+        A torn record at the end of the log, left by a crash in the middle of an
+        append, is truncated away once the records before it have been read, so new
+        records are never appended after it. A shared log stays locked until the
+        records have been read, so a record another process is appending is never
+        mistaken for a torn one.
+
+        Args:
+            start: The offset of the first record to read.
+
+        Yields:
+            Each complete record in the log, with the offset of the end of the record.
+        """
+        with self._locked():
+            offset = start
+
+            for record, offset in read_log(self.path, start):
+                yield record, offset
+
+            if offset < os.path.getsize(self.path):
+                os.truncate(self.path, offset)
+                self._file.seek(offset)
+
+    def read(self, start: int) -> Iterator[Tuple[dict, int]]:
+        """
+        Reads the records appended after an offset, including those appended by other
+        processes sharing the log. Nothing is opened when no record has been appended
+        since.
+
+        Args:
+            start: The offset of the first record to read.
+
+        Yields:
+            Each complete record, with the offset of the end of the record.
+        """
+        if start < self.tell():
+            yield from read_log(self.path, start)
+
+    def tell(self) -> int:
+        """
+        Returns:
+            The offset at which the next record will be appended.
+        """
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self) -> None:
+        self._file.flush()
+
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+
+        self._file.close()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if not self.shared:
+            yield
+            return
+
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    async def _sync_batches(self) -> None:
+        # Appends made while an fsync is running wait for the next one, so the
+        # batches grow with the write load without delaying a lone writer.
+        while self._waiters:
+            await asyncio.sleep(self.batch_interval)
+            waiters, self._waiters = self._waiters, []
+
+            try:
+                await asyncio.to_thread(os.fsync, self._file.fileno())
+            except OSError as e:
+                for waiter in waiters:
+                    waiter.set_exception(e)
+            else:
+                for waiter in waiters:
+                    waiter.set_result(None)
+
+        self._sync_task = None
@@ -0,0 +1,10 @@
+"""
+Benchmarks for the book management API.
+
+Each module in this package is a standalone script. Run one from the repository root,
+for example:
+
+```powershell
+python -m benchmarks.bench_point_lookups
+```
+"""
@@ -0,0 +1,79 @@
+"""
+Benchmarks typeahead suggestions against catalog size.
+
+For each catalog size the script loads the authors, titles and categories of that
+many synthetic books into a SuggestionIndex and reports:
+
+- build: the seconds taken to load the index.
+- cold: the microseconds taken by the first query of every one-character prefix,
+  which fills the caches of the prefixes with many suggestions.
+- p50 and p99: the latency in microseconds of queries for random prefixes of one to
+  six characters, taken from the authors and titles of random books, with a rating
+  added to a random book between queries so cached prefixes are kept up to date.
+
+```powershell
+python -m benchmarks.bench_autocomplete --sizes 100000 1000000 10000000
+```
+"""
+
+import argparse
+import random
+import time
+
+from api.autocomplete import SuggestionIndex
+from api.book import Book
+from benchmarks.synthetic import make_book, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(
+        f"{'books':>10} {'build (s)':>10} {'cold (us)':>10} {'p50 (us)':>9} "
+        f"{'p99 (us)':>9}"
+    )
+
+    for size in args.sizes:
+        rng = random.Random(size)
+        books = [Book.from_dict(make_book(i)) for i in range(size)]
+        index = SuggestionIndex()
+
+        start = time.perf_counter()
+
+        for book in books:
+            index.add(book)
+
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+
+        for first in "abcdefghijklmnopqrstuvwxyz0123456789":
+            index.suggest(first, args.k)
+
+        cold = (time.perf_counter() - start) * 1e6
+
+        samples = []
+
+        for _ in range(args.queries):
+            book = rng.choice(books)
+            index.add_ratings(book, 1)
+            book.num_ratings += 1
+
+            value = getattr(rng.choice(books), rng.choice(("author", "title")))
+            prefix = value[: rng.randint(1, 6)]
+            start = time.perf_counter()
+            index.suggest(prefix, args.k)
+            samples.append((time.perf_counter() - start) * 1e6)
+
+        print(
+            f"{size:>10} {build:>10.2f} {cold:>10.0f} {percentile(samples, 50):>9.1f} "
+            f"{percentile(samples, 99):>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmarks the columnar catalog against the row catalog.
+
+For each catalog size the script times filtered query_book calls on both backends.
+Latencies are the median of the runs, in milliseconds.
+
+```powershell
+python -m benchmarks.bench_columnar --sizes 100000 1000000
+```
+"""
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from functools import partial
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.columnar import ColumnarBookCatalog
+from api.models import BookQueryParameters
+from benchmarks.synthetic import AUTHORS, CATEGORIES, make_books, percentile
+
+QUERIES = dict(
+    rating_range=BookQueryParameters(min_rating=2.5, max_rating=3.5, top=10),
+    category_rating=BookQueryParameters(category=CATEGORIES[0], min_rating=4.5),
+    author=BookQueryParameters(author=f"{AUTHORS[0]}0"),
+)
+
+
+def _query(params: BookQueryParameters) -> list:
+    return asyncio.run(bs.query_book(params))
+
+
+def _median_ms(run, repeat: int) -> float:
+    samples = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return percentile(samples, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'books':>10} {'operation':<24} {'rows (ms)':>10} {'columnar (ms)':>14}")
+
+    for size in args.sizes:
+        books = make_books(size)
+        rows = BookCatalog(map(Book.from_dict, books))
+        columns = ColumnarBookCatalog(map(Book.from_dict, books))
+        results = defaultdict(list)
+
+        for catalog in (rows, columns):
+            bs.BOOKS = catalog
+
+            for name, params in QUERIES.items():
+                query = partial(_query, params)
+                results[name].append(_median_ms(query, args.repeat))
+
+        for name, (row_ms, columnar_ms) in results.items():
+            print(f"{size:>10} {name:<24} {row_ms:>10.2f} {columnar_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Stress-tests concurrent writes and checks that no update is lost.
+
+Many writers send add_rating and add_ratings writes at the same time through a
+write-ahead log with batched fsyncs, so every write awaits while it holds its book's
+lock. With "hot" every writer rates the same few books, and with "spread" the writes are
+spread over the whole catalog. At the end the script counts the ratings that are missing
+from each book's num_ratings and sum_ratings, in the catalog and after replaying the
+log, which should always be 0, and reports the writes per second and the p50 and p99
+write latency in milliseconds. Writes to different books do not wait for each other, so
+"spread" should keep its throughput as concurrency grows.
+
+```powershell
+python -m benchmarks.bench_concurrency --writes 5000 --concurrency 1 16 256
+```
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.models import AddRatingRequest, AddRatingsRequest
+from api.wal import WriteAheadLog
+from benchmarks.synthetic import make_books, make_isbn, percentile
+
+CATALOG_SIZE = 10_000
+HOT_BOOKS = 4
+RATING = 4
+BATCH_SIZE = 5
+
+
+def _load_catalog() -> BookCatalog:
+    return BookCatalog(map(Book.from_dict, make_books(CATALOG_SIZE)))
+
+
+def _pick_isbn(i: int, workload: str) -> str:
+    books = HOT_BOOKS if workload == "hot" else CATALOG_SIZE
+    return make_isbn(i * 7919 % books)
+
+
+async def _run_writers(writes: int, concurrency: int, workload: str) -> tuple:
+    latencies: List[float] = []
+    sent: Counter = Counter()
+    rating = AddRatingRequest(rating=RATING)
+
+    async def writer(start: int):
+        for i in range(start, writes, concurrency):
+            began = time.perf_counter()
+
+            if i % 2:
+                isbns = [
+                    _pick_isbn(i * BATCH_SIZE + j, workload) for j in range(BATCH_SIZE)
+                ]
+                ratings = [dict(isbn=isbn, rating=RATING) for isbn in isbns]
+                await bs.add_ratings(AddRatingsRequest(ratings=ratings))
+            else:
+                isbns = [_pick_isbn(i, workload)]
+                await bs.add_rating(isbns[0], rating)
+
+            latencies.append((time.perf_counter() - began) * 1000)
+            sent.update(isbns)
+
+    await asyncio.gather(*(writer(start) for start in range(concurrency)))
+    return latencies, sent
+
+
+def _count_lost(catalog: BookCatalog, sent: Counter) -> int:
+    lost = 0
+
+    for book in map(Book.from_dict, make_books(CATALOG_SIZE)):
+        updated = catalog.get(book.isbn)
+        count = sent[book.isbn]
+        lost += book.num_ratings + count - updated.num_ratings
+        lost += book.sum_ratings + count * RATING != updated.sum_ratings
+
+    return lost
+
+
+def _bench(writes: int, concurrency: int, workload: str) -> Tuple[float, ...]:
+    bs.BOOKS = _load_catalog()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bs.WAL = WriteAheadLog(os.path.join(directory, "books.wal"), "batch")
+        start = time.perf_counter()
+        latencies, sent = asyncio.run(_run_writers(writes, concurrency, workload))
+        elapsed = time.perf_counter() - start
+
+        lost = _count_lost(bs.BOOKS, sent)
+        bs.BOOKS = _load_catalog()
+        bs.replay_log()
+        lost_on_replay = _count_lost(bs.BOOKS, sent)
+        bs.WAL.close()
+
+    p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+    return writes / elapsed, p50, p99, max(lost, lost_on_replay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 256])
+    args = parser.parse_args()
+
+    print(
+        f"{'workload':<8} {'concurrency':>11} {'writes/s':>10} "
+        f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'lost':>5}"
+    )
+
+    for workload in ("hot", "spread"):
+        for concurrency in args.concurrency:
+            throughput, p50, p99, lost = _bench(args.writes, concurrency, workload)
+            print(
+                f"{workload:<8} {concurrency:>11} {throughput:>10.0f} "
+                f"{p50:>9.2f} {p99:>9.2f} {lost:>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
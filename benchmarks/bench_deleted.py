@@ -0,0 +1,105 @@
+"""
+Benchmarks queries against the share of soft-deleted books.
+
+For each catalog size and share of soft-deleted books the script builds a catalog of
+synthetic books, soft-deletes every book whose position falls in that share, and
+reports the median latency in microseconds of uncached query_book_json calls for:
+
+- page: the first `top` books, with no filter.
+- category: the first `top` books of one category.
+- search: the first `top` books matching a title search.
+
+Each query is timed while the deleted books are tombstones and again after they are
+compacted to cold storage, together with the memory held by the catalog in MiB. Since
+deleted books are kept out of the live indexes, the latencies should not grow with
+the share of deleted books.
+
+```powershell
+python -m benchmarks.bench_deleted --sizes 100000 1000000 --ratios 0 0.5 0.9
+```
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.models import BookQueryParameters
+from benchmarks.synthetic import CATEGORIES, make_book, percentile
+
+
+def _time(params: BookQueryParameters, repeat: int) -> float:
+    samples = []
+
+    for _ in range(repeat):
+        bs.QUERY_CACHE.clear()
+        start = time.perf_counter()
+        asyncio.run(bs.query_book_json(params))
+        samples.append((time.perf_counter() - start) * 1e6)
+
+    return percentile(samples, 50)
+
+
+def _build(size: int, ratio: float) -> BookCatalog:
+    books = []
+
+    for i in range(size):
+        book = Book.from_dict(make_book(i))
+        # Spreads the deleted books evenly over the catalog.
+        book.soft_deleted = i * ratio % 1 + ratio >= 1 and ratio > 0
+        books.append(book)
+
+    return BookCatalog(books)
+
+
+def _measure_memory(size: int, ratio: float) -> dict:
+    # Tracing slows queries down, so memory is measured on a catalog of its own.
+    tracemalloc.start()
+    books = _build(size, ratio)
+    tombs = tracemalloc.get_traced_memory()[0]
+    books.compact(0)
+    cold = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return dict(tombs=tombs / 2**20, cold=cold / 2**20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0, 0.5, 0.9])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = dict(
+        page=BookQueryParameters(top=args.top),
+        category=BookQueryParameters(category=CATEGORIES[0], top=args.top),
+        search=BookQueryParameters(q="book 1", top=args.top),
+    )
+
+    print(
+        f"{'books':>10} {'deleted':>8} {'state':<6} {'MiB':>8} "
+        + " ".join(f"{name + ' (us)':>14}" for name in queries)
+    )
+
+    for size in args.sizes:
+        for ratio in args.ratios:
+            memory = _measure_memory(size, ratio)
+            bs.BOOKS = _build(size, ratio)
+
+            for state in ("tombs", "cold"):
+                if state == "cold":
+                    bs.BOOKS.compact(0)
+
+                latencies = [_time(params, args.repeat) for params in queries.values()]
+                print(
+                    f"{size:>10} {ratio:>8.0%} {state:<6} {memory[state]:>8.0f} "
+                    + " ".join(f"{latency:>14.1f}" for latency in latencies)
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmarks bulk imports through POST /books/import.
+
+For each catalog size and format the script imports that many synthetic books into an
+empty catalog and reports the books imported per second. "service" calls import_books
+directly with the body in 64 KiB chunks, and "http" posts the same body through the
+ASGI app, which adds request parsing and body streaming.
+
+```powershell
+python -m benchmarks.bench_import --sizes 100000 1000000
+```
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import time
+from typing import AsyncIterator
+
+from fastapi.testclient import TestClient
+
+import api.book_service as bs
+from api.book_endpoints import CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, app
+from api.catalog import BookCatalog
+from benchmarks.synthetic import make_books
+
+CHUNK_SIZE = 64 * 1024
+FIELDS = ("title", "author", "category", "isbn")
+
+
+def _to_ndjson(books: list) -> bytes:
+    lines = (json.dumps({field: b[field] for field in FIELDS}) for b in books)
+    return "\n".join(lines).encode()
+
+
+def _to_csv(books: list) -> bytes:
+    body = io.StringIO()
+    writer = csv.DictWriter(body, FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(books)
+    return body.getvalue().encode()
+
+
+async def _chunks(body: bytes) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start : start + CHUNK_SIZE]
+
+
+def _import_service(body: bytes, file_format: str) -> dict:
+    return asyncio.run(bs.import_books(_chunks(body), file_format))
+
+
+def _import_http(body: bytes, file_format: str) -> dict:
+    media_type = CSV_MEDIA_TYPE if file_format == "csv" else NDJSON_MEDIA_TYPE
+    client = TestClient(app)
+    response = client.post(
+        "/books/import", content=body, headers={"content-type": media_type}
+    )
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    args = parser.parse_args()
+
+    print(f"{'books':>10} {'format':<7} {'path':<8} {'books/s':>10} {'MB':>7}")
+
+    for size in args.sizes:
+        books = make_books(size)
+        bodies = dict(ndjson=_to_ndjson(books), csv=_to_csv(books))
+
+        for file_format, body in bodies.items():
+            for path, run in (("service", _import_service), ("http", _import_http)):
+                bs.BOOKS = BookCatalog()
+                start = time.perf_counter()
+                report = run(body, file_format)
+                elapsed = time.perf_counter() - start
+
+                assert report["imported"] == size, report
+                print(
+                    f"{size:>10} {file_format:<7} {path:<8} "
+                    f"{size / elapsed:>10.0f} {len(body) / 2**20:>7.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
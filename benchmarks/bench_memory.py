@@ -0,0 +1,65 @@
+"""
+Benchmarks the memory used per book by the catalog.
+
+For each catalog size the script builds the books three ways and reports the bytes
+allocated per book:
+
+- dicts: a list of per-book dictionaries, which is how books used to be stored.
+- records: a list of slotted Book records with interned author and category strings.
+- catalog: a BookCatalog of Book records, including its ISBN, author, category, rating
+  and sort order indexes, its full-text and suggestion indexes, and its running
+  aggregates.
+
+```powershell
+python -m benchmarks.bench_memory --sizes 1000000 10000000
+```
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from api.book import Book
+from api.catalog import BookCatalog
+from benchmarks.synthetic import make_book
+
+
+def _bytes_per_book(build, size: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    books = build(size)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del books
+    return (after - before) / size
+
+
+def _build_dicts(size: int) -> list:
+    return [make_book(i) for i in range(size)]
+
+
+def _build_records(size: int) -> list:
+    return [Book.from_dict(make_book(i)) for i in range(size)]
+
+
+def _build_catalog(size: int) -> BookCatalog:
+    return BookCatalog(Book.from_dict(make_book(i)) for i in range(size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'books':>10} {'dicts':>10} {'records':>10} {'catalog':>10}")
+
+    for size in args.sizes:
+        dicts = _bytes_per_book(_build_dicts, size)
+        records = _bytes_per_book(_build_records, size)
+        catalog = _bytes_per_book(_build_catalog, size)
+        print(f"{size:>10} {dicts:>10.0f} {records:>10.0f} {catalog:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
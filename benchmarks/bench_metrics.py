@@ -0,0 +1,90 @@
+"""
+Benchmarks the overhead of the latency metrics.
+
+The script times two hot paths with metrics disabled, enabled for every call, and
+enabled with sampling, and reports the microseconds per call:
+
+- middleware: a request through MetricsMiddleware to an ASGI app that does nothing,
+  which is the whole cost the middleware adds to a request.
+- query: an uncached query_book_json call for one author of a synthetic catalog, with
+  its stage timers.
+
+```powershell
+python -m benchmarks.bench_metrics --calls 100000 --sample-rate 0.01
+```
+"""
+
+import argparse
+import asyncio
+import time
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.metrics import METRICS, MetricsMiddleware
+from api.models import BookQueryParameters
+from benchmarks.synthetic import AUTHORS, make_books
+
+CATALOG_SIZE = 100_000
+
+
+async def _noop_app(scope, receive, send) -> None:
+    await send(dict(type="http.response.start", status=200, headers=[]))
+
+
+async def _receive() -> dict:
+    return dict(type="http.request")
+
+
+async def _send(message: dict) -> None:
+    pass
+
+
+async def _run_middleware(calls: int) -> None:
+    middleware = MetricsMiddleware(_noop_app, METRICS)
+    scope = dict(type="http", method="GET", path="/books/q")
+
+    for _ in range(calls):
+        await middleware(scope, _receive, _send)
+
+
+async def _run_queries(calls: int) -> None:
+    params = BookQueryParameters(author=f"{AUTHORS[0]}1")
+
+    for _ in range(calls):
+        bs.QUERY_CACHE.clear()
+        await bs.query_book_json(params)
+
+
+def _time(run, calls: int) -> float:
+    start = time.perf_counter()
+    asyncio.run(run(calls))
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    bs.BOOKS = BookCatalog(map(Book.from_dict, make_books(CATALOG_SIZE)))
+    modes = [
+        ("disabled", False, 1.0),
+        ("enabled", True, 1.0),
+        (f"sampled {args.sample_rate:g}", True, args.sample_rate),
+    ]
+
+    print(f"{'mode':<14} {'middleware (us)':>16} {'query (us)':>11}")
+
+    for name, enabled, sample_rate in modes:
+        METRICS.enabled = enabled
+        METRICS.sample_rate = sample_rate
+        METRICS.reset()
+        middleware = _time(_run_middleware, args.calls)
+        query = _time(_run_queries, args.calls // 10)
+        print(f"{name:<14} {middleware:>16.2f} {query:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmarks ISBN point operations against catalog size.
+
+For each catalog size the script times `add_rating`, `delete_book`, `create_review` and
+`query_book` with an `isbn` filter, and compares them with the linear scan the service
+used before the catalog was indexed by ISBN. Latencies are reported in microseconds.
+
+```powershell
+python -m benchmarks.bench_point_lookups --sizes 1000 100000 1000000
+```
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.models import AddRatingRequest, BookQueryParameters, CreateReviewRequest
+from api.reviews import ReviewStore
+from benchmarks.synthetic import make_books, make_isbn, percentile
+
+
+async def _time_calls(make_call, isbns) -> list:
+    samples = []
+
+    for isbn in isbns:
+        start = time.perf_counter_ns()
+        await make_call(isbn)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+
+    return samples
+
+
+async def _linear_scan(books: list, isbn: str):
+    return [b for b in books if b["isbn"] == isbn]
+
+
+async def _run(size: int, iterations: int):
+    books = make_books(size)
+    bs.BOOKS = BookCatalog(map(Book.from_dict, books))
+    bs.BOOK_REVIEWS = ReviewStore()
+
+    rng = random.Random(size)
+    isbns = [make_isbn(rng.randrange(size)) for _ in range(iterations)]
+    rating = AddRatingRequest(rating=4)
+    review = CreateReviewRequest(review="Benchmark review.")
+
+    operations = dict(
+        add_rating=lambda isbn: bs.add_rating(isbn, rating),
+        create_review=lambda isbn: bs.create_review(isbn, review),
+        query_isbn=lambda isbn: bs.query_book(BookQueryParameters(isbn=isbn)),
+        delete_book=bs.delete_book,
+        linear_scan=lambda isbn: _linear_scan(books, isbn),
+    )
+
+    for name, operation in operations.items():
+        samples = await _time_calls(operation, isbns)
+        print(
+            f"{size:>10} {name:<14} "
+            f"p50={percentile(samples, 50):>10.1f} p99={percentile(samples, 99):>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'books':>10} {'operation':<14} latency (us)")
+
+    for size in args.sizes:
+        asyncio.run(_run(size, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmarks the single-pass query pipeline against the list-building one it replaced.
+
+For each catalog size the script runs a set of filtered queries through both
+pipelines, checks that they return the same books, and reports for each:
+
+- matches: the number of books the query matches before `top` is applied.
+- p50: the median latency in microseconds of selecting, filtering and ordering the
+  books, without encoding them.
+- peak: the peak memory in KiB allocated while the query runs, traced with
+  tracemalloc in a separate run.
+
+The legacy pipeline materializes the books of the smallest index, then the books
+within the rating bounds, then the soft-deleted books, and sorts the result. The fused
+pipeline compiles the filters into one predicate, applies it lazily on the way into
+the sort, and stops early when the first `top` books in catalog order are asked for.
+
+```powershell
+python -m benchmarks.bench_query_pipeline --sizes 100000 1000000
+```
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable, List
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import INDEXED_FIELDS, BookCatalog
+from api.models import BookQueryParameters
+from benchmarks.synthetic import AUTHORS, CATEGORIES, make_book, percentile
+
+QUERIES = dict(
+    category=dict(category=CATEGORIES[1], top=20),
+    # Synthetic categories follow the parity of the author, so none of the books of
+    # the author that sorts first is in this one.
+    category_clustered=dict(category=CATEGORIES[0], top=20),
+    author=dict(author=f"{AUTHORS[0]}7", top=20),
+    rating=dict(min_rating=4.0, top=20),
+    category_rating=dict(category=CATEGORIES[1], min_rating=2.5, top=20),
+    deleted=dict(category=CATEGORIES[2], return_deleted_books=True, top=20),
+    search=dict(q="book 1", top=20),
+    category_all=dict(category=CATEGORIES[3]),
+)
+
+
+def _filter_by_rating(books: List[Book], params: BookQueryParameters) -> List[Book]:
+    return [
+        b
+        for b in books
+        if b.avg_rating is not None
+        and (params.min_rating is None or b.avg_rating >= params.min_rating)
+        and (params.max_rating is None or b.avg_rating <= params.max_rating)
+    ]
+
+
+def _legacy_rank(params: BookQueryParameters) -> List[Book]:
+    scores = bs.BOOKS.search(params.q) if params.q is not None else None
+    key = bs._get_rank_key(scores) if scores is not None else bs._SORT_KEY
+    matches = [
+        bs.BOOKS.lookup(field, getattr(params, field))
+        for field in INDEXED_FIELDS
+        if getattr(params, field)
+    ]
+
+    if scores is not None:
+        matches.append(scores)
+
+    matches.sort(key=len)
+    by_rating = params.min_rating is not None or params.max_rating is not None
+
+    if by_rating and (
+        not matches
+        or bs.BOOKS.count_rating_range(params.min_rating, params.max_rating)
+        < len(matches[0])
+    ):
+        books = [
+            book
+            for book in bs.BOOKS.rating_range(params.min_rating, params.max_rating)
+            if all(book.isbn in match for match in matches)
+        ]
+    else:
+        smallest, others = matches[0], matches[1:]
+        books = [
+            bs.BOOKS.get(isbn)
+            for isbn in smallest
+            if all(isbn in other for other in others)
+        ]
+
+        if by_rating:
+            books = _filter_by_rating(books, params)
+
+    if params.return_deleted_books:
+        deleted = list(bs.BOOKS.iter_deleted())
+
+        for field in INDEXED_FIELDS:
+            value = getattr(params, field)
+
+            if value:
+                value = value.casefold()
+                deleted = [b for b in deleted if getattr(b, field).casefold() == value]
+
+        books += deleted
+
+    return bs._sort_books(books, params.top, key)
+
+
+def _fused_rank(params: BookQueryParameters) -> List[Book]:
+    return list(bs._iter_books(params))
+
+
+def _time(rank: Callable, params: BookQueryParameters, repeat: int) -> float:
+    samples = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rank(params)
+        samples.append((time.perf_counter() - start) * 1e6)
+
+    return percentile(samples, 50)
+
+
+def _peak(rank: Callable, params: BookQueryParameters) -> float:
+    tracemalloc.start()
+    rank(params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--deleted", type=int, default=10, help="delete every Nth book")
+    args = parser.parse_args()
+
+    print(
+        f"{'books':>10} {'query':<18} {'matches':>8} {'legacy (us)':>12} "
+        f"{'fused (us)':>11} {'legacy (KiB)':>13} {'fused (KiB)':>12}"
+    )
+
+    for size in args.sizes:
+        books = [Book.from_dict(make_book(i)) for i in range(size)]
+
+        for book in books[:: args.deleted]:
+            book.soft_deleted = True
+
+        bs.BOOKS = BookCatalog(books)
+
+        for name, query in QUERIES.items():
+            params = BookQueryParameters(**query)
+            assert _legacy_rank(params) == _fused_rank(params)
+            matches = len(_legacy_rank(params.model_copy(update=dict(top=None))))
+            legacy = _time(_legacy_rank, params, args.repeat)
+            fused = _time(_fused_rank, params, args.repeat)
+            print(
+                f"{size:>10} {name:<18} {matches:>8} {legacy:>12.1f} {fused:>11.1f} "
+                f"{_peak(_legacy_rank, params):>13.1f} "
+                f"{_peak(_fused_rank, params):>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
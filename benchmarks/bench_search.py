@@ -0,0 +1,93 @@
+"""
+Benchmarks full-text search against catalog size and the number of matches.
+
+For each catalog size the script searches synthetic titles and authors with queries
+that match a handful, hundreds and thousands of books, and reports the number of
+matches and the median latency in microseconds of:
+
+- index: the inverted index lookup alone.
+- query: an uncached query_book_json call with the `q` parameter, which also ranks
+  and encodes the first `top` books.
+- scan: a case-insensitive scan of every title and author, which is what clients did
+  before the catalog could be searched.
+
+```powershell
+python -m benchmarks.bench_search --sizes 10000 100000 1000000
+```
+"""
+
+import argparse
+import asyncio
+import time
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.models import BookQueryParameters
+from api.search import tokenize
+from benchmarks.synthetic import make_books, percentile
+
+QUERIES = ["book 12345", "book 123", "hawking12", "orwell"]
+
+
+def _scan(books: list, query: str) -> list:
+    words = tokenize(query)
+    return [
+        book
+        for book in books
+        if all(
+            any(
+                token.startswith(word)
+                for token in tokenize(book.title + " " + book.author)
+            )
+            for word in words
+        )
+    ]
+
+
+def _time(run, repeat: int) -> float:
+    samples = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1e6)
+
+    return percentile(samples, 50)
+
+
+def _query(query: str, top: int) -> None:
+    bs.QUERY_CACHE.clear()
+    asyncio.run(bs.query_book_json(BookQueryParameters(q=query, top=top)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'books':>10} {'query':<12} {'matches':>8} {'index (us)':>11} "
+        f"{'query (us)':>11} {'scan (us)':>11}"
+    )
+
+    for size in args.sizes:
+        books = [Book.from_dict(book) for book in make_books(size)]
+        bs.BOOKS = BookCatalog(books)
+
+        for query in QUERIES:
+            matches = len(bs.BOOKS.search(query))
+            index = _time(lambda q=query: bs.BOOKS.search(q), args.repeat)
+            full = _time(lambda q=query: _query(q, args.top), args.repeat)
+            scan = _time(lambda q=query: _scan(books, q), max(1, args.repeat // 10))
+            assert len(_scan(books, query)) == matches
+            print(
+                f"{size:>10} {query:<12} {matches:>8} {index:>11.1f} {full:>11.1f} "
+                f"{scan:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
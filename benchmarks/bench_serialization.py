@@ -0,0 +1,87 @@
+"""
+Benchmarks the CPU time spent encoding /books/q responses.
+
+For each number of rows the script selects that many books from a synthetic catalog
+and reports the CPU time per response in milliseconds for three ways of encoding them:
+
+- generic: converting each book to a dict and rendering the list with FastAPI's
+  jsonable_encoder and JSONResponse, which is what the endpoint did before.
+- cold: joining the JSON of each book into an array right after every book changed,
+  so each book is encoded once and then cached.
+- cached: joining the cached JSON of each book into an array.
+
+The query cache is bypassed, so the times only include selecting and encoding the
+books. The script checks that all three produce the same bytes.
+
+```powershell
+python -m benchmarks.bench_serialization --rows 100 1000 10000
+```
+"""
+
+import argparse
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.models import BookQueryParameters
+from benchmarks.synthetic import make_books
+
+CATALOG_SIZE = 100_000
+
+
+def _generic(params: BookQueryParameters) -> bytes:
+    books = [book.to_dict() for book in bs._iter_books(params)]
+    return JSONResponse(jsonable_encoder(books)).body
+
+
+def _stitched(params: BookQueryParameters) -> bytes:
+    return b"[" + b",".join([book.to_json() for book in bs._iter_books(params)]) + b"]"
+
+
+def _cold(params: BookQueryParameters) -> tuple:
+    for book in bs.BOOKS:
+        book.clear_json()
+
+    start = time.process_time()
+    body = _stitched(params)
+    return body, time.process_time() - start
+
+
+def _time(run, params: BookQueryParameters, repeat: int) -> tuple:
+    start = time.process_time()
+
+    for _ in range(repeat):
+        body = run(params)
+
+    return body, (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    bs.BOOKS = BookCatalog(map(Book.from_dict, make_books(CATALOG_SIZE)))
+
+    print(f"{'rows':>7} {'generic (ms)':>13} {'cold (ms)':>10} {'cached (ms)':>12}")
+
+    for rows in args.rows:
+        params = BookQueryParameters(top=rows)
+        generic_body, generic = _time(_generic, params, args.repeat)
+        cold_body, cold = _cold(params)
+        cached_body, cached = _time(_stitched, params, args.repeat)
+
+        assert generic_body == cold_body == cached_body
+        print(
+            f"{rows:>7} {generic * 1000:>13.2f} {cold * 1000:>10.2f} "
+            f"{cached * 1000:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
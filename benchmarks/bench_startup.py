@@ -0,0 +1,109 @@
+"""
+Benchmarks how long it takes to rebuild the catalog at startup.
+
+For each catalog size the script times three ways of getting a catalog ready to serve:
+
+- seed: building Book records from in-memory dictionaries and loading them into a
+  catalog, which is what importing api.data does.
+- wal: replaying a write-ahead log with one create_book record per book.
+- snapshot: restoring the catalog from a snapshot, which is what the app does at
+  startup when BOOKS_SNAPSHOT_PATH is set.
+
+It also reports the size of the log and the snapshot and how long the snapshot took to
+write. Times are in seconds.
+
+```powershell
+python -m benchmarks.bench_startup --sizes 100000 1000000
+```
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from functools import partial
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.reviews import ReviewStore
+from api.snapshot import write_snapshot
+from api.wal import apply_record, read_log
+from benchmarks.synthetic import make_books
+
+
+def _time(run) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def _write_log(path: str, books: list) -> None:
+    with open(path, "w") as f:
+        for book in books:
+            f.write(json.dumps(dict(op="create_book", book=book)) + "\n")
+
+
+def _replay_log(path: str) -> BookCatalog:
+    catalog = BookCatalog()
+    reviews = ReviewStore()
+
+    for record, _ in read_log(path):
+        apply_record(record, catalog, reviews)
+
+    return catalog
+
+
+def _seed(books: list) -> BookCatalog:
+    return BookCatalog(Book(**book) for book in books)
+
+
+def _restore(path: str) -> None:
+    bs.SNAPSHOT_PATH = path
+    bs.restore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--skip-wal", action="store_true")
+    args = parser.parse_args()
+
+    print(
+        f"{'books':>10} {'seed (s)':>9} {'wal (s)':>9} {'snapshot (s)':>13} "
+        f"{'write (s)':>10} {'wal (MB)':>9} {'snapshot (MB)':>14}"
+    )
+
+    for size in args.sizes:
+        books = make_books(size)
+
+        with tempfile.TemporaryDirectory() as directory:
+            wal_path = os.path.join(directory, "books.wal")
+            snapshot_path = os.path.join(directory, "books.snapshot")
+
+            seed = _time(partial(_seed, books))
+            catalog = BookCatalog(map(Book.from_dict, books))
+            write = _time(
+                partial(write_snapshot, snapshot_path, catalog, ReviewStore(), 0)
+            )
+            del catalog
+
+            wal = wal_size = float("nan")
+
+            if not args.skip_wal:
+                _write_log(wal_path, books)
+                wal = _time(partial(_replay_log, wal_path))
+                wal_size = os.path.getsize(wal_path) / 2**20
+
+            snapshot = _time(partial(_restore, snapshot_path))
+            snapshot_size = os.path.getsize(snapshot_path) / 2**20
+
+        print(
+            f"{size:>10} {seed:>9.2f} {wal:>9.2f} {snapshot:>13.2f} {write:>10.2f} "
+            f"{wal_size:>9.1f} {snapshot_size:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
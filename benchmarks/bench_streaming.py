@@ -0,0 +1,80 @@
+"""
+Benchmarks peak memory of a full catalog export from GET /books/q.
+
+For each catalog size the script exports every book once as a JSON array and once as
+newline-delimited JSON, and reports the peak memory allocated while doing so, in
+megabytes. The catalog itself is built before tracing starts, so it is not counted.
+
+```powershell
+python -m benchmarks.bench_streaming --sizes 10000 100000
+```
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+
+import api.book_service as bs
+from api.book import Book
+from api.book_endpoints import NDJSON_MEDIA_TYPE, app
+from api.catalog import BookCatalog
+from benchmarks.synthetic import make_books
+
+
+async def _export(accept: bytes):
+    scope = dict(
+        type="http",
+        asgi={"version": "3.0"},
+        http_version="1.1",
+        method="GET",
+        scheme="http",
+        path="/books/q",
+        raw_path=b"/books/q",
+        query_string=b"",
+        root_path="",
+        headers=[(b"host", b"localhost"), (b"accept", accept)],
+        client=("127.0.0.1", 0),
+        server=("localhost", 80),
+    )
+
+    messages = [dict(type="http.request", body=b"", more_body=False)]
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+
+        await disconnected.wait()
+        return dict(type="http.disconnect")
+
+    async def send(message):
+        # Drop the body chunks like a socket would once they are written.
+        pass
+
+    await app(scope, receive, send)
+
+
+def _peak_mb(accept: bytes) -> float:
+    tracemalloc.start()
+    asyncio.run(_export(accept))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'books':>10} {'json (MB)':>12} {'ndjson (MB)':>12}")
+
+    for size in args.sizes:
+        bs.BOOKS = BookCatalog(map(Book.from_dict, make_books(size)))
+        json_peak = _peak_mb(b"application/json")
+        ndjson_peak = _peak_mb(NDJSON_MEDIA_TYPE.encode())
+        print(f"{size:>10} {json_peak:>12.1f} {ndjson_peak:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+Benchmarks every route of the API against synthetic catalogs and keeps baselines.
+
+For each catalog size the script writes a snapshot of that many synthetic books, with
+ratings and a few reviews on every tenth book, and serves it two ways:
+
+- inprocess: the ASGI app called through httpx's ASGI transport, in this process, so
+  the numbers include routing, validation and encoding but no network.
+- uvicorn: a local uvicorn server started from the snapshot, called over HTTP.
+
+Each route is then sent the same number of requests from a number of concurrent
+clients, and the script reports the requests per second, the p50 and p99 latency in
+milliseconds and the number of error responses, followed by the resident memory of
+the process that serves the catalog. Writes run after reads, so the reads see the
+seeded catalog.
+
+Memory is the current RSS when psutil is installed. Otherwise it is the peak RSS from
+the resource module, which is not available on Windows, and it is not measured there.
+
+With --save the results are written to a JSON baseline, together with the details of
+the machine they were recorded on, and with --compare they are checked against one: a
+route whose p50 latency grew or whose throughput fell by more than --threshold, or a
+process whose RSS grew by more than it, is reported as a regression, and the script
+exits with status 1. Results from another machine, Python or way of measuring memory
+are not comparable, so the comparison is then skipped with a warning.
+
+```powershell
+python -m benchmarks.bench_suite --sizes 10000 1000000 10000000 --save baseline.json
+python -m benchmarks.bench_suite --sizes 10000 --compare baseline.json
+```
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import api.book_service as bs
+from api.book import Book
+from api.book_endpoints import NDJSON_MEDIA_TYPE, app
+from api.catalog import BookCatalog
+from api.reviews import ReviewStore
+from api.snapshot import write_snapshot
+from benchmarks.synthetic import make_book, make_isbn, percentile
+
+MODES = ("inprocess", "uvicorn")
+REVIEWED_EVERY = 10
+REVIEWS_PER_BOOK = 3
+IMPORT_BATCH = 100
+RATINGS_BATCH = 10
+# The details of the run that must match a baseline for the two to be compared.
+MACHINE_KEYS = ("system", "machine", "cpus", "implementation", "python", "rss")
+
+
+class _Requests:
+    """
+    Builds the requests of each route for a catalog of a given size.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.rng = random.Random(seed)
+        self._new_books = 0
+
+    def book(self) -> dict:
+        return make_book(self.rng.randrange(self.size))
+
+    def reviewed_isbn(self) -> str:
+        return make_isbn(self.rng.randrange(0, self.size, REVIEWED_EVERY))
+
+    def new_book(self) -> dict:
+        # New ISBNs start after the seeded ones, so creates never conflict.
+        self._new_books += 1
+        book = make_book(self.size + self._new_books)
+        return {field: book[field] for field in ("title", "author", "category", "isbn")}
+
+    def routes(self) -> Dict[str, Callable[[], dict]]:
+        return dict(
+            query_isbn=lambda: dict(
+                method="GET", url="/books/q", params=dict(isbn=self.book()["isbn"])
+            ),
+            query_author=lambda: dict(
+                method="GET",
+                url="/books/q",
+                params=dict(author=self.book()["author"], top=20),
+            ),
+            query_category_rating=lambda: dict(
+                method="GET",
+                url="/books/q",
+                params=dict(category=self.book()["category"], min_rating=3, top=20),
+            ),
+            query_page=lambda: dict(method="GET", url="/books/q", params=dict(top=100)),
+            query_search=lambda: dict(
+                method="GET",
+                url="/books/q",
+                params=dict(q=self.book()["title"], top=20),
+            ),
+            query_stream=lambda: dict(
+                method="GET",
+                url="/books/q",
+                params=dict(author=self.book()["author"]),
+                headers=dict(accept=NDJSON_MEDIA_TYPE),
+            ),
+            autocomplete_short=lambda: dict(
+                method="GET",
+                url="/books/autocomplete",
+                params=dict(prefix=self.book()["author"][:2]),
+            ),
+            autocomplete_long=lambda: dict(
+                method="GET",
+                url="/books/autocomplete",
+                params=dict(prefix=self.book()["author"][:-1]),
+            ),
+            get_reviews=lambda: dict(
+                method="GET",
+                url=f"/books/{self.reviewed_isbn()}/reviews",
+                params=dict(limit=10),
+            ),
+            stats_category=lambda: dict(method="GET", url="/stats/category"),
+            stats_author=lambda: dict(
+                method="GET",
+                url="/stats/author",
+                params=dict(value=self.book()["author"]),
+            ),
+            query_cache_stats=lambda: dict(method="GET", url="/stats/query-cache"),
+            metrics=lambda: dict(method="GET", url="/metrics"),
+            create_book=lambda: dict(method="POST", url="/books", json=self.new_book()),
+            import_books=lambda: dict(
+                method="POST",
+                url="/books/import",
+                content="\n".join(
+                    json.dumps(self.new_book()) for _ in range(IMPORT_BATCH)
+                ),
+                headers={"content-type": NDJSON_MEDIA_TYPE},
+            ),
+            add_rating=lambda: dict(
+                method="POST",
+                url=f"/books/{self.book()['isbn']}/ratings",
+                json=dict(rating=self.rng.randint(1, 5)),
+            ),
+            add_ratings=lambda: dict(
+                method="POST",
+                url="/books/ratings",
+                json=dict(
+                    ratings=[
+                        dict(isbn=self.book()["isbn"], rating=self.rng.randint(1, 5))
+                        for _ in range(RATINGS_BATCH)
+                    ]
+                ),
+            ),
+            create_review=lambda: dict(
+                method="POST",
+                url=f"/books/{self.book()['isbn']}/reviews",
+                json=dict(review="A benchmark review."),
+            ),
+            delete_book=lambda: dict(
+                method="DELETE", url=f"/books/{self.book()['isbn']}"
+            ),
+        )
+
+
+def _write_catalog(path: str, size: int) -> None:
+    books = BookCatalog(Book.from_dict(make_book(i)) for i in range(size))
+    reviews = ReviewStore(
+        dict(
+            isbn=make_isbn(i),
+            reviews=[f"Review {j} of book {i}." for j in range(REVIEWS_PER_BOOK)],
+        )
+        for i in range(0, size, REVIEWED_EVERY)
+    )
+    write_snapshot(path, books, reviews, 0)
+
+
+def _rss_method() -> str:
+    if psutil is not None:
+        return "psutil"
+
+    return "resource" if resource is not None else "none"
+
+
+def _rss_mb(pid: int) -> float:
+    if psutil is None:
+        return math.nan
+
+    return psutil.Process(pid).memory_info().rss / 2**20
+
+
+def _peak_rss_mb(children: bool) -> float:
+    if resource is None:
+        return math.nan
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale / 2**20
+
+
+async def _bench_route(
+    client: httpx.AsyncClient,
+    make_request: Callable[[], dict],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    latencies: List[float] = []
+    errors = 0
+
+    async def send(count: int) -> None:
+        nonlocal errors
+
+        for _ in range(count):
+            request = make_request()
+            start = time.perf_counter()
+            response = await client.request(**request)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+
+    counts = [requests // concurrency] * concurrency
+    counts[0] += requests % concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*(send(count) for count in counts))
+    elapsed = time.perf_counter() - start
+
+    return dict(
+        throughput=requests / elapsed,
+        p50=percentile(latencies, 50),
+        p99=percentile(latencies, 99),
+        errors=errors,
+    )
+
+
+async def _bench_routes(
+    client: httpx.AsyncClient, size: int, requests: int, concurrency: int
+) -> Dict[str, dict]:
+    routes = _Requests(size).routes()
+    results = {}
+
+    for name, make_request in routes.items():
+        results[name] = await _bench_route(client, make_request, requests, concurrency)
+
+    return results
+
+
+def _run_inprocess(snapshot_path: str, size: int, args) -> tuple:
+    bs.SNAPSHOT_PATH = snapshot_path
+    bs.restore()
+    bs.QUERY_CACHE.clear()
+
+    async def run() -> Dict[str, dict]:
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as c:
+            return await _bench_routes(c, size, args.requests, args.concurrency)
+
+    results = asyncio.run(run())
+
+    if psutil is None:
+        return results, _peak_rss_mb(children=False)
+
+    return results, _rss_mb(os.getpid())
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run_uvicorn(snapshot_path: str, size: int, args) -> tuple:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api.book_endpoints:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=dict(os.environ, BOOKS_SNAPSHOT_PATH=snapshot_path),
+    )
+
+    try:
+        deadline = time.perf_counter() + args.startup_timeout
+
+        while True:
+            try:
+                httpx.get(f"{base_url}/stats/query-cache")
+                break
+            except httpx.TransportError:
+                if time.perf_counter() > deadline or server.poll() is not None:
+                    raise
+                time.sleep(0.1)
+
+        async def run() -> Dict[str, dict]:
+            limits = httpx.Limits(max_connections=args.concurrency)
+
+            async with httpx.AsyncClient(base_url=base_url, limits=limits) as c:
+                return await _bench_routes(c, size, args.requests, args.concurrency)
+
+        results = asyncio.run(run())
+        rss_mb = _rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    # The peak RSS of a child process is known once it has exited.
+    if psutil is None:
+        rss_mb = _peak_rss_mb(children=True)
+
+    return results, rss_mb
+
+
+def _get_mismatches(results: dict, baseline: dict) -> List[str]:
+    meta, before = results["meta"], baseline.get("meta", {})
+    return [
+        f"{key} {before.get(key)} != {meta[key]}"
+        for key in MACHINE_KEYS
+        if before.get(key) != meta[key]
+    ]
+
+
+def _compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+
+    for key, rss_mb in results["rss_mb"].items():
+        before = baseline["rss_mb"].get(key)
+
+        if before is None:
+            continue
+
+        if math.isnan(rss_mb) or math.isnan(before):
+            print(f"warning: the RSS of {key} was not measured, so it is not compared")
+        elif rss_mb > before * (1 + threshold):
+            regressions.append(f"{key}: RSS {before:.0f} -> {rss_mb:.0f} MB")
+
+    for key, result in results["routes"].items():
+        before = baseline["routes"].get(key)
+
+        if before is None:
+            continue
+
+        slower = result["p50"] > before["p50"] * (1 + threshold)
+        fewer = result["throughput"] < before["throughput"] / (1 + threshold)
+
+        if slower or fewer:
+            regressions.append(
+                f"{key}: p50 {before['p50']:.3f} -> {result['p50']:.3f} ms, "
+                f"{before['throughput']:.0f} -> {result['throughput']:.0f} req/s"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    runners = dict(inprocess=_run_inprocess, uvicorn=_run_uvicorn)
+    results: Dict[str, dict] = dict(
+        meta=dict(
+            system=platform.system(),
+            machine=platform.machine(),
+            cpus=os.cpu_count(),
+            implementation=platform.python_implementation(),
+            python=platform.python_version(),
+            rss=_rss_method(),
+            platform=platform.platform(),
+            requests=args.requests,
+            concurrency=args.concurrency,
+        ),
+        routes={},
+        rss_mb={},
+    )
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_path = os.path.join(directory, "books.snapshot")
+            _write_catalog(snapshot_path, size)
+
+            for mode in args.modes:
+                routes, rss_mb = runners[mode](snapshot_path, size, args)
+                results["rss_mb"][f"{mode}/{size}"] = rss_mb
+
+                print(f"\n{mode}, {size} books, RSS {rss_mb:.0f} MB")
+                print(
+                    f"{'route':<22} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+                    f"{'errors':>7}"
+                )
+
+                for route, result in routes.items():
+                    results["routes"][f"{mode}/{size}/{route}"] = result
+                    print(
+                        f"{route:<22} {result['throughput']:>9.0f} "
+                        f"{result['p50']:>9.3f} {result['p99']:>9.3f} "
+                        f"{result['errors']:>7}"
+                    )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions: Optional[List[str]] = None
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        mismatches = _get_mismatches(results, baseline)
+
+        if mismatches:
+            print(
+                f"\nwarning: not compared with {args.compare}, which was recorded on "
+                f"another machine: {', '.join(mismatches)}"
+            )
+        else:
+            regressions = _compare(results, baseline, args.threshold)
+            print(f"\n{len(regressions)} regressions against {args.compare}")
+
+            for regression in regressions:
+                print(f"  {regression}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmarks write throughput with the write-ahead log under each fsync policy.
+
+For each fsync policy the script sends the same number of add_rating writes from a
+number of concurrent writers, and reports the writes per second and the p50 and p99
+write latency in milliseconds. "memory" runs without a log, as a baseline. Group
+commit only pays off when several writers wait on the log at the same time, so try
+more than one concurrency level.
+
+```powershell
+python -m benchmarks.bench_wal --writes 2000 --concurrency 1 64
+```
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List, Optional
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.models import AddRatingRequest
+from api.wal import FSYNC_POLICIES, WriteAheadLog
+from benchmarks.synthetic import make_books, make_isbn, percentile
+
+CATALOG_SIZE = 10_000
+
+
+async def _run_writers(writes: int, concurrency: int) -> List[float]:
+    latencies = []
+    rating = AddRatingRequest(rating=4)
+
+    async def writer(start: int):
+        for i in range(start, writes, concurrency):
+            began = time.perf_counter()
+            await bs.add_rating(make_isbn(i % CATALOG_SIZE), rating)
+            latencies.append((time.perf_counter() - began) * 1000)
+
+    await asyncio.gather(*(writer(start) for start in range(concurrency)))
+    return latencies
+
+
+def _bench(policy: Optional[str], writes: int, concurrency: int) -> tuple:
+    bs.BOOKS = BookCatalog(map(Book.from_dict, make_books(CATALOG_SIZE)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        bs.WAL = policy and WriteAheadLog(os.path.join(directory, "books.wal"), policy)
+        start = time.perf_counter()
+        latencies = asyncio.run(_run_writers(writes, concurrency))
+        elapsed = time.perf_counter() - start
+
+        if bs.WAL:
+            bs.WAL.close()
+
+    return writes / elapsed, percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 64])
+    args = parser.parse_args()
+
+    print(
+        f"{'policy':<8} {'writers':>8} {'writes/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9}"
+    )
+
+    for concurrency in args.concurrency:
+        for policy in (None, *FSYNC_POLICIES):
+            throughput, p50, p99 = _bench(policy, args.writes, concurrency)
+            print(
+                f"{policy or 'memory':<8} {concurrency:>8} {throughput:>10.0f} "
+                f"{p50:>9.3f} {p99:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
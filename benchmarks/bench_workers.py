@@ -0,0 +1,155 @@
+"""
+Benchmarks request throughput against the number of uvicorn workers.
+
+For each worker count the script starts uvicorn with a shared write-ahead log in a
+temporary directory, and a number of client processes send a mix of book queries and
+ratings over keep-alive connections for a fixed time. It reports the requests per
+second, and then checks that the workers agree: it asks for the number of ratings of
+every book over fresh connections, which land on different workers, and counts the
+answers that differ from the number of ratings sent, which should always be 0.
+
+Throughput can only grow with the worker count up to the number of cores, and the
+clients compete with the workers for them.
+
+```powershell
+python -m benchmarks.bench_workers --workers 1 2 4 --clients 8 --duration 10
+```
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import httpx
+
+from api.data import BOOKS
+
+RATING = 4
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(workers: int, port: int, directory: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        BOOKS_WAL_PATH=os.path.join(directory, "books.wal"),
+        BOOKS_WAL_SHARED="1",
+        BOOKS_WAL_FSYNC="never",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api.book_endpoints:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+
+    for _ in range(300):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/books/q?top=1")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    server.kill()
+    msg = "The server did not start."
+    raise RuntimeError(msg)
+
+
+def _run_client(args: Tuple[int, float, float, List[str], int]) -> Tuple[int, Counter]:
+    port, duration, write_ratio, isbns, seed = args
+    requests = 0
+    rated: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+        while time.perf_counter() < deadline:
+            isbn = isbns[(seed + requests) % len(isbns)]
+
+            if (seed + requests) % 100 < write_ratio * 100:
+                client.post(f"/books/{isbn}/ratings", json=dict(rating=RATING))
+                rated[isbn] += 1
+            else:
+                client.get("/books/q", params=dict(isbn=isbn))
+
+            requests += 1
+
+    return requests, rated
+
+
+def _count_disagreements(port: int, isbns: List[str], rated: Counter) -> int:
+    expected = {book.isbn: (book.num_ratings or 0) for book in BOOKS}
+    disagreements = 0
+
+    for isbn in isbns:
+        for _ in range(4):
+            response = httpx.get(f"http://127.0.0.1:{port}/books/q?isbn={isbn}")
+            num_ratings = response.json()[0]["num_ratings"] or 0
+            disagreements += num_ratings != expected[isbn] + rated[isbn]
+
+    return disagreements
+
+
+def _bench(workers: int, clients: int, duration: float, write_ratio: float) -> tuple:
+    isbns = [book.isbn for book in BOOKS]
+    port = _free_port()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = _start_server(workers, port, directory)
+
+        try:
+            jobs = [(port, duration, write_ratio, isbns, i) for i in range(clients)]
+
+            with multiprocessing.Pool(clients) as pool:
+                start = time.perf_counter()
+                results = pool.map(_run_client, jobs)
+                elapsed = time.perf_counter() - start
+
+            rated = sum((counts for _, counts in results), Counter())
+            disagreements = _count_disagreements(port, isbns, rated)
+        finally:
+            server.terminate()
+            server.wait()
+
+    requests = sum(count for count, _ in results)
+    return requests / elapsed, disagreements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'requests/s':>11} {'disagreements':>14}")
+
+    for workers in args.workers:
+        throughput, disagreements = _bench(
+            workers, args.clients, args.duration, args.write_ratio
+        )
+        print(f"{workers:>7} {throughput:>11.0f} {disagreements:>14}")
+
+
+if __name__ == "__main__":
+    main()
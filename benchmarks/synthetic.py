@@ -0,0 +1,59 @@
+"""
+Helpers for building synthetic catalogs and summarizing benchmark timings.
+
+Functions:
+    make_book(i: int) -> dict:
+        Builds a deterministic synthetic book for the given row number.
+
+    make_books(count: int) -> list:
+        Builds a list of synthetic books.
+
+    percentile(samples: list, pct: float) -> float:
+        Returns the given percentile of a list of samples.
+"""
+
+from typing import List
+
+AUTHORS = [
+    "Stephen Hawking",
+    "F. Scott Fitzgerald",
+    "George Orwell",
+    "Harper Lee",
+    "J.D. Salinger",
+    "Douglas Adams",
+    "Ursula K. Le Guin",
+    "Toni Morrison",
+]
+
+CATEGORIES = ["Science", "Classic", "Dystopian", "Satire", "Fiction", "Fantasy"]
+
+
+def make_isbn(i: int) -> str:
+    return f"{i:013d}"
+
+
+def make_book(i: int) -> dict:
+    author = f"{AUTHORS[i % len(AUTHORS)]}{i // len(AUTHORS) % 1000}"
+    num_ratings = i * 7 % 21
+    sum_ratings = num_ratings * (1 + i % 5) - (num_ratings // 2 if i % 5 else 0)
+
+    return dict(
+        title=f"Book {i}",
+        author=author,
+        category=CATEGORIES[i % len(CATEGORIES)],
+        isbn=make_isbn(i),
+        avg_rating=sum_ratings / num_ratings if num_ratings else None,
+        num_ratings=num_ratings,
+        sum_ratings=sum_ratings,
+        soft_deleted=False,
+    )
+
+
+def make_books(count: int) -> List[dict]:
+    return [make_book(i) for i in range(count)]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
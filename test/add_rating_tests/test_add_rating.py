@@ -21,8 +21,10 @@ def test_average_and_number_of_ratings_is_correctly_calculated(mocker):
     response = client.post(f"/books/{mock_book["isbn"]}/ratings", json=request)
     assert response.status_code == status.HTTP_200_OK
 
-    assert mock_book["num_ratings"] == 3
-    assert mock_book["avg_rating"] == pytest.approx(3.2, abs=1e-1)
+    response = client.get(f"/books/q?isbn={mock_book["isbn"]}")
+    rated_book = response.json()[0]
+    assert rated_book["num_ratings"] == 3
+    assert rated_book["avg_rating"] == pytest.approx(3.2, abs=1e-1)
 
 
 @pytest.mark.parametrize("rating", [-1, -0.5, 0, 0.5, 5.5, 6])
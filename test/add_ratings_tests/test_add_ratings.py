@@ -0,0 +1,94 @@
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+SECOND_ISBN = "9780451524935"
+
+
+def _setup_books(mocker) -> list:
+    second_book = dict(
+        test_data.MOCK_BOOKS[0], isbn=SECOND_ISBN, title="1984", author="George Orwell"
+    )
+    return test_data.setup_mock_books(mocker, [*test_data.MOCK_BOOKS, second_book])
+
+
+def _get_book(isbn: str) -> dict:
+    return client.get(f"/books/q?isbn={isbn}").json()[0]
+
+
+def test_ratings_are_grouped_by_book(mocker):
+    _setup_books(mocker)
+    ratings = [
+        dict(isbn=test_data.VALID_ISBN, rating=2),
+        dict(isbn=SECOND_ISBN, rating=5),
+        dict(isbn=test_data.VALID_ISBN, rating=3),
+        dict(isbn="9780000000000", rating=4),
+        dict(isbn=test_data.VALID_ISBN, rating=4.5),
+    ]
+
+    response = client.post("/books/ratings", json=dict(ratings=ratings))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == dict(added=4, books=2, missing=["9780000000000"])
+
+    book = _get_book(test_data.VALID_ISBN)
+    assert book["num_ratings"] == 3
+    assert book["sum_ratings"] == 9.5
+    assert book["avg_rating"] == pytest.approx(9.5 / 3)
+
+    assert _get_book(SECOND_ISBN)["avg_rating"] == 5
+
+
+def test_batch_gives_the_same_result_as_single_ratings(mocker):
+    _setup_books(mocker)
+    ratings = [1, 2.5, 5, 3.5]
+
+    for rating in ratings:
+        client.post(f"/books/{test_data.VALID_ISBN}/ratings", json=dict(rating=rating))
+
+    batch = [dict(isbn=SECOND_ISBN, rating=rating) for rating in ratings]
+    client.post("/books/ratings", json=dict(ratings=batch))
+
+    first, second = _get_book(test_data.VALID_ISBN), _get_book(SECOND_ISBN)
+    for field in ("num_ratings", "sum_ratings", "avg_rating"):
+        assert first[field] == second[field]
+
+
+def test_created_books_can_be_rated(mocker):
+    test_data.setup_mock_books(mocker, [])
+    book = dict(
+        title="Dune",
+        author="Frank Herbert",
+        category="Science Fiction",
+        isbn=SECOND_ISBN,
+    )
+    client.post("/books", json=book)
+
+    response = client.post(f"/books/{SECOND_ISBN}/ratings", json=dict(rating=4))
+    assert response.status_code == status.HTTP_200_OK
+
+    ratings = [dict(isbn=SECOND_ISBN, rating=2)]
+    response = client.post("/books/ratings", json=dict(ratings=ratings))
+    assert response.status_code == status.HTTP_200_OK
+
+    rated_book = _get_book(SECOND_ISBN)
+    assert rated_book["num_ratings"] == 2
+    assert rated_book["avg_rating"] == 3
+
+
+@pytest.mark.parametrize(
+    "ratings",
+    [
+        [],
+        [dict(isbn=test_data.VALID_ISBN, rating=6)],
+        [dict(isbn=test_data.INVALID_ISBNS[0], rating=3)],
+        [dict(isbn=test_data.VALID_ISBN)],
+    ],
+)
+def test_add_ratings_fails_for_invalid_ratings(mocker, ratings):
+    _setup_books(mocker)
+
+    response = client.post("/books/ratings", json=dict(ratings=ratings))
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert _get_book(test_data.VALID_ISBN)["num_ratings"] == 0
@@ -0,0 +1,135 @@
+import random
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+from api.autocomplete import MAX_SUGGESTIONS, SUGGESTION_FIELDS, SuggestionIndex
+from api.book import Book
+
+MOCK_BOOKS = [
+    dict(
+        isbn=isbn,
+        title=title,
+        author=author,
+        category=category,
+        avg_rating=3.0 if num_ratings else None,
+        num_ratings=num_ratings,
+        sum_ratings=3 * num_ratings,
+        soft_deleted=False,
+    )
+    for isbn, title, author, category, num_ratings in [
+        ("1111111111111", "Go Set a Watchman", "Harper Lee", "Classic", 2),
+        ("2222222222222", "To Kill a Mockingbird", "Harper Lee", "Classic", 5),
+        ("3333333333333", "Harry Potter", "J.K. Rowling", "Fantasy", 4),
+        ("4444444444444", "Hard Times", "Charles Dickens", "Classic", 0),
+    ]
+]
+
+
+def _suggest(query_string: str) -> list:
+    response = client.get(f"/books/autocomplete?{query_string}")
+    assert response.status_code == status.HTTP_200_OK
+    return [(s["field"], s["value"], s["num_ratings"]) for s in response.json()]
+
+
+def test_suggestions_are_ranked_by_number_of_ratings(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _suggest("prefix=HAR") == [
+        ("author", "Harper Lee", 7),
+        ("title", "Harry Potter", 4),
+        ("title", "Hard Times", 0),
+    ]
+    assert _suggest("prefix=har&k=1") == [("author", "Harper Lee", 7)]
+    assert _suggest("prefix=cl") == [("category", "Classic", 7)]
+    assert _suggest("prefix=xyz") == []
+
+
+@pytest.mark.parametrize("query_string", ["prefix=", "prefix=a&k=0", "k=3"])
+def test_autocomplete_fails_when_parameters_invalid(query_string: str):
+    response = client.get(f"/books/autocomplete?{query_string}")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_autocomplete_fails_when_k_above_maximum():
+    response = client.get(f"/books/autocomplete?prefix=a&k={MAX_SUGGESTIONS + 1}")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_suggestions_follow_writes(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    test_data.setup_mock_reviews(mocker, [])
+
+    request = dict(
+        title="Harvest", author="Jim Crace", category="Fiction", isbn="5555555555555"
+    )
+    assert client.post("/books", json=request).status_code == status.HTTP_201_CREATED
+
+    for _ in range(5):
+        client.post("/books/5555555555555/ratings", json=dict(rating=4))
+
+    client.delete("/books/2222222222222")
+
+    assert _suggest("prefix=har") == [
+        ("title", "Harvest", 5),
+        ("title", "Harry Potter", 4),
+        ("author", "Harper Lee", 2),
+        ("title", "Hard Times", 0),
+    ]
+    assert _suggest("prefix=to") == []
+
+
+def _expected(books: dict, prefix: str, k: int) -> list:
+    weights = {}
+
+    for book in books.values():
+        if not book.soft_deleted:
+            for field in SUGGESTION_FIELDS:
+                entry = (getattr(book, field).casefold(), field)
+                weights[entry] = weights.get(entry, 0) + book.num_ratings
+
+    matches = [entry for entry in weights if entry[0].startswith(prefix)]
+    matches.sort(key=lambda entry: (-weights[entry], entry))
+    return [(field, value, weights[value, field]) for value, field in matches[:k]]
+
+
+def test_cached_prefixes_match_a_recomputation(mocker):
+    # Tiny limits make most prefixes cached and merge new suggestions often.
+    mocker.patch("api.autocomplete.SCAN_LIMIT", 3)
+    mocker.patch("api.autocomplete._MIN_MERGE", 4)
+    rng = random.Random(0)
+    index = SuggestionIndex()
+    books = {}
+    prefixes = ["", "a", "ab", "b", "ba", "c", "abc", "bb"]
+
+    for i in range(2000):
+        operation = rng.random()
+        isbn = str(rng.randrange(200))
+        book = books.get(isbn)
+
+        if book is None:
+            book = Book(
+                title="".join(rng.choices("abc", k=rng.randint(1, 4))),
+                author="".join(rng.choices("AB", k=rng.randint(1, 3))),
+                category=rng.choice(["Classic", "Fiction"]),
+                isbn=isbn,
+            )
+            book.num_ratings = rng.randrange(3)
+            books[isbn] = book
+            index.add(book)
+        elif operation < 0.6 and not book.soft_deleted:
+            index.add_ratings(book, 1)
+            book.num_ratings += 1
+        elif not book.soft_deleted:
+            index.remove(book)
+            book.soft_deleted = True
+
+        if i % 50 == 0:
+            for prefix in prefixes:
+                suggestions = [
+                    (s["field"], s["value"].casefold(), s["num_ratings"])
+                    for s in index.suggest(prefix, 5)
+                ]
+                assert suggestions == _expected(books, prefix, 5)
@@ -0,0 +1,130 @@
+import random
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.columnar import ColumnarBookCatalog
+
+MOCK_BOOKS = [
+    dict(
+        isbn=isbn,
+        title=title,
+        author=author,
+        category="Classic",
+        avg_rating=4.0 if num_ratings else None,
+        num_ratings=num_ratings,
+        sum_ratings=4 * num_ratings,
+        soft_deleted=soft_deleted,
+    )
+    for isbn, title, author, num_ratings, soft_deleted in [
+        ("1111111111111", "Emma", "Jane Austen", 2, False),
+        ("2222222222222", "Persuasion", "Jane Austen", 1, True),
+        ("3333333333333", "Hard Times", "Charles Dickens", 0, False),
+        ("4444444444444", "Bleak House", "Charles Dickens", 3, True),
+    ]
+]
+
+
+def _query_isbns(query_string: str) -> list:
+    response = client.get(f"/books/q?{query_string}")
+    assert response.status_code == status.HTTP_200_OK
+    return [book["isbn"] for book in response.json()]
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    ["", "author=Jane Austen", "isbn=2222222222222", "q=house", "min_rating=1"],
+)
+def test_query_skips_deleted_books_before_and_after_compaction(
+    mocker, query_string: str
+):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    before = _query_isbns(query_string)
+    deleted_before = _query_isbns(f"{query_string}&return_deleted_books=true")
+
+    assert bs.BOOKS.compact(0) == 2
+    assert _query_isbns(query_string) == before
+    assert _query_isbns(f"{query_string}&return_deleted_books=true") == deleted_before
+    assert not {"2222222222222", "4444444444444"} & set(before)
+
+
+def test_compaction_keeps_only_old_tombstones(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    test_data.setup_mock_reviews(mocker, [])
+    client.delete("/books/1111111111111")
+
+    assert bs.BOOKS.compact(3600) == 0
+    assert bs.BOOKS.compact(0) == 3
+    assert {book.isbn for book in bs.BOOKS.iter_deleted()} == {
+        "1111111111111",
+        "2222222222222",
+        "4444444444444",
+    }
+    assert len(bs.BOOKS) == len(MOCK_BOOKS)
+
+
+def test_rating_a_compacted_book_restores_it(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    test_data.setup_mock_reviews(mocker, [])
+    bs.BOOKS.compact(0)
+
+    response = client.post("/books/4444444444444/ratings", json=dict(rating=2))
+    assert response.status_code == status.HTTP_200_OK
+
+    book = bs.BOOKS.get("4444444444444")
+    assert (book.num_ratings, book.sum_ratings, book.soft_deleted) == (4, 14, True)
+    assert _query_isbns("author=Charles Dickens") == ["3333333333333"]
+
+
+def test_compacted_books_are_removed_and_added_again(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    bs.BOOKS.compact(0)
+
+    assert bs.BOOKS.remove("2222222222222").title == "Persuasion"
+    assert "2222222222222" not in bs.BOOKS
+
+    bs.BOOKS.add(Book.from_dict({**MOCK_BOOKS[1], "soft_deleted": False}))
+    assert _query_isbns("author=Jane Austen") == ["1111111111111", "2222222222222"]
+
+
+def test_catalogs_agree_after_random_writes_and_compactions():
+    pytest.importorskip("numpy")
+    rng = random.Random(0)
+    catalogs = [BookCatalog(), ColumnarBookCatalog()]
+
+    for _ in range(500):
+        isbn = str(rng.randrange(100))
+        operation = rng.random()
+        author = rng.choice(["Jane Austen", "Charles Dickens"])
+
+        for catalog in catalogs:
+            if isbn not in catalog:
+                catalog.add(
+                    Book(title="Emma", author=author, category="Classic", isbn=isbn)
+                )
+            elif operation < 0.5:
+                book = catalog.get(isbn)
+                catalog.set_ratings(isbn, book.num_ratings + 1, book.sum_ratings + 3)
+            elif operation < 0.8:
+                catalog.mark_deleted(isbn)
+            elif operation < 0.9:
+                catalog.remove(isbn)
+            else:
+                catalog.compact(0)
+
+    rows, columns = (
+        [book.to_dict() for book in catalog.iter_ordered(deleted=True)]
+        for catalog in catalogs
+    )
+    assert rows == columns
+    stats = catalogs[1].stats("author")
+    assert {group.value: group.books for group in stats if group.books} == {
+        author: len(catalogs[0].lookup("author", author))
+        for author in ("Jane Austen", "Charles Dickens")
+        if catalogs[0].lookup("author", author)
+    }
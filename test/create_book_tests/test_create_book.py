@@ -5,6 +5,8 @@ import pytest
 import test_data
 from starlette import status
 
+from api.book import Book, get_author_last_name
+
 
 def test_create_book_is_successful(mocker):
     request = dict(
@@ -23,7 +25,8 @@ def test_create_book_is_successful(mocker):
     assert created_book["isbn"] == request["isbn"]
     assert created_book["category"] == request["category"]
     assert created_book["avg_rating"] is None
-    assert created_book["num_ratings"] is None
+    assert created_book["num_ratings"] == 0
+    assert created_book["sum_ratings"] == 0
     assert created_book["soft_deleted"] is False
     assert f"books/q?isbn={created_book["isbn"]}" in created_book["links"]["self"]
 
@@ -66,3 +69,38 @@ def test_create_book_fails_wth_invalid_isbn(isbn):
 
     response = client.post("/books", json=json.dumps(request))
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_create_book_fails_when_isbn_already_exists(mocker):
+    mock_books = test_data.setup_mock_books(mocker)
+    request = dict(
+        title="The Stand",
+        author="Stephen King",
+        isbn=mock_books[0]["isbn"],
+        category="Horror",
+    )
+
+    response = client.post("/books", json=request)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+@pytest.mark.parametrize("author", ["", " ", "\t\n"])
+def test_create_book_fails_when_author_blank(mocker, author: str):
+    test_data.setup_mock_books(mocker, [])
+    request = dict(
+        title="The Stand", author=author, isbn=test_data.VALID_ISBN, category="Horror"
+    )
+
+    response = client.post("/books", json=request)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize(
+    ("author", "last_name"), [("", ""), ("  ", ""), (" Lee ", "Lee")]
+)
+def test_author_last_name_of_blank_author_is_empty(author: str, last_name: str):
+    assert get_author_last_name(author) == last_name
+    assert Book("The Stand", author, "Horror", test_data.VALID_ISBN).sort_key == (
+        last_name,
+        test_data.VALID_ISBN,
+    )
@@ -20,3 +20,24 @@ def test_create_reviews_fails_when_isbn_invalid(isbn):
     request = dict(review="Yay!")
     response = client.post(f"/books/{isbn}/reviews", json=request)
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_first_review_of_a_book_is_stored(mocker):
+    test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    request = dict(review="The first review.")
+    response = client.post(f"/books/{test_data.VALID_ISBN}/reviews", json=request)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get(f"/books/{test_data.VALID_ISBN}/reviews")
+    assert response.json() == [
+        dict(isbn=test_data.VALID_ISBN, reviews=["The first review."])
+    ]
+
+
+def test_review_is_not_stored_when_book_does_not_exist(mocker):
+    test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    response = client.post("/books/0000000000000/reviews", json=dict(review="Hmm."))
+    assert response.status_code == status.HTTP_200_OK
+    assert client.get("/books/0000000000000/reviews").json() == []
@@ -32,11 +32,14 @@ def test_delete_book_when_successful_sets_soft_deleted_to_true(mocker):
     test_data.setup_mock_books(mocker, books)
     response = client.delete(f"/books/{test_data.VALID_ISBN}")
     assert response.status_code == status.HTTP_200_OK
-    assert books[0]["soft_deleted"]
+
+    response = client.get(
+        f"/books/q?isbn={test_data.VALID_ISBN}&return_deleted_books=true"
+    )
+    assert response.json()[0]["soft_deleted"]
 
 
 def test_delete_book_succeeds_even_when_book_does_not_exist(mocker):
-    mock_books = test_data.setup_mock_books(mocker)
-    mocker.patch("api.book_service.BOOKS", mock_books)
+    test_data.setup_mock_books(mocker)
     response = client.delete("/books/0000000000000")
     assert response.status_code == status.HTTP_200_OK
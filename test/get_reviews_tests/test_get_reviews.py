@@ -31,3 +31,42 @@ def test_get_reviews_when_book_does_not_exist_returns_empty_list(mocker):
 def test_get_reviews_fails_when_isbn_invalid(isbn):
     response = client.get(f"/books/{isbn}/reviews")
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_get_reviews_returns_not_modified_until_a_review_is_added(mocker):
+    test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [dict(isbn=test_data.VALID_ISBN, reviews=[])])
+    url = f"/books/{test_data.VALID_ISBN}/reviews"
+
+    etag = client.get(url).headers["etag"]
+    response = client.get(url, headers={"if-none-match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.post(url, json=dict(review="Loved it."))
+    response = client.get(url, headers={"if-none-match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["reviews"] == ["Loved it."]
+    assert response.headers["etag"] != etag
+
+
+def test_next_links_page_through_all_reviews(mocker):
+    reviews = [f"Review {i}" for i in range(5)]
+    test_data.setup_mock_reviews(
+        mocker, [dict(isbn=test_data.VALID_ISBN, reviews=reviews)]
+    )
+
+    pages = []
+    response = client.get(f"/books/{test_data.VALID_ISBN}/reviews?limit=2")
+
+    while "next" in response.links:
+        pages.append(response.json()[0]["reviews"])
+        response = client.get(response.links["next"]["url"])
+
+    pages.append(response.json()[0]["reviews"])
+    assert pages == [reviews[0:2], reviews[2:4], reviews[4:]]
+
+
+@pytest.mark.parametrize("query_string", ["offset=-1", "limit=0"])
+def test_get_reviews_fails_when_page_invalid(query_string: str):
+    response = client.get(f"/books/{test_data.VALID_ISBN}/reviews?{query_string}")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
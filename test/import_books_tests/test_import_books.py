@@ -0,0 +1,247 @@
+import json
+from test import client
+
+import test_data
+from starlette import status
+
+import api.book_service as bs
+from api.book import Book
+from api.wal import WriteAheadLog
+
+NDJSON_HEADERS = {"content-type": "application/x-ndjson"}
+CSV_HEADERS = {"content-type": "text/csv"}
+
+
+def _make_book(i: int) -> dict:
+    return dict(
+        title=f"Book {i}",
+        author=f"Author {i}",
+        category="Fiction",
+        isbn=f"{9780000000000 + i}",
+    )
+
+
+def _to_ndjson(books: list) -> str:
+    return "\n".join(json.dumps(book) for book in books) + "\n"
+
+
+def test_import_books_from_ndjson_is_successful(mocker):
+    test_data.setup_mock_books(mocker)
+    books = [_make_book(i) for i in range(3)]
+
+    response = client.post(
+        "/books/import", content=_to_ndjson(books), headers=NDJSON_HEADERS
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == dict(imported=3, failed=0, errors=[])
+
+    imported = client.get("/books/q?category=fiction").json()
+    assert [book["isbn"] for book in imported] == [book["isbn"] for book in books]
+    assert all(book["num_ratings"] == 0 for book in imported)
+
+
+def test_import_books_from_csv_is_successful(mocker):
+    test_data.setup_mock_books(mocker)
+    body = (
+        "isbn,title,author,category\r\n"
+        '9780000000001,"Title, with a comma",Author One,Fiction\r\n'
+        "9780000000002,Second Title,Author Two,Fiction\r\n"
+    )
+
+    response = client.post("/books/import", content=body, headers=CSV_HEADERS)
+    assert response.json() == dict(imported=2, failed=0, errors=[])
+
+    book = client.get("/books/q?isbn=9780000000001").json()[0]
+    assert book["title"] == "Title, with a comma"
+    assert book["author"] == "Author One"
+
+
+def test_import_books_reports_rows_that_fail(mocker):
+    test_data.setup_mock_books(mocker)
+    mocker.patch("api.book_service.IMPORT_BATCH_SIZE", 2)
+    lines = [
+        json.dumps(_make_book(1)),
+        json.dumps(dict(_make_book(2), isbn="123")),
+        "{not json",
+        "",
+        json.dumps(dict(_make_book(3), title=None)),
+        json.dumps(_make_book(1)),
+        json.dumps(dict(_make_book(4), isbn=test_data.VALID_ISBN)),
+        json.dumps(_make_book(5)),
+    ]
+
+    response = client.post(
+        "/books/import", content="\n".join(lines), headers=NDJSON_HEADERS
+    )
+    report = response.json()
+
+    assert report["imported"] == 2
+    assert report["failed"] == 5
+    assert [error["line"] for error in report["errors"]] == [2, 3, 5, 6, 7]
+    assert report["errors"][0]["detail"].startswith("isbn: ")
+    assert report["errors"][2]["detail"].startswith("title: ")
+    assert "already exists" in report["errors"][3]["detail"]
+    assert "already exists" in report["errors"][4]["detail"]
+
+    isbns = [book["isbn"] for book in client.get("/books/q?category=fiction").json()]
+    assert isbns == [_make_book(1)["isbn"], _make_book(5)["isbn"]]
+
+
+def test_import_books_reports_csv_rows_with_missing_values(mocker):
+    test_data.setup_mock_books(mocker)
+    body = "title,author,category,isbn\nTitle,Author,Fiction\n"
+
+    response = client.post("/books/import", content=body, headers=CSV_HEADERS)
+    assert response.json() == dict(
+        imported=0,
+        failed=1,
+        errors=[dict(line=2, detail="Expected 4 values but found 3.")],
+    )
+
+
+def test_import_books_fails_for_csv_without_header(mocker):
+    test_data.setup_mock_books(mocker)
+
+    response = client.post("/books/import", content="", headers=CSV_HEADERS)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_import_books_fails_for_unsupported_media_type(mocker):
+    test_data.setup_mock_books(mocker)
+
+    response = client.post(
+        "/books/import", content="<books/>", headers={"content-type": "text/xml"}
+    )
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+def test_imported_books_are_replayed_from_the_log(mocker, tmp_path):
+    mock_books = test_data.setup_mock_books(mocker)
+    wal = WriteAheadLog(str(tmp_path / "books.wal"))
+    mocker.patch("api.book_service.WAL", wal)
+    books = [_make_book(i) for i in range(3)]
+
+    client.post("/books/import", content=_to_ndjson(books), headers=NDJSON_HEADERS)
+    imported = client.get("/books/q").json()
+
+    test_data.setup_mock_books(mocker, mock_books)
+    assert bs.replay_log() == 1
+    assert client.get("/books/q").json() == imported
+    wal.close()
+
+
+def test_rows_that_do_not_build_a_book_are_reported_and_not_logged(mocker, tmp_path):
+    test_data.setup_mock_books(mocker)
+    wal = WriteAheadLog(str(tmp_path / "books.wal"))
+    mocker.patch("api.book_service.WAL", wal)
+    real_from_dict = Book.from_dict
+
+    def from_dict(data: dict) -> Book:
+        if data["title"] == "Book 2":
+            msg = "cannot build"
+            raise IndexError(msg)
+        return real_from_dict(data)
+
+    mocker.patch.object(Book, "from_dict", from_dict)
+    books = [_make_book(i) for i in range(4)]
+
+    response = client.post(
+        "/books/import", content=_to_ndjson(books), headers=NDJSON_HEADERS
+    )
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (3, 1)
+    assert report["errors"][0]["line"] == 3
+
+    mocker.patch.object(Book, "from_dict", real_from_dict)
+    test_data.setup_mock_books(mocker)
+    assert bs.replay_log() == 1
+    titles = [book["title"] for book in client.get("/books/q?category=Fiction").json()]
+    assert titles == ["Book 0", "Book 1", "Book 3"]
+    wal.close()
+
+
+def test_malformed_ndjson_lines_are_reported_one_by_one(mocker):
+    test_data.setup_mock_books(mocker)
+    # Joined by a comma, the halves of this book would make one valid object.
+    head, tail = json.dumps(_make_book(1)).split(', "category"')
+    lines = [
+        head,
+        '"category"' + tail,
+        f"{json.dumps(_make_book(1))},{json.dumps(_make_book(2))}",
+        json.dumps(_make_book(3)),
+    ]
+
+    response = client.post(
+        "/books/import", content="\n".join(lines), headers=NDJSON_HEADERS
+    )
+    report = response.json()
+
+    assert (report["imported"], report["failed"]) == (1, 3)
+    assert [error["line"] for error in report["errors"]] == [1, 2, 3]
+    assert all(
+        error["detail"].startswith("Invalid JSON: ") for error in report["errors"]
+    )
+
+
+def test_csv_values_may_span_lines_and_batches(mocker):
+    test_data.setup_mock_books(mocker)
+    mocker.patch("api.book_service.IMPORT_BATCH_SIZE", 2)
+    body = (
+        "title,author,category,isbn\n"
+        f'"Book\n\none",Author,Fiction,{_make_book(1)["isbn"]}\n'
+        f'Book two,"Author",Fiction\n'
+        f"Book three,Author,Fiction,{_make_book(3)['isbn']}\n"
+        f'"Book\nfour,Author,Fiction,{_make_book(4)["isbn"]}\n'
+    )
+
+    response = client.post("/books/import", content=body, headers=CSV_HEADERS)
+    report = response.json()
+
+    assert (report["imported"], report["failed"]) == (3, 2)
+    assert report["errors"][0] == dict(line=5, detail="Expected 4 values but found 3.")
+    assert report["errors"][1]["line"] == 7
+    assert report["errors"][1]["detail"].startswith("Invalid CSV: ")
+
+    titles = [book["title"] for book in client.get("/books/q?category=fiction").json()]
+    assert titles == ["Book\n\none", "Book three", "four"]
+
+
+def test_csv_lines_that_are_not_utf8_are_reported(mocker):
+    test_data.setup_mock_books(mocker)
+    body = (
+        b"title,author,category,isbn\n"
+        + f"Caf\xe9,Author,Fiction,{_make_book(1)['isbn']}\n".encode("latin-1")
+        + f"Caf\xe9,Author,Fiction,{_make_book(2)['isbn']}\n".encode()
+    )
+
+    response = client.post("/books/import", content=body, headers=CSV_HEADERS)
+    report = response.json()
+
+    assert (report["imported"], report["failed"]) == (1, 1)
+    assert report["errors"][0]["line"] == 2
+    assert report["errors"][0]["detail"].startswith("Invalid UTF-8: ")
+
+
+def test_csv_body_may_start_with_a_byte_order_mark(mocker):
+    test_data.setup_mock_books(mocker)
+    body = f"title,author,category,isbn\nTitle,Author,Fiction,{_make_book(1)['isbn']}\n"
+
+    response = client.post(
+        "/books/import", content=body.encode("utf-8-sig"), headers=CSV_HEADERS
+    )
+    assert response.json() == dict(imported=1, failed=0, errors=[])
+
+
+def test_csv_rows_after_a_stray_quote_are_still_read(mocker):
+    test_data.setup_mock_books(mocker)
+    mocker.patch("api.book_service.IMPORT_BATCH_SIZE", 2)
+    rows = [f"Book {i},Author,Fiction,{_make_book(i)['isbn']}" for i in range(6)]
+    rows[1] = '"' + rows[1]
+    body = "title,author,category,isbn\n" + "\n".join(rows) + "\n"
+
+    response = client.post("/books/import", content=body, headers=CSV_HEADERS)
+    report = response.json()
+
+    assert (report["imported"], report["failed"]) == (5, 1)
+    assert report["errors"][0]["line"] == 3
+    assert report["errors"][0]["detail"].startswith("Invalid CSV: ")
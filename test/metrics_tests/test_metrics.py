@@ -0,0 +1,101 @@
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+from api.metrics import METRICS, Histogram, Metrics
+
+
+@pytest.fixture()
+def metrics(mocker):
+    METRICS.reset()
+    mocker.patch.object(METRICS, "enabled", True)
+    mocker.patch.object(METRICS, "sample_rate", 1.0)
+    yield METRICS
+    METRICS.reset()
+
+
+def _get_samples() -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+
+    return dict(
+        line.rsplit(" ", 1)
+        for line in response.text.splitlines()
+        if not line.startswith("#")
+    )
+
+
+def test_requests_and_stages_are_recorded(mocker, metrics):
+    rated_book = dict(
+        test_data.MOCK_BOOKS[0], avg_rating=4, num_ratings=1, sum_ratings=4
+    )
+    second_book = dict(rated_book, isbn="9780062409850", author="Harper Lee")
+    test_data.setup_mock_books(mocker, [rated_book, second_book])
+    isbn = test_data.VALID_ISBN
+
+    client.get("/books/q?min_rating=1&author=Harper Lee")
+    client.get(f"/books/q?isbn={isbn}")
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=4))
+    samples = _get_samples()
+
+    request = 'books_http_request_duration_seconds_count{method="GET",route="/books/q"'
+    assert samples[request + ',status="200"}'] == "2"
+    rating = '{method="POST",route="/books/{isbn}/ratings",status="200"}'
+    assert samples["books_http_request_duration_seconds_count" + rating] == "1"
+    inf = 'books_http_request_duration_seconds_bucket{method="GET",route="/books/q"'
+    assert samples[inf + ',status="200",le="+Inf"}'] == "2"
+
+    for operation, stage, count in [
+        ("query_book", "select", "2"),
+        ("query_book", "sort", "2"),
+        ("query_book", "encode", "2"),
+        ("add_rating", "apply", "1"),
+    ]:
+        labels = f'{{operation="{operation}",stage="{stage}"}}'
+        assert samples["books_stage_duration_seconds_count" + labels] == count
+
+
+def test_nothing_is_recorded_when_disabled(mocker, metrics):
+    test_data.setup_mock_books(mocker)
+    mocker.patch.object(METRICS, "enabled", False)
+
+    client.get("/books/q")
+    samples = _get_samples()
+
+    assert samples == {"books_metrics_sample_rate": "0"}
+
+
+def test_sampling_skips_unsampled_requests(mocker, metrics):
+    test_data.setup_mock_books(mocker)
+    mocker.patch.object(METRICS, "sample_rate", 0.5)
+    # The first request is timed but its query is not, and the second request is
+    # neither timed nor queried, as its result is cached.
+    mocker.patch("api.metrics.random.random", side_effect=[0.2, 0.7, 0.9, 0.9])
+
+    client.get("/books/q")
+    client.get("/books/q")
+    samples = _get_samples()
+
+    request = 'books_http_request_duration_seconds_count{method="GET",route="/books/q"'
+    assert samples[request + ',status="200"}'] == "1"
+    assert not any(name.startswith("books_stage") for name in samples)
+    assert samples["books_metrics_sample_rate"] == "0.5"
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_sample_rate_must_be_a_fraction():
+    with pytest.raises(ValueError, match="sample rate"):
+        Metrics(enabled=True, sample_rate=2)
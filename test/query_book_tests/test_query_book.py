@@ -1,10 +1,31 @@
+import asyncio
+import json
+import random
 from itertools import product
 from test import client
 
 import pytest
 import test_data
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from starlette import status
 
+import api.book_service as bs
+from api.catalog import BookCatalog
+from api.columnar import ColumnarBookCatalog
+from api.models import BookQueryParameters
+
+UNICODE_BOOK = dict(
+    title="Cien años de soledad",
+    author="Gabriel García Márquez",
+    category="Fiction",
+    isbn="9780060883287",
+    avg_rating=4.5,
+    num_ratings=2,
+    sum_ratings=9,
+    soft_deleted=False,
+)
+
 
 def _get_query_string(query_parameters: dict) -> str:
     query_string = ""
@@ -162,3 +183,380 @@ def test_return_bad_request_when_max_rating_is_less_than_or_equal_to_min_rating(
 
     response = client.get(f"/books/q?{query_string}")
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_query_by_author_and_category_returns_only_books_matching_both(mocker):
+    mock_books = [
+        dict(
+            isbn=isbn,
+            title=title,
+            author=author,
+            category=category,
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        )
+        for isbn, title, author, category in [
+            ("1111111111111", "1984", "George Orwell", "Dystopian"),
+            ("2222222222222", "Animal Farm", "George Orwell", "Satire"),
+            ("3333333333333", "Brave New World", "Aldous Huxley", "Dystopian"),
+        ]
+    ]
+
+    test_data.setup_mock_books(mocker, mock_books)
+
+    response = client.get("/books/q?author=GEORGE ORWELL&category=dystopian")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [mock_books[0]]
+
+
+def test_query_by_rating_range_reflects_ratings_added_after_startup(mocker):
+    mock_books = [
+        dict(
+            isbn=isbn,
+            title="A Brief History of Time",
+            author="Stephen Hawking",
+            category="Science",
+            avg_rating=avg_rating,
+            num_ratings=1,
+            sum_ratings=avg_rating,
+            soft_deleted=False,
+        )
+        for isbn, avg_rating in [("1111111111111", 2.0), ("2222222222222", 4.0)]
+    ]
+
+    test_data.setup_mock_books(mocker, mock_books)
+
+    response = client.get("/books/q?min_rating=3.5")
+    assert [b["isbn"] for b in response.json()] == ["2222222222222"]
+
+    client.post("/books/1111111111111/ratings", json=dict(rating=5))
+
+    response = client.get("/books/q?min_rating=3.5&max_rating=4.0")
+    assert [b["isbn"] for b in response.json()] == ["1111111111111", "2222222222222"]
+
+    response = client.get("/books/q?max_rating=3.0")
+    assert response.json() == []
+
+
+@pytest.mark.parametrize("query_string", ["top=2", "category=Classic&top=2"])
+def test_top_returns_first_books_ordered_by_author_last_name(mocker, query_string: str):
+    mock_books = [
+        dict(
+            isbn=isbn,
+            title=title,
+            author=author,
+            category="Classic",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        )
+        for isbn, title, author in [
+            ("1111111111111", "The Great Gatsby", "F. Scott Fitzgerald"),
+            ("2222222222222", "To Kill a Mockingbird", "Harper Lee"),
+            ("3333333333333", "Emma", "Jane Austen"),
+            ("4444444444444", "Go Set a Watchman", "Harper Lee"),
+        ]
+    ]
+
+    test_data.setup_mock_books(mocker, mock_books)
+
+    response = client.get(f"/books/q?{query_string}")
+    assert response.status_code == status.HTTP_200_OK
+    assert [b["isbn"] for b in response.json()] == ["3333333333333", "1111111111111"]
+
+
+@pytest.mark.parametrize("query_string", ["top=2", "category=Classic&top=2"])
+def test_next_links_page_through_all_books(mocker, query_string: str):
+    mock_books = [
+        dict(
+            isbn=isbn,
+            title=title,
+            author=author,
+            category="Classic",
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        )
+        for isbn, title, author in [
+            ("1111111111111", "The Great Gatsby", "F. Scott Fitzgerald"),
+            ("2222222222222", "To Kill a Mockingbird", "Harper Lee"),
+            ("3333333333333", "Emma", "Jane Austen"),
+            ("4444444444444", "Go Set a Watchman", "Harper Lee"),
+            ("5555555555555", "1984", "George Orwell"),
+        ]
+    ]
+
+    test_data.setup_mock_books(mocker, mock_books)
+
+    pages = []
+    response = client.get(f"/books/q?{query_string}")
+
+    while "next" in response.links:
+        pages.append([b["isbn"] for b in response.json()])
+        response = client.get(response.links["next"]["url"])
+        assert response.status_code == status.HTTP_200_OK
+
+    pages.append([b["isbn"] for b in response.json()])
+
+    assert pages == [
+        ["3333333333333", "1111111111111"],
+        ["2222222222222", "4444444444444"],
+        ["5555555555555"],
+    ]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WzFd"])
+def test_query_fails_when_cursor_invalid(cursor: str):
+    response = client.get(f"/books/q?cursor={cursor}")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("query_string", ["", "category=Classic", "top=2"])
+def test_ndjson_stream_returns_same_books_as_json_query(mocker, query_string: str):
+    mock_books = [
+        dict(
+            isbn=isbn,
+            title=title,
+            author=author,
+            category=category,
+            avg_rating=None,
+            num_ratings=0,
+            sum_ratings=0,
+            soft_deleted=False,
+        )
+        for isbn, title, author, category in [
+            ("1111111111111", "The Great Gatsby", "F. Scott Fitzgerald", "Classic"),
+            ("2222222222222", "1984", "George Orwell", "Dystopian"),
+            ("3333333333333", "Emma", "Jane Austen", "Classic"),
+        ]
+    ]
+
+    test_data.setup_mock_books(mocker, mock_books)
+
+    response = client.get(
+        f"/books/q?{query_string}", headers=dict(accept="application/x-ndjson")
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    streamed_books = [json.loads(line) for line in response.text.splitlines()]
+    assert streamed_books == client.get(f"/books/q?{query_string}").json()
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    [
+        "category=classic",
+        "author=Harper Lee&min_rating=3",
+        "min_rating=2.5&max_rating=4.5",
+        "max_rating=3&return_deleted_books=true",
+        "isbn=2222222222222",
+        "author=Nobody",
+    ],
+)
+def test_columnar_catalog_returns_same_books_as_row_catalog(mocker, query_string: str):
+    pytest.importorskip("numpy")
+
+    mock_books = [
+        dict(
+            isbn=isbn,
+            title=title,
+            author=author,
+            category="Classic",
+            avg_rating=avg_rating,
+            num_ratings=1 if avg_rating else 0,
+            sum_ratings=avg_rating or 0,
+            soft_deleted=soft_deleted,
+        )
+        for isbn, title, author, avg_rating, soft_deleted in [
+            ("1111111111111", "The Great Gatsby", "F. Scott Fitzgerald", 4.0, False),
+            ("2222222222222", "To Kill a Mockingbird", "Harper Lee", 5.0, False),
+            ("3333333333333", "Emma", "Jane Austen", None, False),
+            ("4444444444444", "Go Set a Watchman", "Harper Lee", 3.0, False),
+            ("5555555555555", "Sanditon", "Jane Austen", 2.0, True),
+        ]
+    ]
+
+    results = []
+
+    for catalog_class in (BookCatalog, ColumnarBookCatalog):
+        test_data.setup_mock_books(mocker, mock_books, catalog_class)
+        client.post("/books/4444444444444/ratings", json=dict(rating=4))
+        client.post("/books/1111111111111/ratings", json=dict(rating=2))
+        client.delete("/books/2222222222222")
+        results.append(client.get(f"/books/q?{query_string}").json())
+
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("accept", ["application/json", "application/x-ndjson"])
+def test_query_returns_not_modified_until_catalog_changes(mocker, accept: str):
+    mock_books = test_data.setup_mock_books(mocker)
+    headers = dict(accept=accept)
+
+    response = client.get("/books/q", headers=headers)
+    etag = response.headers["etag"]
+
+    headers["if-none-match"] = etag
+    response = client.get("/books/q", headers=headers)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    client.post(f"/books/{mock_books[0]["isbn"]}/ratings", json=dict(rating=4))
+    response = client.get("/books/q", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize(
+    ("accept", "media_type"),
+    [
+        ("application/x-ndjson", "application/x-ndjson"),
+        ("application/json, application/x-ndjson", "application/x-ndjson"),
+        ("Application/X-NDJSON; q=0.5, */*; q=0.1", "application/x-ndjson"),
+        ("application/x-ndjson;q=0", "application/json"),
+        ("application/x-ndjson;q=0.5, application/json", "application/json"),
+        ("application/x-ndjson-seq", "application/json"),
+        ("*/*", "application/json"),
+        ("", "application/json"),
+    ],
+)
+def test_query_negotiates_ndjson_and_varies_on_accept(
+    mocker, accept: str, media_type: str
+):
+    test_data.setup_mock_books(mocker)
+    headers = dict(accept=accept)
+
+    response = client.get("/books/q", headers=headers)
+    assert response.headers["content-type"].startswith(media_type)
+    assert response.headers["vary"] == "Accept"
+
+    headers["if-none-match"] = response.headers["etag"]
+    response = client.get("/books/q", headers=headers)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["vary"] == "Accept"
+
+
+def test_json_body_matches_the_generic_encoding(mocker):
+    test_data.setup_mock_books(mocker, [*test_data.MOCK_BOOKS, UNICODE_BOOK])
+
+    response = client.get("/books/q")
+    assert response.headers["content-type"] == "application/json"
+
+    books = asyncio.run(bs.query_book(BookQueryParameters()))
+    assert response.content == JSONResponse(jsonable_encoder(books)).body
+
+
+@pytest.mark.parametrize("accept", ["application/json", "application/x-ndjson"])
+def test_served_books_reflect_later_ratings_and_deletions(mocker, accept: str):
+    test_data.setup_mock_books(mocker)
+    isbn = test_data.VALID_ISBN
+    url = f"/books/q?isbn={isbn}&return_deleted_books=true"
+    headers = dict(accept=accept)
+
+    client.get(url, headers=headers)
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=4))
+    client.delete(f"/books/{isbn}")
+
+    response = client.get(url, headers=headers)
+    book = json.loads(response.content.splitlines()[0].strip(b"[]"))
+    assert book["num_ratings"] == 1
+    assert book["avg_rating"] == 4
+    assert book["soft_deleted"] is True
+
+
+def _matches(book: dict, params: dict) -> bool:
+    rating = book["avg_rating"]
+    return (
+        (params.get("return_deleted_books") or not book["soft_deleted"])
+        and all(
+            book[field].casefold() == params[field].casefold()
+            for field in ("author", "category")
+            if field in params
+        )
+        and book["isbn"] == params.get("isbn", book["isbn"])
+        and not (
+            ("min_rating" in params or "max_rating" in params)
+            and (
+                rating is None
+                or rating < params.get("min_rating", rating)
+                or rating > params.get("max_rating", rating)
+            )
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    ("catalog_class", "scan_share"),
+    [(BookCatalog, 1), (BookCatalog, 4), (ColumnarBookCatalog, 1)],
+)
+def test_pages_of_random_queries_match_a_full_scan(
+    mocker, catalog_class, scan_share: int
+):
+    if catalog_class is ColumnarBookCatalog:
+        pytest.importorskip("numpy")
+
+    # A share of one scans the catalog in order for most queries of this size.
+    mocker.patch("api.book_service._SCAN_SHARE", scan_share)
+
+    rng = random.Random(0)
+    mock_books = []
+
+    for i in range(60):
+        num_ratings = rng.randrange(3)
+        sum_ratings = num_ratings * rng.randint(1, 5)
+        mock_books.append(
+            dict(
+                isbn=f"{1000000000000 + i}",
+                title=f"Book {i}",
+                author=rng.choice(["Jane Austen", "Harper Lee", "George Orwell"]),
+                category=rng.choice(["Classic", "Fiction"]),
+                avg_rating=sum_ratings / num_ratings if num_ratings else None,
+                num_ratings=num_ratings,
+                sum_ratings=sum_ratings,
+                soft_deleted=rng.random() < 0.3,
+            )
+        )
+
+    test_data.setup_mock_books(mocker, mock_books, catalog_class)
+    bs.BOOKS.compact(0)
+    mock_books[1]["soft_deleted"] = True
+    bs.BOOKS.mark_deleted(mock_books[1]["isbn"])
+    expected_order = sorted(mock_books, key=lambda b: bs.Book.from_dict(b).sort_key)
+
+    for _ in range(40):
+        params = dict(top=rng.choice([1, 2, 5, 50]))
+
+        for name, values in [
+            ("author", ["jane austen", "HARPER LEE", "Nobody"]),
+            ("category", ["classic", "Fiction"]),
+            ("isbn", [mock_books[0]["isbn"], mock_books[1]["isbn"]]),
+            ("min_rating", [1, 2.5, 4]),
+            ("max_rating", [4.5, 5]),
+            ("return_deleted_books", ["true"]),
+        ]:
+            if rng.random() < (0.1 if name == "isbn" else 0.4):
+                params[name] = rng.choice(values)
+
+        if params.get("min_rating", 0) >= params.get("max_rating", 5.5):
+            del params["max_rating"]
+
+        books = []
+        response = client.get("/books/q", params=params)
+
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            page = [b["isbn"] for b in response.json()]
+            assert len(page) <= params["top"]
+            books += page
+
+            if "next" not in response.links:
+                break
+
+            response = client.get(response.links["next"]["url"])
+
+        assert books == [b["isbn"] for b in expected_order if _matches(b, params)]
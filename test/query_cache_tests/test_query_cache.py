@@ -0,0 +1,74 @@
+import asyncio
+from test import client
+
+import test_data
+from starlette import status
+
+import api.book_service as bs
+from api.cache import QueryCache
+from api.models import BookQueryParameters
+
+
+def _setup_query_cache(mocker, maxsize: int = 16) -> QueryCache:
+    cache = QueryCache(maxsize=maxsize, ttl=60)
+    mocker.patch("api.book_service.QUERY_CACHE", cache)
+    return cache
+
+
+def test_repeated_query_is_served_from_cache(mocker):
+    test_data.setup_mock_books(mocker)
+    _setup_query_cache(mocker)
+
+    first = client.get("/books/q?author=Stephen Hawking")
+    second = client.get("/books/q?author=stephen hawking")
+    assert first.json() == second.json()
+
+    response = client.get("/stats/query-cache")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["hits"] == 1
+    assert response.json()["misses"] == 1
+
+
+def test_changing_a_result_does_not_change_the_cached_one(mocker):
+    test_data.setup_mock_books(mocker)
+    _setup_query_cache(mocker)
+    params = BookQueryParameters()
+
+    books = asyncio.run(bs.query_book(params))
+    expected = [dict(book) for book in books]
+    books[0]["title"] = "Changed"
+    books.pop()
+
+    cached = asyncio.run(bs.query_book(params))
+    cached[0]["num_ratings"] = 99
+    assert asyncio.run(bs.query_book(params)) == expected
+
+
+def test_cached_query_is_invalidated_by_writes(mocker):
+    mock_books = test_data.setup_mock_books(mocker)
+    cache = _setup_query_cache(mocker)
+    isbn = mock_books[0]["isbn"]
+
+    assert client.get("/books/q").json()[0]["num_ratings"] == 0
+
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=4))
+    assert client.get("/books/q").json()[0]["num_ratings"] == 1
+
+    client.delete(f"/books/{isbn}")
+    assert client.get("/books/q").json() == []
+
+    assert cache.hits == 0
+    assert cache.invalidations == 2
+
+
+def test_least_recently_used_query_is_evicted(mocker):
+    test_data.setup_mock_books(mocker)
+    cache = _setup_query_cache(mocker, maxsize=2)
+
+    for top in [1, 2, 3]:
+        client.get(f"/books/q?top={top}")
+
+    client.get("/books/q?top=1")
+    assert cache.evictions == 2
+    assert cache.hits == 0
+    assert len(cache) == 2
@@ -0,0 +1,149 @@
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+from api.book import Book
+from api.catalog import BookCatalog
+from api.columnar import ColumnarBookCatalog
+from api.search import TextIndex
+
+MOCK_BOOKS = [
+    dict(
+        isbn=isbn,
+        title=title,
+        author=author,
+        category="Classic",
+        avg_rating=avg_rating,
+        num_ratings=1 if avg_rating else 0,
+        sum_ratings=avg_rating or 0,
+        soft_deleted=False,
+    )
+    for isbn, title, author, avg_rating in [
+        ("1111111111111", "The Great Gatsby", "F. Scott Fitzgerald", 4.0),
+        ("2222222222222", "To Kill a Mockingbird", "Harper Lee", 5.0),
+        ("3333333333333", "Emma", "Jane Austen", None),
+        ("4444444444444", "Go Set a Watchman", "Harper Lee", 3.0),
+        ("5555555555555", "Harper's Island", "Harper Lee", 2.0),
+    ]
+]
+
+
+def _search(query_string: str) -> list:
+    response = client.get(f"/books/q?{query_string}")
+    assert response.status_code == status.HTTP_200_OK
+    return [b["isbn"] for b in response.json()]
+
+
+def test_search_ranks_by_matching_words_then_rating(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _search("q=harper") == ["5555555555555", "2222222222222", "4444444444444"]
+
+
+@pytest.mark.parametrize(
+    ("query", "isbns"),
+    [
+        ("GATSBY", ["1111111111111"]),
+        ("gat fitz", ["1111111111111"]),
+        ("harper watch", ["4444444444444"]),
+        ("harper emma", []),
+        ("mock", ["2222222222222"]),
+        ("!!!", []),
+    ],
+)
+def test_search_matches_every_word_as_a_prefix(mocker, query: str, isbns: list):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _search(f"q={query}") == isbns
+
+
+@pytest.mark.parametrize("query", ["", "%20", "%20%09"])
+def test_blank_search_is_the_same_as_no_search(mocker, query: str):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _search(f"q={query}") == _search("")
+    assert _search(f"q={query}&top=2") == _search("top=2")
+    assert len(_search(f"q={query}")) == len(MOCK_BOOKS)
+
+
+def test_search_combines_with_other_filters(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _search("q=harper&min_rating=3") == ["2222222222222", "4444444444444"]
+    assert _search("q=harper&isbn=4444444444444") == ["4444444444444"]
+
+
+def test_search_sees_created_and_deleted_books(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    test_data.setup_mock_reviews(mocker, [])
+
+    request = dict(
+        title="Persuasion",
+        author="Jane Austen",
+        category="Classic",
+        isbn="6666666666666",
+    )
+    response = client.post("/books", json=request)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert _search("q=austen") == ["3333333333333", "6666666666666"]
+
+    client.delete("/books/3333333333333")
+    assert _search("q=austen") == ["6666666666666"]
+    assert _search("q=austen&return_deleted_books=true") == [
+        "3333333333333",
+        "6666666666666",
+    ]
+
+
+def test_next_links_page_through_search_results(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    pages = []
+    response = client.get("/books/q?q=harper&top=2")
+
+    while "next" in response.links:
+        pages.append([b["isbn"] for b in response.json()])
+        response = client.get(response.links["next"]["url"])
+        assert response.status_code == status.HTTP_200_OK
+
+    pages.append([b["isbn"] for b in response.json()])
+
+    assert pages == [["5555555555555", "2222222222222"], ["4444444444444"]]
+
+
+def test_cursor_must_belong_to_the_query(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    response = client.get("/books/q?q=harper&top=1")
+
+    response = client.get(response.links["next"]["url"].replace("q=harper&", ""))
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("query_string", ["q=harper", "q=e&max_rating=4"])
+def test_columnar_catalog_returns_same_search_results(mocker, query_string: str):
+    pytest.importorskip("numpy")
+
+    results = []
+
+    for catalog_class in (BookCatalog, ColumnarBookCatalog):
+        test_data.setup_mock_books(mocker, MOCK_BOOKS, catalog_class)
+        results.append(_search(query_string))
+
+    assert results[0] == results[1]
+
+
+def test_removed_books_leave_the_index():
+    books = [Book.from_dict(book) for book in MOCK_BOOKS]
+    index = TextIndex()
+
+    for book in books:
+        index.add(book)
+
+    index.remove(books[2])
+    index.remove(books[1])
+
+    assert index.search("emma") == {}
+    assert index.search("harper") == {"4444444444444": 1, "5555555555555": 2}
+    assert index._terms == sorted(index._postings)
@@ -0,0 +1,71 @@
+import asyncio
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+import api.book_service as bs
+from api.wal import WriteAheadLog
+
+NEW_BOOK = dict(
+    title="Dune",
+    author="Frank Herbert",
+    category="Science Fiction",
+    isbn="9780441172719",
+)
+
+
+@pytest.fixture()
+def logs(mocker, tmp_path):
+    path = str(tmp_path / "books.wal")
+    wal = WriteAheadLog(path, shared=True)
+    other_worker = WriteAheadLog(path, shared=True)
+    mocker.patch("api.book_service.WAL", wal)
+    bs.replay_log()
+    yield wal, other_worker
+    other_worker.close()
+    wal.close()
+
+
+def test_writes_of_other_workers_are_applied_before_reads(mocker, logs):
+    _, other_worker = logs
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    isbn = mock_books[0]["isbn"]
+
+    asyncio.run(other_worker.append(dict(op="add_rating", isbn=isbn, rating=5)))
+    asyncio.run(other_worker.append(dict(op="create_review", isbn=isbn, review="Ok")))
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=3))
+
+    book = client.get(f"/books/q?isbn={isbn}").json()[0]
+    assert book["num_ratings"] == 2
+    assert book["sum_ratings"] == 8
+    assert client.get(f"/books/{isbn}/reviews").json()[0]["reviews"] == ["Ok"]
+
+    test_data.setup_mock_books(mocker, mock_books)
+    assert bs.replay_log() == 3
+    assert bs.BOOKS.get(isbn).num_ratings == 2
+
+
+def test_book_created_by_another_worker_is_a_conflict(mocker, logs):
+    _, other_worker = logs
+    test_data.setup_mock_books(mocker, [])
+    book = dict(NEW_BOOK, avg_rating=None, num_ratings=0, sum_ratings=0)
+
+    asyncio.run(other_worker.append(dict(op="create_book", book=book)))
+
+    response = client.post("/books", json=NEW_BOOK)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+def test_write_racing_with_another_worker_is_resolved_in_log_order(mocker, logs):
+    _, other_worker = logs
+    test_data.setup_mock_books(mocker, [])
+    book = dict(NEW_BOOK, avg_rating=None, num_ratings=0, sum_ratings=0)
+
+    # The other worker appends its record after this worker checked the ISBN.
+    other_worker.write(dict(op="create_book", book=book))
+
+    assert not asyncio.run(bs._write("create_book", book=dict(book, title="Other")))
+    assert bs.BOOKS.get(NEW_BOOK["isbn"]).title == "Dune"
@@ -0,0 +1,155 @@
+import asyncio
+from test import client
+
+import pytest
+import test_data
+
+import api.book_service as bs
+from api.book import Book
+from api.catalog import BookCatalog
+from api.reviews import ReviewStore
+from api.snapshot import Snapshot, write_snapshot
+from api.wal import WriteAheadLog
+
+NEW_BOOK = dict(
+    title="Dune",
+    author="Frank Herbert",
+    category="Science Fiction",
+    isbn="9780441172719",
+)
+
+
+@pytest.fixture()
+def snapshot_path(mocker, tmp_path):
+    path = str(tmp_path / "books.snapshot")
+    wal = WriteAheadLog(str(tmp_path / "books.wal"))
+    mocker.patch("api.book_service.SNAPSHOT_PATH", path)
+    mocker.patch("api.book_service.WAL", wal)
+    mocker.patch("api.book_service._SNAPSHOT", None)
+    yield path
+    wal.close()
+
+
+def _write_changes(isbn: str):
+    client.post("/books", json=NEW_BOOK)
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=4))
+    client.post(f"/books/{isbn}/reviews", json=dict(review="Ünïcode review."))
+    client.delete(f"/books/{NEW_BOOK['isbn']}")
+
+
+def _get_state(isbn: str) -> tuple:
+    books = client.get("/books/q?return_deleted_books=true").json()
+    reviews = client.get(f"/books/{isbn}/reviews").json()
+    return books, reviews
+
+
+def test_snapshot_round_trips_books_and_reviews(tmp_path):
+    books = [Book.from_dict(book) for book in test_data.MOCK_BOOKS]
+    books.append(Book(**NEW_BOOK, num_ratings=None, sum_ratings=None))
+    catalog = BookCatalog(books)
+    catalog.set_ratings(test_data.VALID_ISBN, 2, 9)
+    catalog.mark_deleted(NEW_BOOK["isbn"])
+    reviews = ReviewStore([dict(isbn=test_data.VALID_ISBN, reviews=["a", "bé"])])
+    path = str(tmp_path / "books.snapshot")
+
+    write_snapshot(path, catalog, reviews, wal_offset=42)
+
+    with Snapshot(path) as snapshot:
+        loaded = list(snapshot.books())
+        loaded_reviews = dict(snapshot.reviews())
+
+        assert snapshot.wal_offset == 42
+
+    assert [b.to_dict() for b in loaded] == [
+        b.to_dict() for b in catalog.iter_ordered(deleted=True)
+    ]
+    assert loaded_reviews == {test_data.VALID_ISBN: ["a", "bé"]}
+
+
+def test_checkpoint_adds_the_log_to_the_snapshot(mocker, snapshot_path):
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    isbn = mock_books[0]["isbn"]
+    bs.restore()
+
+    _write_changes(isbn)
+    offset = asyncio.run(bs.save_snapshot())
+
+    assert offset == bs.WAL.tell()
+
+    with Snapshot(snapshot_path) as snapshot:
+        books = [book.to_dict() for book in snapshot.books()]
+        reviews = dict(snapshot.reviews())
+
+    live_books, live_reviews = _get_state(isbn)
+    assert books == live_books
+    assert reviews == {isbn: live_reviews[0]["reviews"]}
+
+
+def test_restore_loads_the_snapshot_and_replays_the_rest_of_the_log(
+    mocker, snapshot_path
+):
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    isbn = mock_books[0]["isbn"]
+    bs.restore()
+
+    _write_changes(isbn)
+    asyncio.run(bs.save_snapshot())
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=2))
+    client.post(f"/books/{isbn}/reviews", json=dict(review="After the snapshot."))
+    state = _get_state(isbn)
+
+    test_data.setup_mock_books(mocker, [])
+    test_data.setup_mock_reviews(mocker, [])
+
+    assert bs.restore() == 2
+    assert _get_state(isbn) == state
+
+
+def test_file_that_is_not_a_snapshot_is_rejected(tmp_path):
+    path = tmp_path / "books.snapshot"
+    path.write_bytes(b"not a snapshot at all, but long enough for a header")
+
+    with pytest.raises(ValueError, match="is not a version 1 snapshot"):
+        Snapshot(str(path))
+
+
+def test_checkpoint_is_skipped_until_the_log_grows(mocker, snapshot_path):
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    isbn = mock_books[0]["isbn"]
+    bs.restore()
+    client.post(f"/books/{isbn}/reviews", json=dict(review="Before."))
+    offset = asyncio.run(bs.save_snapshot())
+    replace = mocker.spy(bs.os, "replace")
+
+    assert asyncio.run(bs.save_snapshot()) == offset
+    assert replace.call_count == 0
+
+
+def test_reviews_are_read_from_the_new_snapshot_after_a_checkpoint(
+    mocker, snapshot_path
+):
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    first, second = mock_books[0]["isbn"], NEW_BOOK["isbn"]
+    bs.restore()
+    client.post("/books", json=NEW_BOOK)
+    client.post(f"/books/{first}/reviews", json=dict(review="First."))
+    client.post(f"/books/{second}/reviews", json=dict(review="Second."))
+    asyncio.run(bs.save_snapshot())
+
+    # Restarting leaves both books' reviews in the snapshot until they are read.
+    test_data.setup_mock_reviews(mocker, [])
+    bs.restore()
+    old = bs._SNAPSHOT
+    client.post(f"/books/{first}/reviews", json=dict(review="Again."))
+    asyncio.run(bs.save_snapshot())
+
+    assert bs._SNAPSHOT is not old
+    assert client.get(f"/books/{second}/reviews").json()[0]["reviews"] == ["Second."]
+    assert client.get(f"/books/{first}/reviews").json()[0]["reviews"] == [
+        "First.",
+        "Again.",
+    ]
@@ -0,0 +1,145 @@
+import math
+import random
+from test import client
+
+import pytest
+import test_data
+from starlette import status
+
+import api.book_service as bs
+from api.stats import STATS_FIELDS
+
+MOCK_BOOKS = [
+    dict(
+        isbn=isbn,
+        title=title,
+        author=author,
+        category=category,
+        avg_rating=sum_ratings / num_ratings if num_ratings else None,
+        num_ratings=num_ratings,
+        sum_ratings=sum_ratings,
+        soft_deleted=soft_deleted,
+    )
+    for isbn, title, author, category, num_ratings, sum_ratings, soft_deleted in [
+        ("1111111111111", "Emma", "Jane Austen", "Classic", 2, 9, False),
+        ("2222222222222", "Persuasion", "jane austen", "Classic", 1, 3, False),
+        ("3333333333333", "Sanditon", "Jane Austen", "Fiction", 4, 12, True),
+        ("4444444444444", "1984", "George Orwell", "Dystopian", 0, 0, False),
+    ]
+]
+
+
+def _get_stats(query_string: str) -> list:
+    response = client.get(f"/stats/{query_string}")
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def test_stats_aggregate_books_and_ratings(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _get_stats("author") == [
+        dict(
+            value="George Orwell",
+            books=1,
+            deleted_books=0,
+            num_ratings=0,
+            sum_ratings=0.0,
+            avg_rating=None,
+        ),
+        dict(
+            value="Jane Austen",
+            books=2,
+            deleted_books=1,
+            num_ratings=3,
+            sum_ratings=12.0,
+            avg_rating=4.0,
+        ),
+    ]
+    assert [group["value"] for group in _get_stats("category?value=CLASSIC")] == [
+        "Classic"
+    ]
+    assert _get_stats("category?value=Poetry") == []
+
+
+def test_stats_fail_when_field_unknown():
+    response = client.get("/stats/title")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def _recompute(field: str) -> list:
+    groups = {}
+
+    for book in bs.BOOKS:
+        key = getattr(book, field).casefold()
+        group = groups.setdefault(key, dict(value=getattr(book, field), books=[]))
+        group["books"].append(book)
+
+    results = []
+
+    for key in sorted(groups):
+        books = groups[key]["books"]
+        active = [book for book in books if not book.soft_deleted]
+        num_ratings = sum(book.num_ratings for book in active)
+        sum_ratings = math.fsum(book.sum_ratings for book in active)
+        results.append(
+            dict(
+                value=groups[key]["value"],
+                books=len(active),
+                deleted_books=len(books) - len(active),
+                num_ratings=num_ratings,
+                sum_ratings=sum_ratings,
+                avg_rating=sum_ratings / num_ratings if num_ratings else None,
+            )
+        )
+
+    return results
+
+
+def test_stats_match_a_full_recomputation_after_writes(mocker):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+    test_data.setup_mock_reviews(mocker, [])
+    rng = random.Random(0)
+    authors = ["Jane Austen", "JANE AUSTEN", "George Orwell", "Harper Lee"]
+    categories = ["Classic", "Fiction", "Dystopian", "fiction"]
+    isbns = [book["isbn"] for book in MOCK_BOOKS]
+
+    for i in range(300):
+        operation = rng.random()
+
+        if operation < 0.2:
+            isbn = f"{5000000000000 + i}"
+            book = dict(
+                title=f"Book {i}",
+                author=rng.choice(authors),
+                category=rng.choice(categories),
+                isbn=isbn,
+            )
+            assert client.post("/books", json=book).status_code == 201
+            isbns.append(isbn)
+        elif operation < 0.3:
+            client.delete(f"/books/{rng.choice(isbns)}")
+        elif operation < 0.8:
+            rating = dict(rating=round(rng.uniform(1, 5), 3))
+            client.post(f"/books/{rng.choice(isbns)}/ratings", json=rating)
+        else:
+            ratings = [
+                dict(isbn=rng.choice(isbns), rating=round(rng.uniform(1, 5), 2))
+                for _ in range(5)
+            ]
+            client.post("/books/ratings", json=dict(ratings=ratings))
+
+    for field in STATS_FIELDS:
+        stats = _get_stats(field)
+        expected = _recompute(field)
+        assert stats == expected
+        assert sum(group["books"] for group in stats) == sum(
+            not book.soft_deleted for book in bs.BOOKS
+        )
+
+
+@pytest.mark.parametrize("field", STATS_FIELDS)
+def test_stats_of_restored_catalog_match_recomputation(mocker, field: str):
+    test_data.setup_mock_books(mocker, MOCK_BOOKS)
+
+    assert _get_stats(field) == _recompute(field)
@@ -1,3 +1,7 @@
+from api.book import Book
+from api.catalog import BookCatalog
+from api.reviews import ReviewStore
+
 INVALID_ISBNS = ["fffffffff1111", "fffffffffffff", "111111111111", "111111111111111"]
 VALID_ISBN = "4444444444444"
 
@@ -19,10 +23,10 @@ MOCK_REVIEWS = [
 ]
 
 
-def setup_mock_books(mocker, books=None) -> list:
+def setup_mock_books(mocker, books=None, catalog_class=BookCatalog) -> list:
     if books is None:
         books = MOCK_BOOKS
-    mocker.patch("api.book_service.BOOKS", books)
+    mocker.patch("api.book_service.BOOKS", catalog_class(map(Book.from_dict, books)))
     return books
 
 
@@ -30,5 +34,5 @@ def setup_mock_reviews(mocker, reviews=None) -> list:
     if reviews is None:
         reviews = MOCK_REVIEWS
 
-    mocker.patch("api.book_service.BOOK_REVIEWS", reviews)
+    mocker.patch("api.book_service.BOOK_REVIEWS", ReviewStore(reviews))
     return reviews
@@ -0,0 +1,99 @@
+import asyncio
+from test import client
+
+import pytest
+import test_data
+
+import api.book_service as bs
+from api.wal import WriteAheadLog
+
+
+@pytest.fixture(params=["always", "batch", "never"])
+def wal(request, mocker, tmp_path):
+    wal = WriteAheadLog(str(tmp_path / "books.wal"), fsync=request.param)
+    mocker.patch("api.book_service.WAL", wal)
+    yield wal
+    wal.close()
+
+
+def test_replaying_the_log_rebuilds_the_state(mocker, wal):
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    isbn = mock_books[0]["isbn"]
+    new_book = dict(
+        title="Dune",
+        author="Frank Herbert",
+        category="Science Fiction",
+        isbn="9780441172719",
+    )
+
+    client.post("/books", json=new_book)
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=4))
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=5))
+    client.post(f"/books/{isbn}/reviews", json=dict(review="A classic."))
+    client.delete(f"/books/{new_book['isbn']}")
+
+    books = client.get("/books/q?return_deleted_books=true").json()
+    reviews = client.get(f"/books/{isbn}/reviews").json()
+    assert [book["soft_deleted"] for book in books] == [False, True]
+    assert reviews[0]["reviews"] == ["A classic."]
+
+    test_data.setup_mock_books(mocker, mock_books)
+    test_data.setup_mock_reviews(mocker, [])
+    assert bs.replay_log() == 5
+
+    assert client.get("/books/q?return_deleted_books=true").json() == books
+    assert client.get(f"/books/{isbn}/reviews").json() == reviews
+
+
+def test_rejected_writes_are_not_logged(mocker, wal):
+    mock_books = test_data.setup_mock_books(mocker)
+
+    client.post("/books", json=mock_books[0])
+    client.post("/books/9780441172719/ratings", json=dict(rating=4))
+    client.post("/books/9780441172719/reviews", json=dict(review="Missing."))
+
+    assert list(wal.replay()) == []
+
+
+def test_torn_record_at_the_end_of_the_log_is_dropped(mocker, tmp_path):
+    mock_books = test_data.setup_mock_books(mocker)
+    isbn = mock_books[0]["isbn"]
+    path = tmp_path / "books.wal"
+    path.write_bytes(
+        b'{"op":"add_rating","isbn":"' + isbn.encode() + b'","rating":4}\n'
+        b'{"op":"add_rating","isbn":"'
+    )
+    wal = WriteAheadLog(str(path))
+    mocker.patch("api.book_service.WAL", wal)
+
+    assert bs.replay_log() == 1
+
+    client.post(f"/books/{isbn}/ratings", json=dict(rating=2))
+    wal.close()
+
+    assert [record["rating"] for record, _ in wal.replay()] == [4, 2]
+    assert client.get(f"/books/q?isbn={isbn}").json()[0]["avg_rating"] == 3
+
+
+def test_unknown_fsync_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="fsync must be one of"):
+        WriteAheadLog(str(tmp_path / "books.wal"), fsync="sometimes")
+
+
+def test_records_that_cannot_be_applied_are_not_logged(mocker, wal):
+    mock_books = test_data.setup_mock_books(mocker)
+    test_data.setup_mock_reviews(mocker, [])
+    good_book = dict(
+        title="Dune", author="Frank Herbert", category="Fiction", isbn="9780441172719"
+    )
+    bad_book = dict(good_book, author=42, isbn="9780441172720")
+
+    with pytest.raises(ValueError, match="Invalid book"):
+        asyncio.run(bs._write("create_books", books=[good_book, bad_book]))
+
+    with pytest.raises(ValueError, match="Unknown"):
+        asyncio.run(bs._write("rename_book", isbn=mock_books[0]["isbn"]))
+
+    assert list(wal.replay()) == []
+    assert good_book["isbn"] not in bs.BOOKS
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+import test_data
+from fastapi import HTTPException
+
+import api.book_service as bs
+from api.locks import StripedLock
+from api.models import AddRatingRequest, AddRatingsRequest, CreateBookRequest
+from api.wal import WriteAheadLog
+
+WRITES = 200
+
+
+@pytest.fixture()
+def wal(mocker, tmp_path):
+    wal = WriteAheadLog(str(tmp_path / "books.wal"), fsync="batch")
+    mocker.patch("api.book_service.WAL", wal)
+    yield wal
+    wal.close()
+
+
+async def _add_ratings_concurrently(isbn: str) -> None:
+    single = AddRatingRequest(rating=4)
+    batch = AddRatingsRequest(ratings=[dict(isbn=isbn, rating=2)] * 3)
+    writes = [bs.add_rating(isbn, single) for _ in range(WRITES)]
+    writes += [bs.add_ratings(batch) for _ in range(WRITES)]
+    await asyncio.gather(*writes)
+
+
+def test_concurrent_ratings_are_not_lost(mocker, wal):
+    mock_books = test_data.setup_mock_books(mocker)
+    isbn = test_data.VALID_ISBN
+
+    asyncio.run(_add_ratings_concurrently(isbn))
+
+    book = bs.BOOKS.get(isbn)
+    assert book.num_ratings == WRITES * 4
+    assert book.sum_ratings == WRITES * 10
+
+    test_data.setup_mock_books(mocker, mock_books)
+    bs.replay_log()
+    assert bs.BOOKS.get(isbn).num_ratings == WRITES * 4
+
+
+async def _create_book_concurrently(params: CreateBookRequest) -> list:
+    writes = [bs.create_book(params) for _ in range(10)]
+    return await asyncio.gather(*writes, return_exceptions=True)
+
+
+def test_concurrent_creates_of_the_same_book_add_it_once(mocker, wal):
+    test_data.setup_mock_books(mocker, [])
+    params = CreateBookRequest(
+        title="Dune",
+        author="Frank Herbert",
+        category="Science Fiction",
+        isbn="9780441172719",
+    )
+
+    results = asyncio.run(_create_book_concurrently(params))
+
+    conflicts = [r for r in results if isinstance(r, HTTPException)]
+    assert len(conflicts) == 9
+    assert all(conflict.status_code == 409 for conflict in conflicts)
+    assert len(bs.BOOKS) == 1
+
+
+async def _count_overlaps(locks: StripedLock, keys: list) -> int:
+    holders = overlaps = 0
+
+    async def write(key: str) -> None:
+        nonlocal holders, overlaps
+
+        async with locks.hold(key):
+            holders += 1
+            overlaps = max(overlaps, holders)
+            await asyncio.sleep(0)
+            holders -= 1
+
+    await asyncio.gather(*(write(key) for key in keys))
+    return overlaps
+
+
+def test_striped_lock_only_serializes_keys_that_share_a_stripe():
+    locks = StripedLock(stripes=64)
+    first = "9780441172719"
+    second = next(
+        isbn
+        for isbn in (str(9780000000000 + i) for i in range(1000))
+        if hash(isbn) % locks.stripes != hash(first) % locks.stripes
+    )
+
+    assert asyncio.run(_count_overlaps(locks, [first] * 10)) == 1
+    assert asyncio.run(_count_overlaps(locks, [first, second] * 5)) == 2
+    assert not locks.locked(first)